@@ -0,0 +1,187 @@
+""" Benchmark throughput and latency of dask.distributed
+
+Starts a scheduler with workers on the loopback interface, either as threads
+in this process or as separate processes with ``LocalCluster``, and runs a
+few synthetic graphs through a client:
+
+*  noop: many independent tasks that do nothing
+*  chain: a long chain of tasks, each depending on the previous one
+*  tree: a binary tree reduction
+*  shuffle: every output partition takes a slice of every input partition,
+   which moves large NumPy arrays between workers
+*  latency: a single task, the round trip from client to result
+
+For each we report the wall clock time of ``Client.get``, tasks per second,
+the CPU time spent in this process and the bytes that workers collected from
+each other.  With ``--processes`` the CPU time is that of the scheduler and
+client.  Otherwise it includes the workers.
+
+Usage::
+
+    $ python benchmarks/distributed_throughput.py [--processes] [--tasks N]
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+from operator import add
+from time import sleep
+from timeit import default_timer
+
+
+def noop(*args):
+    return None
+
+
+def make_payload(nbytes, seed):
+    import numpy as np
+    return np.random.RandomState(seed).randint(0, 255, nbytes).astype('u1')
+
+
+def concatenate(arrays):
+    import numpy as np
+    return np.concatenate(list(arrays))
+
+
+def split(x, i, n):
+    size = len(x) // n
+    return x[i * size: (i + 1) * size]
+
+
+def noop_graph(n):
+    dsk = dict((('noop', i), (noop, i)) for i in range(n))
+    dsk['noop-done'] = (noop, list(dsk))
+    return dsk, 'noop-done'
+
+
+def chain_graph(n):
+    dsk = {('chain', 0): 0}
+    for i in range(1, n):
+        dsk[('chain', i)] = (add, ('chain', i - 1), 1)
+    return dsk, ('chain', n - 1)
+
+
+def tree_graph(n):
+    """ Binary tree reduction of ``n`` leaves, ``2 * n - 1`` tasks """
+    dsk = dict((('tree-0', i), (add, i, 1)) for i in range(n))
+    level = 0
+    while n > 1:
+        for i in range(0, n, 2):
+            if i + 1 < n:
+                task = (add, ('tree-%d' % level, i),
+                             ('tree-%d' % level, i + 1))
+            else:
+                task = ('tree-%d' % level, i)  # odd one out moves up as is
+            dsk[('tree-%d' % (level + 1), i // 2)] = task
+        level += 1
+        n = (n + 1) // 2
+    return dsk, ('tree-%d' % level, 0)
+
+
+def shuffle_graph(npartitions, nbytes):
+    """ All-to-all exchange of ``npartitions`` arrays of ``nbytes`` each """
+    dsk = dict()
+    for i in range(npartitions):
+        dsk[('input', i)] = (make_payload, nbytes, i)
+        for j in range(npartitions):
+            dsk[('split', i, j)] = (split, ('input', i), j, npartitions)
+    for j in range(npartitions):
+        dsk[('output', j)] = (concatenate, [('split', i, j)
+                                            for i in range(npartitions)])
+        dsk[('size', j)] = (len, ('output', j))
+    return dsk, [('size', j) for j in range(npartitions)]
+
+
+def benchmarks(ntasks, npartitions, nbytes):
+    return [('noop', ) + noop_graph(ntasks),
+            ('chain', ) + chain_graph(ntasks // 10),
+            ('tree', ) + tree_graph(ntasks // 2),
+            ('shuffle', ) + shuffle_graph(npartitions, nbytes),
+            ('latency', {'x': (noop,)}, 'x')]
+
+
+def cpu_time():
+    """ User and system time of this process """
+    t = os.times()
+    return t[0] + t[1]
+
+
+def run(client, scheduler, dsk, keys, repeat=3):
+    """ Best of several runs of a graph
+
+    Returns seconds of wall clock time, seconds of CPU time and bytes moved
+    between workers of the fastest run.
+    """
+    best = None
+    for i in range(repeat):
+        moved = scheduler.transferred_bytes
+        cpu = cpu_time()
+        start = default_timer()
+        client.get(dsk, keys)
+        duration = default_timer() - start
+        cpu = cpu_time() - cpu
+        sleep(0.05)  # let the last finished-task reports arrive
+        moved = scheduler.transferred_bytes - moved
+        if best is None or duration < best[0]:
+            best = (duration, cpu, moved)
+    return best
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of workers')
+    parser.add_argument('--ncores', type=int, default=1,
+                        help='tasks that each worker runs at once')
+    parser.add_argument('--processes', action='store_true',
+                        help='run workers in separate processes')
+    parser.add_argument('--tasks', type=int, default=1000,
+                        help='number of tasks in the noop graph')
+    parser.add_argument('--partitions', type=int, default=10,
+                        help='number of partitions in the shuffle')
+    parser.add_argument('--nbytes', type=int, default=2**20,
+                        help='bytes in each shuffle input partition')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(args)
+
+    from dask.distributed import Scheduler, Worker, Client, LocalCluster
+
+    if args.processes:
+        cluster = LocalCluster(nworkers=args.workers, ncores=args.ncores)
+        scheduler = cluster.scheduler
+        workers = []
+    else:
+        cluster = None
+        scheduler = Scheduler(hostname='127.0.0.1',
+                              bind_to_workers='127.0.0.1',
+                              bind_to_clients='127.0.0.1')
+        workers = [Worker(scheduler.address_to_workers, ncores=args.ncores,
+                          hostname='127.0.0.1', bind_to_workers='127.0.0.1',
+                          nthreads=10)
+                   for i in range(args.workers)]
+        while len(scheduler.workers) < args.workers:
+            sleep(0.01)
+    client = Client(scheduler.address_to_clients)
+
+    try:
+        print('%-10s %8s %10s %10s %10s %12s' % ('graph', 'tasks', 'seconds',
+                                                'tasks/s', 'cpu', 'bytes moved'))
+        for name, dsk, keys in benchmarks(args.tasks, args.partitions,
+                                          args.nbytes):
+            duration, cpu, moved = run(client, scheduler, dsk, keys,
+                                       repeat=args.repeat)
+            print('%-10s %8d %10.4f %10.1f %10.4f %12d' %
+                  (name, len(dsk), duration, len(dsk) / duration, cpu,
+                   moved))
+    finally:
+        client.close()
+        if cluster is not None:
+            cluster.close()
+        else:
+            for w in workers:
+                w.close()
+            scheduler.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+""" Benchmark graph construction for common collection operations
+
+Building the graph for large collections can take longer than computing it.
+This script measures the time taken to construct, and the size of, the graph
+of several common dask.array and dask.dataframe operations.  Nothing is
+computed.
+
+Usage::
+
+    $ python benchmarks/graph_construction.py [--scale N]
+
+``--scale`` multiplies the number of chunks along each axis (default 1, or
+10,000 chunks for two-dimensional arrays).
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import gc
+from timeit import default_timer
+
+
+def best_of(func, repeat=3):
+    """ Best time of several calls to ``func``, along with its last result """
+    best = float('inf')
+    for i in range(repeat):
+        gc.collect()
+        start = default_timer()
+        result = func()
+        best = min(best, default_timer() - start)
+    return best, result
+
+
+def array_benchmarks(scale=1):
+    import dask.array as da
+    n = 100 * scale
+    x = da.ones((10 * n, 10 * n), chunks=(10, 10))
+    y = da.ones((10 * n,), chunks=(10,))
+    x2 = x[:, :100]
+    x3 = x[:100, :]
+    return [('array elementwise x + x', lambda: x + x),
+            ('array broadcast x + y', lambda: x + y),
+            ('array scalar x + 1', lambda: x + 1),
+            ('array transpose x.T', lambda: x.T),
+            ('array slice x[5:-5, ::2]', lambda: x[5:-5, ::2]),
+            ('array newaxis x[None, :, 3]', lambda: x[None, :, 3]),
+            ('array fancy x[[1, 5, 3], :]', lambda: x[[1, 5, 3], :]),
+            ('array reduction x.sum(axis=0)', lambda: x.sum(axis=0)),
+            ('array full reduction x.sum()', lambda: x.sum()),
+            ('array dot', lambda: x2.dot(x3)),
+            ('array rechunk', lambda: x.rechunk((20, 5)))]
+
+
+def dataframe_benchmarks(scale=1):
+    import numpy as np
+    import pandas as pd
+    import dask.dataframe as dd
+    n = 2000 * scale
+    df = pd.DataFrame({'x': np.arange(50 * n), 'y': np.arange(50 * n)})
+    a = dd.from_pandas(df, npartitions=n)
+    b = dd.from_pandas(df.iloc[::2], npartitions=n * 3 // 4)
+    return [('dataframe elementwise a.x + 1', lambda: a.x + 1),
+            ('dataframe aligned a.x + b.y', lambda: a.x + b.y),
+            ('dataframe merge on index',
+             lambda: dd.merge(a, b, left_index=True, right_index=True)),
+            ('dataframe reduction a.x.sum()', lambda: a.x.sum()),
+            ('dataframe groupby a.groupby(a.x).y.sum()',
+             lambda: a.groupby(a.x).y.sum()),
+            ('dataframe loc', lambda: a.loc[100:50 * n - 100])]
+
+
+def run(benchmarks, repeat=3):
+    """ Time each benchmark, returning a list of (name, seconds, graph size)
+    """
+    results = []
+    for name, func in benchmarks:
+        duration, coll = best_of(func, repeat=repeat)
+        results.append((name, duration, len(coll.dask)))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(args)
+
+    benchmarks = []
+    for f in [array_benchmarks, dataframe_benchmarks]:
+        try:
+            benchmarks.extend(f(args.scale))
+        except ImportError as e:
+            print("Skipping %s: %s" % (f.__name__, e))
+
+    print('%-45s %10s %10s' % ('operation', 'seconds', 'tasks'))
+    for name, duration, size in run(benchmarks, repeat=args.repeat):
+        print('%-45s %10.4f %10d' % (name, duration, size))
+
+
+if __name__ == '__main__':
+    main()
@@ -330,21 +330,38 @@ def top(func, output, out_indices, *arrind_pairs, **kwargs):
 
     # (0, 0), (0, 1), (0, 2), (1, 0), ...
     keytups = list(product(*[range(dims[i]) for i in out_indices]))
-    # {i: 0, j: 0}, {i: 0, j: 1}, ...
-    keydicts = [dict(zip(out_indices, tup)) for tup in keytups]
-
-    # {j: [1, 2, 3], ...}  For j a dummy index of dimension 3
-    dummies = dict((i, list(range(dims[i]))) for i in dummy_indices)
-
-    # Create argument lists
-    valtups = []
-    for kd in keydicts:
-        args = []
-        for arg, ind in argpairs:
-            tups = lol_tuples((arg,), ind, kd, dummies)
-            tups2 = zero_broadcast_dimensions(tups, numblocks[arg])
-            args.append(tups2)
-        valtups.append(tuple(args))
+
+    if not dummy_indices:
+        # Every argument is a single key.  Build them directly from the
+        # output key by position, pointing broadcast dimensions at block 0
+        n = len(out_indices)
+        positions = [(arg, [n if d == 1 else out_indices.index(i)
+                            for i, d in zip(ind, numblocks[arg])])
+                     for arg, ind in argpairs]
+        valtups = [tuple([(arg,) + tuple([kt[p] for p in pos])
+                          for arg, pos in positions])
+                   for kt in [kt + (0,) for kt in keytups]]
+    else:
+        # {i: 0, j: 0}, {i: 0, j: 1}, ...
+        keydicts = [dict(zip(out_indices, tup)) for tup in keytups]
+
+        # {j: [1, 2, 3], ...}  For j a dummy index of dimension 3
+        dummies = dict((i, list(range(dims[i]))) for i in dummy_indices)
+
+        # Arguments along which we broadcast
+        broadcast = set(arg for arg, ind in argpairs
+                        if 1 in numblocks[arg])
+
+        # Create argument lists
+        valtups = []
+        for kd in keydicts:
+            args = []
+            for arg, ind in argpairs:
+                tups = lol_tuples((arg,), ind, kd, dummies)
+                if arg in broadcast:
+                    tups = zero_broadcast_dimensions(tups, numblocks[arg])
+                args.append(tups)
+            valtups.append(tuple(args))
 
     # Add heads to tuples
     keys = [(output,) + kt for kt in keytups]
@@ -205,27 +205,24 @@ def rechunk(x, chunks):
 
     crossed = intersect_chunks(x.chunks, chunks)
     x2 = dict()
+    ndim = x.ndim
     temp_name = 'rechunk-' + tokenize(x, chunks)
-    new_index = tuple(product(*(tuple(range(len(n))) for n in chunks)))
-    for flat_idx, cross1 in enumerate(crossed):
-        new_idx = new_index[flat_idx]
+    new_index = product(*(range(len(n)) for n in chunks))
+    for new_idx, cross1 in zip(new_index, crossed):
         key = (temp_name,) + new_idx
-        cr2 = iter(cross1)
-        old_blocks = tuple(tuple(ind  for ind,_ in cr) for cr in cross1)
-        subdims = tuple(len(set(ss[i] for ss in old_blocks)) for i in range(x.ndim))
-        rec_cat_arg =np.empty(subdims).tolist()
+        old_blocks = tuple(tuple(ind for ind, _ in cr) for cr in cross1)
+        subdims = tuple(len(set(ss[i] for ss in old_blocks))
+                        for i in range(ndim))
+        rec_cat_arg = np.empty(subdims).tolist()
         inds_in_block = product(*(range(s) for s in subdims))
-        for old_block in old_blocks:
-            ind_slics = next(cr2)
-            old_inds = tuple(tuple(s[0] for s in ind_slics) for i in range(x.ndim))
-            # list of nd slices
-            slic = tuple(tuple(s[1] for s in ind_slics)  for i in range(x.ndim))
-            ind_in_blk = next(inds_in_block)
+        for ind_slics, ind_in_blk in zip(cross1, inds_in_block):
+            old_inds = tuple(s[0] for s in ind_slics)
+            # nd slice
+            slic = tuple(s[1] for s in ind_slics)
             temp = rec_cat_arg
-            for i in range(x.ndim -1):
-                temp = getitem(temp, ind_in_blk[i])
-            for ind, slc in zip(old_inds, slic):
-                temp[ind_in_blk[-1]] = (getitem, (x.name,) + ind, slc)
+            for i in range(ndim - 1):
+                temp = temp[ind_in_blk[i]]
+            temp[ind_in_blk[-1]] = (getitem, (x.name,) + old_inds, slic)
         x2[key] = (concatenate3, rec_cat_arg)
     x2 = merge(x.dask, x2)
     return Array(x2, temp_name, chunks, dtype=x.dtype)
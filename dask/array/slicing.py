@@ -130,6 +130,9 @@ def slice_with_newaxes(out_name, in_name, blockdims, index):
     # Pass down and do work
     dsk, blockdims2 = slice_wrap_lists(out_name, in_name, blockdims, index2)
 
+    if not where_none:
+        return dsk, blockdims2
+
     # Insert ",0" into the key:  ('x', 2, 3) -> ('x', 0, 2, 0, 3)
     dsk2 = dict(((out_name,) + insert_many(k[1:], where_none, 0),
                  (v[:2] + (insert_many(v[2], where_none, None),)))
@@ -73,6 +73,18 @@ def test_top_supports_broadcasting_rules():
          ('z', 1, 0): (add, ('x', 0, 0), ('y', 1, 0)),
          ('z', 1, 1): (add, ('x', 0, 1), ('y', 1, 0))}
 
+    assert top(add, 'z', 'ij', 'x', 'ji', 'y', 'j',
+                numblocks={'x': (2, 1), 'y': (2,)}) == \
+        {('z', 0, 0): (add, ('x', 0, 0), ('y', 0)),
+         ('z', 0, 1): (add, ('x', 1, 0), ('y', 1))}
+
+    assert top(dotmany, 'z', 'ik', 'x', 'ij', 'y', 'jk',
+                numblocks={'x': (1, 2), 'y': (2, 2)}) == \
+        {('z', 0, 0): (dotmany, [('x', 0, 0), ('x', 0, 1)],
+                                [('y', 0, 0), ('y', 1, 0)]),
+         ('z', 0, 1): (dotmany, [('x', 0, 0), ('x', 0, 1)],
+                                [('y', 0, 1), ('y', 1, 1)])}
+
 
 def test_concatenate3():
     x = np.array([1, 2])
@@ -58,6 +58,17 @@ Changing state
 6.  waiting_data: available data to yet-to-be-run-tasks :: {key: {keys}}
     Real-time equivalent of dependents
 
+### Statistics
+
+``get_async`` also adds ``stats``, a dictionary of counters measuring the
+overhead of the scheduler itself: seconds spent in ``cull``, ``order``,
+``start_state``, ``prep_data`` and ``finish_task``, seconds spent blocking on
+the queue (``queue_wait``), idle worker-seconds (``worker_idle``), the number
+of tasks fired (``ntasks``) and the maximum and summed length of the ready
+stack as seen each time a task is fired (``ready_length_max``,
+``ready_length_total``).  The total wall time is added as ``total`` when the
+computation completes.  See ``dask.diagnostics.SchedulerStats``.
+
 
 Example
 -------
@@ -119,6 +130,7 @@ from __future__ import absolute_import, division, print_function
 import sys
 import traceback
 from operator import add
+from timeit import default_timer
 from .core import istask, flatten, reverse_dict, get_dependencies, ishashable
 from .context import _globals
 from .order import order
@@ -439,11 +451,35 @@ def get_async(apply_async, num_workers, dsk, result, cache=None,
     for f in start_cbs:
         f(dsk)
 
+    t0 = default_timer()
     dsk = cull(dsk, list(results))
-
+    t1 = default_timer()
     keyorder = order(dsk)
-
+    t2 = default_timer()
     state = start_state_from_dask(dsk, cache=cache, sortkey=keyorder.get)
+    t3 = default_timer()
+
+    # Scheduler overhead counters, see ``dask.diagnostics.SchedulerStats``
+    stats = {'cull': t1 - t0,
+             'order': t2 - t1,
+             'start_state': t3 - t2,
+             'prep_data': 0.0,
+             'finish_task': 0.0,
+             'queue_wait': 0.0,
+             'worker_idle': 0.0,
+             'ntasks': 0,
+             'ready_length_max': len(state['ready']),
+             'ready_length_total': 0}
+    state['stats'] = stats
+    # Time at which the number of busy workers last changed
+    last_change = [t3]
+
+    def update_idle(now):
+        """ Accumulate idle worker-seconds since the last change in load """
+        free = num_workers - len(state['running'])
+        if free > 0:
+            stats['worker_idle'] += free * (now - last_change[0])
+        last_change[0] = now
 
     if rerun_exceptions_locally is None:
         rerun_exceptions_locally = _globals.get('rerun_exceptions_locally', False)
@@ -453,16 +489,25 @@ def get_async(apply_async, num_workers, dsk, result, cache=None,
 
     def fire_task():
         """ Fire off a task to the thread pool """
+        nready = len(state['ready'])
+        stats['ntasks'] += 1
+        stats['ready_length_total'] += nready
+        if nready > stats['ready_length_max']:
+            stats['ready_length_max'] = nready
+
         # Choose a good task to compute
         key = state['ready'].pop()
         state['ready-set'].remove(key)
+        update_idle(default_timer())
         state['running'].add(key)
         for f in pretask_cbs:
             f(key, dsk, state)
 
         # Prep data to send
+        start = default_timer()
         data = dict((dep, state['cache'][dep])
                     for dep in get_dependencies(dsk, key))
+        stats['prep_data'] += default_timer() - start
         # Submit
         apply_async(execute_task, args=[key, dsk[key], data, queue,
                                         get_id, raise_on_exception])
@@ -473,6 +518,7 @@ def get_async(apply_async, num_workers, dsk, result, cache=None,
 
     # Main loop, wait on tasks to finish, insert new ones
     while state['waiting'] or state['ready'] or state['running']:
+        start = default_timer()
         try:
             key, res, tb, worker_id = queue.get()
         except KeyboardInterrupt:
@@ -494,8 +540,12 @@ def get_async(apply_async, num_workers, dsk, result, cache=None,
                               + 'Traceback:\n'
                               + '----------\n'
                               + tb)
+        end = default_timer()
+        stats['queue_wait'] += end - start
+        update_idle(end)
         state['cache'][key] = res
         finish_task(dsk, key, state, results, keyorder.get)
+        stats['finish_task'] += default_timer() - end
         for f in posttask_cbs:
             f(key, res, dsk, state, worker_id)
         while state['ready'] and len(state['running']) < num_workers:
@@ -505,6 +555,10 @@ def get_async(apply_async, num_workers, dsk, result, cache=None,
     while state['running'] or not queue.empty():
         key, res, tb, worker_id = queue.get()
 
+    end = default_timer()
+    update_idle(end)
+    stats['total'] = end - t0
+
     for f in finish_cbs:
         f(dsk, state, False)
 
@@ -15,6 +15,7 @@ from fnmatch import fnmatchcase
 from glob import glob
 from collections import Iterable, Iterator, defaultdict
 from functools import wraps, partial
+from operator import getitem
 from dask.utils import takes_multiple_arguments
 from dask.core import list2, quote
 
@@ -22,7 +23,8 @@ from toolz import (merge, frequencies, merge_with, take, reduce,
                    join, reduceby, valmap, count, map, partition_all, filter,
                    remove, pluck, groupby, topk)
 import toolz
-from ..utils import tmpfile, ignoring, file_size, textblock
+from ..utils import (tmpfile, ignoring, file_size, textblock,
+                     stable_hash)
 with ignoring(ImportError):
     from cytoolz import (frequencies, merge_with, join, reduceby,
                          count, pluck, groupby, topk)
@@ -33,6 +35,7 @@ from ..optimize import fuse, cull, inline
 from ..compatibility import (apply, BytesIO, unicode, urlopen, urlparse,
         StringIO)
 from ..base import Base, normalize_token
+from ..context import _globals
 
 names = ('bag-%d' % i for i in itertools.count(1))
 tokens = ('-%d' % i for i in itertools.count(1))
@@ -708,7 +711,8 @@ class Bag(Base):
     def __iter__(self):
         return iter(self.compute())
 
-    def groupby(self, grouper, npartitions=None, blocksize=2**20):
+    def groupby(self, grouper, npartitions=None, blocksize=2**20,
+                method=None):
         """ Group collection by key function
 
         Note that this requires full dataset read, serialization and shuffle.
@@ -718,6 +722,12 @@ class Bag(Base):
         >>> dict(b.groupby(lambda x: x % 2 == 0))  # doctest: +SKIP
         {True: [0, 2, 4, 6, 8], False: [1, 3, 5, 7, 9]}
 
+        ``method='disk'`` groups the data in a ``partd`` on local disk, which
+        all tasks must share.  ``method='tasks'`` splits each partition into
+        one piece per output partition in ordinary tasks, which works on the
+        distributed scheduler, see ``groupby_tasks``.  The default is
+        ``'disk'`` unless set otherwise with ``dask.set_options(shuffle=...)``.
+
         See Also
         --------
 
@@ -726,6 +736,12 @@ class Bag(Base):
         if npartitions is None:
             npartitions = self.npartitions
 
+        method = method or _globals['shuffle'] or 'disk'
+        if method == 'tasks':
+            return groupby_tasks(self, grouper, npartitions)
+        if method != 'disk':
+            raise ValueError("Unknown shuffle method %r" % method)
+
         import partd
         p = ('partd' + next(tokens),)
         try:
@@ -819,6 +835,52 @@ def collect(grouper, group, p, barrier_token):
     return list(d.items())
 
 
+def groupby_tasks(b, grouper, npartitions):
+    """ Group bag by key function without a shared disk
+
+    Every partition is split into one piece per output partition by ordinary
+    tasks and every output partition groups its pieces.  On the distributed
+    scheduler the pieces move directly between workers.
+
+    See Also
+    --------
+
+    Bag.groupby
+    """
+    name = next(names)
+    dsk1 = dict(((name, i), (split_groups, grouper, (b.name, i), npartitions))
+                for i in range(b.npartitions))
+
+    name2 = next(names)
+    dsk2 = dict(((name2, i, j), (getitem, (name, i), j))
+                for i in range(b.npartitions) for j in range(npartitions))
+
+    name3 = next(names)
+    dsk3 = dict(((name3, j), (collect_groups, grouper,
+                              (list, [(name2, i, j)
+                                      for i in range(b.npartitions)])))
+                for j in range(npartitions))
+
+    return type(b)(merge(b.dask, dsk1, dsk2, dsk3), name3, npartitions)
+
+
+def split_groups(grouper, sequence, npartitions):
+    """ Split a partition along a grouper into one list per output partition
+
+    >>> split_groups(lambda x: x, [1, 2, 3, 4], 2)
+    {0: [2, 4], 1: [1, 3]}
+    """
+    d = dict((i, []) for i in range(npartitions))
+    for k, v in groupby(grouper, sequence).items():
+        d[stable_hash(k) % npartitions].extend(v)
+    return d
+
+
+def collect_groups(grouper, pieces):
+    """ Group the pieces of an output partition, yield k,v group pairs """
+    return list(groupby(grouper, toolz.concat(pieces)).items())
+
+
 def decode_sequence(encoding, seq):
     for item in seq:
         yield item.decode(encoding)
@@ -489,6 +489,22 @@ def test_groupby_with_npartitions_changed():
     assert result.npartitions == 1
 
 
+def test_groupby_tasks():
+    c = b.groupby(lambda x: x, method='tasks')
+    assert dict(c) == dict(b.groupby(lambda x: x))
+    assert c.npartitions == b.npartitions
+
+    c = b.groupby(lambda x: x % 2, npartitions=1, method='tasks')
+    assert c.npartitions == 1
+    assert valmap(sorted, dict(c)) == {0: [0, 0, 0, 2, 2, 2, 4, 4, 4],
+                                       1: [1, 1, 1, 3, 3, 3]}
+
+    with dask.set_options(shuffle='tasks'):
+        c = b.groupby(lambda x: x)
+    assert not any('partd' in str(v) for v in c.dask.values())
+    assert raises(ValueError, lambda: b.groupby(lambda x: x, method='foo'))
+
+
 def test_concat():
     a = db.from_sequence([1, 2, 3])
     b = db.from_sequence([4, 5, 6])
@@ -22,6 +22,8 @@ class set_options(object):
         func_loads/func_dumps - loads/dumps functions for serialization of data
             likely to contain functions.  Defaults to dill.loads/dill.dumps
         rerun_exceptions_locally - rerun failed tasks in master process
+        shuffle - how dataframe and bag shuffles move data, 'disk' (default)
+            or 'tasks', see dask.dataframe.shuffle.shuffle
 
     Example
     -------
@@ -1,4 +1,5 @@
 from collections import Iterator
+from operator import getitem
 from toolz import merge
 import pandas as pd
 import numpy as np
@@ -6,7 +7,9 @@ import uuid
 
 from ..optimize import cull
 from ..base import tokenize
-from .core import DataFrame, Series, _Frame
+from ..context import _globals
+from ..utils import stable_hash
+from .core import DataFrame, Series, _Frame, _concat
 from .utils import (strip_categories, shard_df_on_index, _categorize,
                     get_categories)
 
@@ -52,6 +55,8 @@ def set_partition(df, index, divisions, compute=False, **kwargs):
         Column to become the new index
     divisions: list
         Values to form new divisions between partitions
+    method: string, 'disk' or 'tasks'
+        How to move the data, see ``shuffle``
 
     See Also
     --------
@@ -65,6 +70,12 @@ def set_partition(df, index, divisions, compute=False, **kwargs):
     else:
         columns = tuple([c for c in df.columns if c != index])
 
+    method = kwargs.pop('method', None) or _globals['shuffle'] or 'disk'
+    if method == 'tasks':
+        return set_partition_tasks(df, index, divisions)
+    if method != 'disk':
+        raise ValueError("Unknown shuffle method %r" % method)
+
     token = tokenize(df, index, divisions)
     always_new_token = uuid.uuid1().hex
     import partd
@@ -152,7 +163,7 @@ def _set_collect(group, p, barrier_token, columns):
         return pd.DataFrame([], columns=columns)
 
 
-def shuffle(df, index, npartitions=None):
+def shuffle(df, index, npartitions=None, method=None):
     """ Group DataFrame by index
 
     Hash grouping of elements.  After this operation all elements that have
@@ -162,10 +173,18 @@ def shuffle(df, index, npartitions=None):
 
     This does not preserve a meaningful index/partitioning scheme.
 
+    There are two methods.  ``'disk'`` groups the data in a ``partd`` on
+    local disk, which all tasks must share, behind a barrier.  ``'tasks'``
+    splits each input partition into one piece per output partition in
+    ordinary tasks, so the data moves between the workers of the distributed
+    scheduler like any other intermediate result.  The default is ``'disk'``
+    unless set otherwise with ``dask.set_options(shuffle=...)``.
+
     See Also
     --------
     set_index
     set_partition
+    shuffle_tasks
     partd
     """
     if isinstance(index, _Frame):
@@ -173,6 +192,12 @@ def shuffle(df, index, npartitions=None):
     if npartitions is None:
         npartitions = df.npartitions
 
+    method = method or _globals['shuffle'] or 'disk'
+    if method == 'tasks':
+        return shuffle_tasks(df, index, npartitions)
+    if method != 'disk':
+        raise ValueError("Unknown shuffle method %r" % method)
+
     token = tokenize(df, index, npartitions)
     always_new_token = uuid.uuid1().hex
 
@@ -215,6 +240,14 @@ def shuffle(df, index, npartitions=None):
 
 def partition(df, index, npartitions, p):
     """ Partition a dataframe along a grouper, store partitions to partd """
+    p.append(_partition_groups(df, index, npartitions))
+
+
+def _partition_groups(df, index, npartitions):
+    """ Split a dataframe along a grouper into a dict of non-empty groups
+
+    Uses ``stable_hash`` so that workers in different processes agree.
+    """
     rng = pd.Series(np.arange(len(df)))
     if isinstance(index, Iterator):
         index = list(index)
@@ -222,18 +255,119 @@ def partition(df, index, npartitions, p):
         index = df[index]
 
     if isinstance(index, pd.Index):
-        groups = rng.groupby([abs(hash(x)) % npartitions for x in index])
+        groups = rng.groupby([stable_hash(x) % npartitions for x in index])
     if isinstance(index, pd.Series):
-        groups = rng.groupby(index.map(lambda x: abs(hash(x)) % npartitions).values)
+        groups = rng.groupby(index.map(lambda x: stable_hash(x) % npartitions)
+                                  .values)
     elif isinstance(index, pd.DataFrame):
         groups = rng.groupby(index.apply(
-                    lambda row: abs(hash(tuple(row))) % npartitions,
+                    lambda row: stable_hash(tuple(row)) % npartitions,
                     axis=1).values)
-    d = dict((i, df.iloc[groups.groups[i]]) for i in range(npartitions)
-                                            if i in groups.groups)
-    p.append(d)
+    return dict((i, df.iloc[groups.groups[i]]) for i in range(npartitions)
+                                               if i in groups.groups)
 
 
 def collect(group, p, barrier_token):
     """ Collect partitions from partd, yield dataframes """
     return p.get(group)
+
+
+def shuffle_tasks(df, index, npartitions):
+    """ Group DataFrame by index without a shared disk
+
+    Like ``shuffle`` but every input partition is split into one piece per
+    output partition by ordinary tasks, and every output partition
+    concatenates its pieces.  On the distributed scheduler the pieces move
+    directly between workers, which spill to disk if they have a
+    ``memory_limit``.  Makes ``npartitions`` times as many tasks as there are
+    input partitions.
+
+    See Also
+    --------
+    shuffle
+    """
+    token = tokenize(df, index, npartitions, 'tasks')
+
+    name = 'shuffle-split-' + token
+    if isinstance(index, _Frame):
+        dsk = dict(((name, i), (_shuffle_split, part, ind, npartitions))
+                   for i, (part, ind)
+                   in enumerate(zip(df._keys(), index._keys())))
+    else:
+        dsk = dict(((name, i), (_shuffle_split, part, index, npartitions))
+                   for i, part in enumerate(df._keys()))
+
+    return _collect_pieces(df, index, dsk, name, npartitions, token,
+                           'shuffle-tasks-', [None] * (npartitions + 1),
+                           df.columns)
+
+
+def set_partition_tasks(df, index, divisions):
+    """ Set index and partition along divisions without a shared disk
+
+    Like ``set_partition`` but moves the data with tasks, see
+    ``shuffle_tasks``.
+    """
+    token = tokenize(df, index, divisions, 'tasks')
+    npartitions = len(divisions) - 1
+    if isinstance(index, _Frame):
+        columns = df.columns
+    else:
+        columns = tuple([c for c in df.columns if c != index])
+
+    catname = 'set-partition-tasks--get-categories-' + token
+    dsk = {catname: (new_categories, (get_categories, df._keys()[0]),
+                     index.name if isinstance(index, Series) else index)}
+
+    name = 'set-partition-split-' + token
+    if isinstance(index, _Frame):
+        dsk.update(((name, i), (_set_partition_split, part, ind, divisions))
+                   for i, (part, ind)
+                   in enumerate(zip(df._keys(), index._keys())))
+    else:
+        dsk.update(((name, i), (_set_partition_split, part, index, divisions))
+                   for i, part in enumerate(df._keys()))
+
+    return _collect_pieces(df, index, dsk, name, npartitions, token,
+                           'set-partition-tasks-', divisions, columns,
+                           categories=catname)
+
+
+def _collect_pieces(df, index, dsk, name, npartitions, token, prefix,
+                    divisions, columns, categories=None):
+    """ Pull one piece out of every split, concatenate pieces of each output
+
+    If given, ``categories`` is the key of the categories to restore on each
+    output partition, see ``_categorize``.
+    """
+    nsplits = df.npartitions
+    name2 = 'shuffle-piece-' + token
+    dsk2 = dict(((name2, i, j), (getitem, (name, i), j))
+                for i in range(nsplits) for j in range(npartitions))
+    name3 = prefix + token
+    dsk3 = dict()
+    for j in range(npartitions):
+        task = (_concat, (list, [(name2, i, j) for i in range(nsplits)]))
+        if categories is not None:
+            task = (_categorize, categories, task)
+        dsk3[(name3, j)] = task
+
+    dsk = merge(df.dask, dsk, dsk2, dsk3)
+    if isinstance(index, _Frame):
+        dsk.update(index.dask)
+    return DataFrame(dsk, name3, columns, divisions)
+
+
+def _shuffle_split(df, index, npartitions):
+    """ Split a dataframe into one, possibly empty, piece per output """
+    groups = _partition_groups(df, index, npartitions)
+    empty = df.iloc[:0]
+    return dict((i, groups.get(i, empty)) for i in range(npartitions))
+
+
+def _set_partition_split(df, index, divisions):
+    """ Set index and split a dataframe into one piece per division """
+    df = df.set_index(index)
+    df = strip_categories(df)
+    divisions = list(divisions)
+    return dict(enumerate(shard_df_on_index(df, divisions[1:-1])))
@@ -1,6 +1,8 @@
+import pytest
 import dask.dataframe as dd
 import pandas.util.testing as tm
 import pandas as pd
+import dask
 from dask.dataframe.shuffle import shuffle
 import partd
 from dask.async import get_sync
@@ -49,3 +51,35 @@ def test_shuffle_from_one_partition_to_one_other():
     for i in [1, 2]:
         b = shuffle(a, 'x', i)
         assert len(a.compute(get=get_sync)) == len(b.compute(get=get_sync))
+
+
+def test_shuffle_tasks():
+    s = shuffle(d, d.b, npartitions=2, method='tasks')
+    assert s.npartitions == 2
+    assert not any('partd' in str(v) for v in s.dask.values())
+
+    x = get_sync(s.dask, (s._name, 0))
+    y = get_sync(s.dask, (s._name, 1))
+    assert not (set(x.b) & set(y.b))  # disjoint
+    assert sorted(x.b.tolist() + y.b.tolist()) == sorted(full.b.tolist())
+
+    tm.assert_frame_equal(s.compute().sort_index(),
+                          shuffle(d, d.b, npartitions=2).compute().sort_index())
+    assert (sorted(shuffle(d, 'b', method='tasks').compute().values.tolist()) ==
+            sorted(full.values.tolist()))
+
+    with dask.set_options(shuffle='tasks'):
+        assert shuffle(d, 'b')._name == shuffle(d, 'b', method='tasks')._name
+
+
+@pytest.mark.xfail(not hasattr(pd.core.common, 'CategoricalDtype'),
+                   raises=AttributeError,
+                   reason="strip_categories needs pd.core.common."
+                          "CategoricalDtype, like test_set_partition")
+def test_set_partition_tasks():
+    divisions = [1, 4, 9]
+    a = d.set_partition('b', divisions)
+    b = d.set_partition('b', divisions, method='tasks')
+    assert b.divisions == a.divisions
+    assert not any('partd' in str(v) for v in b.dask.values())
+    tm.assert_frame_equal(a.compute().sort_index(), b.compute().sort_index())
@@ -1,2 +1,2 @@
-from .profile import Profiler
+from .profile import Profiler, SchedulerStats
 from .progress import ProgressBar
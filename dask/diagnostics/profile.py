@@ -1,10 +1,12 @@
-from __future__ import absolute_import
+from __future__ import absolute_import, division
 
+from array import array
 from collections import namedtuple
-from itertools import starmap
+import json
 from timeit import default_timer
 
 from ..callbacks import Callback
+from ..core import istask
 
 
 # Stores execution data for each task
@@ -17,11 +19,28 @@ class Profiler(Callback):
 
     Records the following information for each task:
         1. Key
-        2. Task
+        2. Name of the task's function
         3. Start time in seconds since the epoch
         4. Finish time in seconds since the epoch
         5. Worker id
 
+    Records are kept in compact columns (an ``array`` of floats per time and
+    a small integer per function and worker) rather than as one Python object
+    per task, so that profiling may be left on for long computations.  We
+    don't keep the graph, so its tasks may be freed once the computation is
+    done.  Pass the graph to ``results`` or ``visualize`` to see them.
+
+    Parameters
+    ----------
+    path : str, optional
+        If given, stream records to this file in the Chrome trace-event
+        format as the computation runs.  Only records not yet written are
+        held in memory, so ``results``, ``visualize`` and
+        ``to_chrome_trace`` are not available once we have written some.
+    buffer_size : int, optional
+        Number of records to hold in memory before writing them to ``path``.
+        Defaults to 100000.  Ignored if ``path`` is not given.
+
     Examples
     --------
 
@@ -33,49 +52,205 @@ class Profiler(Callback):
     22
 
     >>> prof.results()  # doctest: +SKIP
+    [('y', 'add', 1435352238.48039, 1435352238.480655, 140285575100160),
+     ('z', 'mul', 1435352238.480657, 1435352238.480803, 140285566707456)]
+    >>> prof.results(dsk)  # doctest: +SKIP
     [('y', (add, 'x', 10), 1435352238.48039, 1435352238.480655, 140285575100160),
      ('z', (mul, 'y', 2), 1435352238.480657, 1435352238.480803, 140285566707456)]
 
     These results can be visualized in a bokeh plot using the ``visualize``
     method. Note that this requires bokeh to be installed.
 
-    >>> prof.visualize() # doctest: +SKIP
+    >>> prof.visualize(dsk) # doctest: +SKIP
+
+    Or written out as a Chrome trace, viewable in ``chrome://tracing``
+
+    >>> prof.to_chrome_trace('profile.json')  # doctest: +SKIP
     """
-    def __init__(self):
-        self._results = {}
-        self._dsk = {}
+    def __init__(self, path=None, buffer_size=100000):
+        self._path = path
+        self._buffer_size = buffer_size
+        self._file = None
+        self._nwritten = 0
+        self._running = {}
+        self._workers = []
+        self._worker_index = {}
+        self._funcs = []
+        self._func_index = {}
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._keys = []
+        self._func_ids = array('i')
+        self._start_times = array('d')
+        self._end_times = array('d')
+        self._worker_ids = array('i')
 
     def _start(self, dsk):
         self.clear()
-        self._dsk = dsk.copy()
+        if self._path is not None:
+            self._file = open(self._path, 'w')
+            self._file.write('[')
+            self._nwritten = 0
 
     def _pretask(self, key, dsk, state):
-        start = default_timer()
-        self._results[key] = (key, dsk[key], start)
+        self._running[key] = default_timer()
 
     def _posttask(self, key, value, dsk, state, id):
         end = default_timer()
-        self._results[key] += (end, id)
+        i = self._worker_index.get(id)
+        if i is None:
+            i = self._worker_index[id] = len(self._workers)
+            self._workers.append(id)
+        name = _func_name(dsk.get(key))
+        f = self._func_index.get(name)
+        if f is None:
+            f = self._func_index[name] = len(self._funcs)
+            self._funcs.append(name)
+        self._keys.append(key)
+        self._func_ids.append(f)
+        self._start_times.append(self._running.pop(key))
+        self._end_times.append(end)
+        self._worker_ids.append(i)
+        if self._file is not None and len(self._keys) >= self._buffer_size:
+            self._flush()
+
+    def _finish(self, dsk, state, errored):
+        if self._file is not None:
+            self._flush()
+            self._file.write('\n]\n')
+            self._file.close()
+            self._file = None
+
+    def _flush(self):
+        """Write buffered records to ``path`` and release them"""
+        for event in self._trace_events():
+            self._file.write(',\n' if self._nwritten else '\n')
+            json.dump(event, self._file)
+            self._nwritten += 1
+        self._reset_buffer()
 
-    def results(self):
+    def results(self, dsk=None):
         """Returns a list containing namedtuples of:
 
-        TaskData(key, task, start_time, end_time, worker_id)"""
+        TaskData(key, task, start_time, end_time, worker_id)
+
+        ``task`` is the name of the task's function, or the task itself if we
+        find it in the graph ``dsk``."""
+        self._check_in_memory()
+        funcs = self._funcs
+        workers = self._workers
+        dsk = dsk or {}
+        return [TaskData(key, dsk.get(key, funcs[f]), start, end, workers[i])
+                for key, f, start, end, i in zip(self._keys, self._func_ids,
+                                                 self._start_times,
+                                                 self._end_times,
+                                                 self._worker_ids)]
+
+    def _check_in_memory(self):
+        if self._nwritten:
+            raise ValueError("Profiler wrote its records to %s already, "
+                             "read them from there" % self._path)
 
-        results = dict((k, v) for k, v in self._results.items() if len(v) == 5)
-        return list(starmap(TaskData, results.values()))
+    def _trace_events(self):
+        """Buffered records as Chrome trace-event dictionaries"""
+        for key, f, start, end, i in zip(self._keys, self._func_ids,
+                                         self._start_times, self._end_times,
+                                         self._worker_ids):
+            yield {'name': str(key),
+                   'cat': self._funcs[f],
+                   'ph': 'X',
+                   'ts': start * 1e6,
+                   'dur': (end - start) * 1e6,
+                   'pid': 0,
+                   'tid': i}
 
-    def visualize(self, **kwargs):
+    def to_chrome_trace(self, path):
+        """Write the profiling run to ``path`` in the Chrome trace-event format.
+
+        The resulting file may be opened in ``chrome://tracing`` or any other
+        viewer supporting the format.  Each task is a complete event (phase
+        ``'X'``) named by its key, with one row per worker.
+        """
+        if self._path is not None:
+            raise ValueError("Profiler streams its trace to %s already"
+                             % self._path)
+        with open(path, 'w') as f:
+            json.dump(list(self._trace_events()), f)
+
+    def visualize(self, dsk=None, **kwargs):
         """Visualize the profiling run in a bokeh plot.
 
+        Tasks are labeled in full if we find them in the graph ``dsk``, else
+        by the name of their function.
+
         See also
         --------
         dask.diagnostics.profile_visualize.visualize
         """
         from .profile_visualize import visualize
-        return visualize(self.results(), self._dsk, **kwargs)
+        return visualize(self.results(dsk), dsk, **kwargs)
 
     def clear(self):
         """Clear out old results from profiler"""
-        self._results.clear()
-        self._dsk = {}
+        self._reset_buffer()
+        self._running.clear()
+        self._workers = []
+        self._worker_index = {}
+        self._funcs = []
+        self._func_index = {}
+        self._nwritten = 0
+
+
+def _func_name(task):
+    """Name of the function of a task, for profiles
+
+    >>> from operator import add
+    >>> _func_name((add, 'x', 1))
+    'add'
+    """
+    func = task[0] if istask(task) else None
+    return getattr(func, '__name__', type(func).__name__)
+
+
+class SchedulerStats(Callback):
+    """Record the overhead of the scheduler itself.
+
+    Schedulers based on ``dask.async.get_async`` keep cheap counters of the
+    time spent culling, ordering and building the initial state, preparing
+    data for each task, updating state after each task finishes, and waiting
+    on workers.  This callback captures those counters at the end of each
+    computation.
+
+    Examples
+    --------
+
+    >>> from operator import add, mul
+    >>> from dask.threaded import get
+    >>> dsk = {'x': 1, 'y': (add, 'x', 10), 'z': (mul, 'y', 2)}
+    >>> with SchedulerStats() as stats:
+    ...     get(dsk, 'z')
+    22
+
+    >>> stats.results['ntasks']
+    2
+    >>> stats.overhead()  # doctest: +SKIP
+    0.000153
+    """
+    def __init__(self):
+        self.results = {}
+
+    def _start(self, dsk):
+        self.results = {}
+
+    def _finish(self, dsk, state, errored):
+        self.results = dict(state.get('stats', {}))
+        ntasks = self.results.get('ntasks')
+        if ntasks:
+            self.results['ready_length_mean'] = (
+                    self.results['ready_length_total'] / ntasks)
+
+    def overhead(self):
+        """Total seconds spent in scheduler bookkeeping"""
+        fields = ['cull', 'order', 'start_state', 'prep_data', 'finish_task']
+        return sum(self.results.get(f, 0) for f in fields)
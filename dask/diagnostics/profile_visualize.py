@@ -110,8 +110,9 @@ def visualize(results, dsk, palette='GnBu', file_path=None,
     ----------
     results : sequence
         Output of profiler.results().
-    dsk : dict
-        The dask graph being profiled.
+    dsk : dict or None
+        The dask graph being profiled.  If None, the tasks in ``results``
+        are the names of their functions, see ``Profiler.results``.
     palette : string, optional
         Name of the bokeh palette to use, must be key in bokeh.palettes.brewer.
     file_path : string, optional
@@ -157,7 +158,11 @@ def visualize(results, dsk, palette='GnBu', file_path=None,
     data['width'] = width = [e - s for (s, e) in zip(starts, ends)]
     data['x'] = [w/2 + s - left for (w, s) in zip(width, starts)]
     data['y'] = [id_lk[i] + 1 for i in ids]
-    data['function'] = funcs = [pprint_task(i, dsk, label_size) for i in tasks]
+    if dsk is None:
+        data['function'] = funcs = list(tasks)
+    else:
+        data['function'] = funcs = [pprint_task(i, dsk, label_size)
+                                    if istask(i) else i for i in tasks]
     data['color'] = get_colors(palette, funcs)
     data['key'] = [str(i) for i in keys]
 
@@ -1,7 +1,8 @@
 from operator import add, mul
+import json
 import os
 
-from dask.diagnostics import Profiler
+from dask.diagnostics import Profiler, SchedulerStats
 from dask.threaded import get
 from dask.utils import ignoring, tmpfile
 import pytest
@@ -30,11 +31,30 @@ def test_profiler():
     keys = [i.key for i in prof_data]
     assert keys == ['c', 'd', 'e']
     tasks = [i.task for i in prof_data]
+    assert tasks == ['add', 'mul', 'mul']
+    prof_data = sorted(prof.results(dsk), key=lambda d: d.key)
+    tasks = [i.task for i in prof_data]
     assert tasks == [(add, 'a', 'b'), (mul, 'a', 'b'), (mul, 'c', 'd')]
     prof.clear()
     assert prof.results() == []
 
 
+def test_profiler_does_not_keep_tasks():
+    import gc
+    import weakref
+
+    class Thing(object):
+        pass
+    thing = Thing()
+    ref = weakref.ref(thing)
+    with prof:
+        get({'x': (id, thing)}, 'x')
+    del thing
+    gc.collect()
+    assert ref() is None
+    assert [r.task for r in prof.results()] == ['id']
+
+
 def test_profiler_works_under_error():
     div = lambda x, y: x / y
     dsk = {'x': (div, 1, 1), 'y': (div, 'x', 2), 'z': (div, 'y', 0)}
@@ -47,6 +67,40 @@ def test_profiler_works_under_error():
     assert len(prof.results()) == 2
 
 
+def test_profiler_chrome_trace():
+    with prof:
+        get(dsk, 'e')
+    with tmpfile('json') as fn:
+        prof.to_chrome_trace(fn)
+        with open(fn) as f:
+            events = json.load(f)
+    assert sorted(e['name'] for e in events) == ['c', 'd', 'e']
+    assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in events)
+    assert set(e['cat'] for e in events) == set(['add', 'mul'])
+
+
+def test_profiler_streams_to_file():
+    with tmpfile('json') as fn:
+        with Profiler(path=fn, buffer_size=2) as p:
+            out = get(dsk, 'e')
+        assert out == 6
+        with open(fn) as f:
+            events = json.load(f)
+        # Our records are in the file only
+        pytest.raises(ValueError, p.results)
+        pytest.raises(ValueError, lambda: p.to_chrome_trace(fn))
+    assert sorted(e['name'] for e in events) == ['c', 'd', 'e']
+
+
+def test_scheduler_stats():
+    with SchedulerStats() as stats:
+        out = get(dsk, 'e')
+    assert out == 6
+    assert stats.results['ntasks'] == 3
+    assert stats.results['ready_length_mean'] > 0
+    assert 0 <= stats.overhead() <= stats.results['total']
+
+
 @pytest.mark.skipif("not bokeh")
 def test_pprint_task():
     from dask.diagnostics.profile_visualize import pprint_task
@@ -71,6 +125,7 @@ def test_profiler_plot():
         get(dsk, 'e')
     # Run just to see that it doesn't error
     prof.visualize(show=False)
+    prof.visualize(dsk, show=False)
     p = prof.visualize(plot_width=500,
                        plot_height=300,
                        tools="hover",
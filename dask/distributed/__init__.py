@@ -1,4 +1,5 @@
 from .worker import Worker
 from .scheduler import Scheduler
-from .client import Client
+from .client import Client, Future, as_completed
+from .cluster import LocalCluster
 from .ipython_utils import dask_client_from_ipclient
@@ -2,13 +2,20 @@ from __future__ import print_function
 
 import os
 import itertools
+import random
 import uuid
+import weakref
+from collections import defaultdict
 from datetime import datetime
 
 import zmq
 import dill
+from toolz import partial
 from .scheduler import pickle
-from ..compatibility import unicode
+from . import protocol
+from ..compatibility import unicode, apply
+from ..core import flatten
+from .. import core
 
 context = zmq.Context()
 
@@ -35,23 +42,361 @@ class Client(object):
         self.socket = context.socket(zmq.DEALER)
         self.socket.setsockopt(zmq.IDENTITY, self.address)
         self.socket.connect(self.address_to_scheduler)
+        self.worker_sockets = dict()
+        self.persisted = dict()
+        self.freed_keys = []
+        self.pending_futures = dict()
+        self.futures = weakref.WeakValueDictionary()
         self.register_client()
 
-    def get(self, dsk, keys, keep_results=False):
+    def get(self, dsk, keys, keep_results=False, direct=True, priority=0,
+            resources=None):
+        """ Compute dask graph on the cluster
+
+        Parameters
+        ----------
+
+        dsk: dict
+            Dask graph
+        keys: key, list of keys, nested list of lists of keys
+            Keys to compute
+        keep_results: bool
+            Leave results on the workers after computation
+        direct: bool
+            Collect results directly from the workers that hold them rather
+            than through the scheduler, defaults to True
+        priority: int
+            Graphs with higher priority get free workers first, e.g. to let
+            interactive work overtake batch jobs.  Defaults to 0
+        resources: dict
+            Maps keys to the resources that their tasks need on a worker,
+            e.g. ``{'x': {'memory': 8e9}}``.  These tasks run only on workers
+            with enough of these resources free, see
+            ``Scheduler.worker_resources``
+
+        Large NumPy arrays in the results are read-only, as are those that
+        tasks receive as inputs, see ``dask.distributed.protocol``.
+
+        See Also:
+            Client.gather
+        """
         header = {'function': 'schedule',
                   'jobid': next(jobids)}
-        payload = {'dask': dsk, 'keys': keys, 'keep_results': keep_results}
+        payload = {'dask': protocol.pack_graph(dsk), 'keys': keys,
+                   'keep_results': keep_results, 'direct': direct,
+                   'priority': priority, 'resources': resources}
+
+        self.send_to_scheduler(header, payload)
+        header2, payload2 = self.recv_from_scheduler()
+
+        if header2['status'] != 'OK':
+            raise payload2['result']
+
+        if not direct:
+            return payload2['result']
+
+        locations = payload2['locations']
+        try:
+            return self.gather(keys, locations, dsk)
+        finally:
+            self.send_to_scheduler({'function': 'release-keys'},
+                                   {'keys': list(locations)})
+
+    def gather(self, keys, locations, dsk=None):
+        """ Collect data directly from workers
+
+        Sends one request to each worker for all of the keys that we collect
+        from it.  If workers do not have some keys, for instance because they
+        died, then we ask the scheduler to compute these from ``dsk``.
+        Without ``dsk`` we raise a KeyError.
+
+        Parameters
+        ----------
+
+        keys: key, list of keys, nested list of lists of keys
+        locations: dict
+            Mapping of each key to a list of worker addresses holding it
+        dsk: dict, optional
+            Dask graph of the keys
+
+        Example
+        -------
 
+        >>> client.gather(['x', 'y'], {'x': ['tcp://alice:5000'],
+        ...                            'y': ['tcp://alice:5000',
+        ...                                  'tcp://bob:5000']})  # doctest: +SKIP
+        [1, 2]
+        """
+        data, missing = self._gather_direct(locations)
+        log(self.address, 'Gathered directly from workers', list(data))
+
+        if missing:
+            if dsk is None:
+                raise KeyError("Workers no longer hold keys %s" % missing)
+            log(self.address, 'Gather through scheduler', missing)
+            data.update(zip(missing, self.get(dsk, missing, direct=False)))
+
+        return core.get(data, keys)
+
+    def _gather_direct(self, locations, interval=1):
+        """ Collect data from the workers in ``locations``
+
+        Returns the data and the list of keys that we could not collect.
+        Whenever no worker has answered for ``interval`` seconds, we stop
+        waiting on those that the scheduler no longer knows, they died.
+        """
+        keys_by_worker = defaultdict(list)
+        missing = []
+        for key, workers in locations.items():
+            if workers:
+                worker = random.choice(list(workers))
+                if isinstance(worker, unicode):
+                    worker = worker.encode()
+                keys_by_worker[worker].append(key)
+            else:
+                missing.append(key)
+
+        poller = zmq.Poller()
+        sockets = dict()
+        for worker, ks in keys_by_worker.items():
+            header = {'function': 'getitems-client',
+                      'address': self.address,
+                      'timestamp': datetime.utcnow()}
+            sock = self._worker_socket(worker)
+            sock.send_multipart([pickle.dumps(header)] +
+                                protocol.dumps({'keys': ks}), copy=False)
+            poller.register(sock, zmq.POLLIN)
+            sockets[sock] = worker
+
+        data = dict()
+        while sockets:
+            ready = dict(poller.poll(interval * 1000))
+            for sock in ready:
+                frames = sock.recv_multipart(copy=False)
+                payload = protocol.loads(frames[1:])
+                data.update(payload['data'])
+                missing.extend(payload['missing'])
+                poller.unregister(sock)
+                del sockets[sock]
+            if not ready:
+                alive = self.get_registered_workers()
+                for sock, worker in list(sockets.items()):
+                    if worker not in alive:
+                        log(self.address, 'Worker died', worker)
+                        missing.extend(keys_by_worker[worker])
+                        poller.unregister(sock)
+                        del sockets[sock]
+                        self._close_worker_socket(worker)
+        return data, missing
+
+    def persist(self, collection, resources=None):
+        """ Compute collection on the cluster, keep its results there
+
+        Returns an equivalent collection.  Computations on this collection,
+        or on collections derived from it, start from the results held on
+        the workers rather than from scratch.  The graph still describes how
+        to compute the results, so that the scheduler can recompute any that
+        it loses along with a worker.
+
+        The workers release the results once the returned collection is
+        freed.  We tell the scheduler about freed collections with our next
+        message, or on ``close``.
+
+        Every task of the collection needs ``resources`` on its worker, if
+        given, e.g. ``{'memory': 8e9}``.  See ``Client.get``.
+
+        Example
+        -------
+
+        >>> x = da.random.random((10000, 10000), chunks=(1000, 1000))  # doctest: +SKIP
+        >>> x = client.persist(x)  # doctest: +SKIP
+        >>> client.get(x.sum().dask, x.sum()._keys())  # doctest: +SKIP
+        """
+        keys = collection._keys()
+        dsk = collection._optimize(collection.dask, keys)
+
+        header = {'function': 'schedule',
+                  'jobid': next(jobids)}
+        payload = {'dask': protocol.pack_graph(dsk), 'keys': keys,
+                   'direct': True,
+                   'resources': _resources_for_graph(dsk, resources)}
         self.send_to_scheduler(header, payload)
         header2, payload2 = self.recv_from_scheduler()
 
         if header2['status'] != 'OK':
             raise payload2['result']
 
-        return payload2['result']
+        # The scheduler holds the results for us until we release them
+        result = type(collection)(dsk, *collection._args[1:])
+        ref = weakref.ref(result, self._collection_freed)
+        self.persisted[id(ref)] = (ref, list(flatten(keys)))
+        return result
+
+    def submit(self, func, *args, **kwargs):
+        """ Submit a function call to the cluster, return a Future
+
+        Returns immediately.  Futures may appear among the arguments, in
+        which case the call runs on their results.
+
+        Example
+        -------
+
+        >>> x = client.submit(inc, 1)  # doctest: +SKIP
+        >>> y = client.submit(add, x, 10)  # doctest: +SKIP
+        >>> y.result()  # doctest: +SKIP
+        12
 
-    def scheduler_status(self):
-        header = {'function': 'status'}
+        See Also:
+            Client.map
+            as_completed
+        """
+        key, dsk = _call_graph(func, args, kwargs)
+        return self._submit_graph(dsk, key)
+
+    def map(self, func, *seqs):
+        """ Submit a function call for each element of the sequences
+
+        Returns a list of Futures, one for each call.  All calls go to the
+        scheduler as a single job, yet each future completes on its own as
+        soon as its result is ready, see ``as_completed``.  If one call
+        fails then the calls that are still pending fail along with it.
+
+        >>> futures = client.map(inc, range(10))  # doctest: +SKIP
+
+        See Also:
+            Client.submit
+        """
+        dsk = dict()
+        futures = []
+        for args in zip(*seqs):
+            key, dsk2 = _call_graph(func, args)
+            futures.append(Future(key, self, dsk2))
+            dsk.update(dsk2)
+        if futures:
+            self._submit_futures(dsk, futures)
+        return futures
+
+    def compute(self, collection, resources=None):
+        """ Compute collection on the cluster, return a Future
+
+        Unlike ``collection.compute(get=client.get)`` this returns
+        immediately.  The result of the future is that of
+        ``collection.compute()``.  Every task of the collection needs
+        ``resources`` on its worker, if given, see ``Client.persist``.
+
+        >>> future = client.compute(b.sum())  # doctest: +SKIP
+        >>> future.result()  # doctest: +SKIP
+        45
+
+        >>> q, r = da.linalg.tsqr(x)  # doctest: +SKIP
+        >>> future = client.compute(q, resources={'memory': 16e9})  # doctest: +SKIP
+        """
+        keys = collection._keys()
+        dsk = collection._optimize(collection.dask, keys)
+        future = self._submit_graph(dsk, keys,
+                                    _resources_for_graph(dsk, resources))
+        future._finalize = partial(collection._finalize, collection)
+        return future
+
+    def _submit_graph(self, dsk, keys, resources=None):
+        """ Start computing graph on the scheduler without waiting """
+        future = Future(keys, self, dsk)
+        self._submit_futures(dsk, [future], resources)
+        return future
+
+    def _submit_futures(self, dsk, futures, resources=None):
+        """ Compute the keys of several futures in one job
+
+        With more than one future the scheduler reports each key once it is
+        ready, see ``Scheduler._schedule_from_client``.
+        """
+        jobid = next(jobids)
+        header = {'function': 'schedule', 'jobid': jobid}
+        if len(futures) == 1:
+            keys = futures[0].key
+        else:
+            keys = [future.key for future in futures]
+        payload = {'dask': protocol.pack_graph(dsk), 'keys': keys,
+                   'direct': True, 'resources': resources,
+                   'progress': len(futures) > 1}
+        self.send_to_scheduler(header, payload)
+        self.pending_futures[jobid] = futures
+        for future in futures:
+            self.futures[id(future)] = future
+
+    def _future_finished(self, header, payload):
+        """ Handle 'schedule-progress' or 'schedule-ack' for futures
+
+        The scheduler holds the results for us until the future is freed,
+        see ``Future.__del__``.
+        """
+        if header['function'] == 'schedule-progress':
+            futures = self.pending_futures[header['jobid']]
+            future = futures[payload['index']]
+            if future.status == 'pending':
+                future._locations = payload['locations']
+                future.status = 'finished'
+            return
+        futures = self.pending_futures.pop(header['jobid'])
+        for future in futures:
+            if future.status != 'pending':
+                continue
+            if header['status'] == 'OK':
+                future._locations = dict((k, payload['locations'][k])
+                                         for k in flatten([future.key]))
+                future.status = 'finished'
+            else:
+                future._exception = payload['result']
+                future.status = 'error'
+
+    def _poll_futures(self, timeout=0):
+        """ Handle replies about pending futures
+
+        Waits up to ``timeout`` milliseconds for the first reply, forever if
+        ``timeout`` is None, and then handles any others that have arrived.
+        """
+        while self.pending_futures and self.socket.poll(timeout):
+            self.recv_from_scheduler(futures_only=True)
+            timeout = 0
+
+    def _collection_freed(self, ref):
+        """ Remember the keys of a persisted collection that was freed
+
+        Runs within garbage collection, so we don't talk to the scheduler
+        here, see ``send_to_scheduler``.
+        """
+        ref, keys = self.persisted.pop(id(ref), (None, ()))
+        self.freed_keys.extend(keys)
+
+    def _release_freed_keys(self):
+        keys, self.freed_keys = self.freed_keys, []
+        if keys:
+            self._send_to_scheduler({'function': 'release-keys'},
+                                    {'keys': keys})
+
+    def _worker_socket(self, address):
+        """ Cached DEALER socket connected to a worker """
+        if isinstance(address, unicode):
+            address = address.encode()
+        if address not in self.worker_sockets:
+            sock = context.socket(zmq.DEALER)
+            sock.connect(address)
+            self.worker_sockets[address] = sock
+        return self.worker_sockets[address]
+
+    def _close_worker_socket(self, address):
+        """ Drop our socket to a worker, e.g. so that late replies vanish """
+        sock = self.worker_sockets.pop(address, None)
+        if sock is not None:
+            sock.close(0)
+
+    def scheduler_status(self, metrics=False):
+        """ Check on the scheduler, returns 'OK'
+
+        With ``metrics=True`` returns instead counters about the scheduler
+        and its workers, see ``Scheduler.metrics``.
+        """
+        header = {'function': 'metrics' if metrics else 'status'}
         payload = {}
         self.send_to_scheduler(header, payload)
 
@@ -59,20 +404,36 @@ class Client(object):
         return payload2
 
     def send_to_scheduler(self, header, payload):
+        self._release_freed_keys()
+        self._send_to_scheduler(header, payload)
+
+    def _send_to_scheduler(self, header, payload):
         log(self.address, 'Send to scheduler', header)
         if 'address' not in header:
             header['address'] = self.address
         header['timestamp'] = datetime.utcnow()
         header['loads'] = dill.loads
-        self.socket.send_multipart([pickle.dumps(header), dill.dumps(payload)])
+        frames = protocol.dumps(payload, dill.dumps)
+        self.socket.send_multipart([pickle.dumps(header)] + frames, copy=False)
+
+    def recv_from_scheduler(self, futures_only=False):
+        """ Receive the next reply from the scheduler
 
-    def recv_from_scheduler(self):
-        header, payload = self.socket.recv_multipart()
-        header = pickle.loads(header)
-        loads = header.get('loads', pickle.loads)
-        payload = loads(payload)
-        log(self.address, 'Received from scheduler', header)
-        return header, payload
+        Replies about pending futures may arrive before the one that we
+        expect.  We handle those on the way.
+        """
+        while True:
+            frames = self.socket.recv_multipart(copy=False)
+            header = pickle.loads(frames[0].bytes)
+            loads = header.get('loads', pickle.loads)
+            payload = protocol.loads(frames[1:], loads)
+            log(self.address, 'Received from scheduler', header)
+            if header.get('jobid') in self.pending_futures:
+                self._future_finished(header, payload)
+                if futures_only:
+                    return
+            else:
+                return header, payload
 
     def send_recv(self, header, payload):
         self.send_to_scheduler(header, payload)
@@ -124,9 +485,17 @@ class Client(object):
         self.send_to_scheduler(header, {})
 
     def close(self, close_scheduler=False):
+        # Release the results of all persisted collections
+        for ref, keys in list(self.persisted.values()):
+            self._collection_freed(ref)
+        for future in list(self.futures.values()):
+            future.release()
+        self._release_freed_keys()
         if close_scheduler:
             self.close_scheduler()
         self.socket.close(1)
+        for sock in self.worker_sockets.values():
+            sock.close(1)
 
     def register_client(self):
         header = {'function': 'register'}
@@ -138,3 +507,160 @@ class Client(object):
         self.send_to_scheduler({'function': 'get_workers'}, {})
         header, payload = self.recv_from_scheduler()
         return payload['workers']
+
+
+class Future(object):
+    """ The result of a computation that runs on the cluster
+
+    Returned by ``Client.submit``, ``Client.map`` and ``Client.compute``.
+    The result stays on the workers until we ask for it with ``result``.
+    The workers release it once the future is freed.
+
+    State
+    -----
+
+    key: key or list of keys
+        The keys computed for this future
+    status: string
+        One of 'pending', 'finished' or 'error'
+
+    See Also:
+        as_completed
+    """
+    def __init__(self, key, client, dsk):
+        self.key = key
+        self.client = client
+        self.dask = dsk
+        self.status = 'pending'
+        self._locations = None
+        self._exception = None
+        self._finalize = None
+
+    def done(self):
+        """ Is the computation complete, successful or not """
+        if self.status == 'pending':
+            self.client._poll_futures()
+        return self.status != 'pending'
+
+    def _wait(self):
+        while self.status == 'pending':
+            self.client._poll_futures(None)
+
+    def exception(self):
+        """ Wait for the computation, return its exception or None """
+        self._wait()
+        return self._exception
+
+    def result(self):
+        """ Wait for the computation, collect its result from the workers
+
+        Raises the exception of the computation if it failed.
+        """
+        self._wait()
+        if self.status == 'error':
+            raise self._exception
+        if self.status != 'finished':
+            raise ValueError("Future has been released")
+        result = self.client.gather(self.key, self._locations, self.dask)
+        if self._finalize is not None:
+            result = self._finalize(result)
+        return result
+
+    def release(self):
+        """ Let the workers drop our result, see ``Client._release_freed_keys``
+        """
+        if self.status == 'finished':
+            self.client.freed_keys.extend(self._locations)
+        if self.status != 'pending':
+            self.status = 'released'
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        return '<Future: status: %s, key: %s>' % (self.status, self.key)
+
+
+def _resources_for_graph(dsk, resources):
+    """ Require the same resources for every task of a graph
+
+    >>> _resources_for_graph({'x': 1}, {'GPU': 1})
+    {'x': {'GPU': 1}}
+    >>> _resources_for_graph({'x': 1}, None)
+    """
+    if not resources:
+        return None
+    return dict((k, resources) for k in dsk)
+
+
+def _call_graph(func, args, kwargs=None):
+    """ Key and graph of a function call, see ``Client.submit``
+
+    >>> key, dsk = _call_graph(len, ([1, 2],))
+    >>> dsk[key]
+    (<built-in function len>, [1, 2])
+    """
+    key = '%s-%s' % (getattr(func, '__name__', 'task'), uuid.uuid4().hex)
+    dsk = dict()
+    args = [_unpack_futures(arg, dsk) for arg in args]
+    if kwargs:
+        names = list(kwargs)
+        values = [_unpack_futures(kwargs[k], dsk) for k in names]
+        dsk[key] = (apply, func, (list, args),
+                    (dict, (zip, names, (list, values))))
+    else:
+        dsk[key] = (func,) + tuple(args)
+    return key, dsk
+
+
+def _unpack_futures(arg, dsk):
+    """ Replace futures in a task argument with their keys
+
+    Adds the graphs of those futures to ``dsk``, so that the scheduler can
+    compute them if they are not yet done.  Looks into lists and tuples.
+
+    >>> dsk = {}
+    >>> _unpack_futures([1, 2], dsk)
+    [1, 2]
+    """
+    if isinstance(arg, Future):
+        dsk.update(arg.dask)
+        return arg.key
+    if isinstance(arg, list):
+        return [_unpack_futures(a, dsk) for a in arg]
+    if type(arg) is tuple:
+        return tuple(_unpack_futures(a, dsk) for a in arg)
+    return arg
+
+
+def as_completed(futures):
+    """ Iterate over futures in the order in which they complete
+
+    Yields each future once its computation has finished, successfully or
+    not.
+
+    >>> futures = client.map(score, parameters)  # doctest: +SKIP
+    >>> for future in as_completed(futures):  # doctest: +SKIP
+    ...     print(future.result())
+
+    See Also:
+        Client.submit
+        Client.map
+    """
+    pending = list(futures)
+    clients = list(set([f.client for f in pending]))
+    while pending:
+        done = [f for f in pending if f.status != 'pending']
+        if not done:
+            if len(clients) == 1:
+                clients[0]._poll_futures(None)
+            else:
+                for client in clients:
+                    client._poll_futures(10)
+            continue
+        for future in done:
+            pending.remove(future)
+            yield future
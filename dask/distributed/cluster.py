@@ -0,0 +1,165 @@
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+from multiprocessing import cpu_count
+from time import sleep, time
+
+from .scheduler import Scheduler
+from .worker import Worker
+from .client import Client
+
+
+def _process_context():
+    """ Where worker processes come from
+
+    Forking a process that runs a scheduler copies its zmq context, which
+    zmq does not support, and locks that its threads hold, e.g. those of
+    ``logging``.  Where we can, we start workers from a clean forkserver
+    process instead, or spawn them where we can not fork.  Python 2 can only
+    fork this process, see ``LocalCluster``.
+    """
+    try:
+        from multiprocessing import get_context
+    except ImportError:  # Python 2 and 3.3
+        return multiprocessing
+    try:
+        return get_context('forkserver')
+    except ValueError:
+        return get_context('spawn')
+
+
+def _run_worker(conn, kwargs):
+    """ Target of worker processes, returns once the scheduler closes us
+
+    We receive the address of the scheduler on ``conn``.
+    """
+    scheduler = conn.recv()
+    conn.close()
+    Worker(scheduler, block=True, **kwargs)
+
+
+class LocalCluster(object):
+    """ Scheduler and worker processes on the local machine
+
+    Starts a scheduler in this process and ``nworkers`` worker processes
+    that connect to it over the loopback interface.  Separate processes let
+    pure Python tasks run in parallel despite the GIL.
+
+    We start the workers before the scheduler and send them its address once
+    it is bound, so that they never inherit its sockets and threads.  Later
+    calls to ``start_worker`` fork this process on Python 2 only.
+
+    >>> cluster = LocalCluster(nworkers=4)  # doctest: +SKIP
+    >>> client = cluster.client()  # doctest: +SKIP
+    >>> client.get({'x': (inc, 1)}, 'x')  # doctest: +SKIP
+    2
+    >>> cluster.close()  # doctest: +SKIP
+
+    Parameters
+    ----------
+
+    nworkers: int
+        Number of worker processes, defaults to the number of cores
+    ncores: int
+        Number of tasks that each worker runs at once, defaults to 1
+    nthreads: int
+        Size of the thread pool of each worker, which also serves data to
+        peers and runs other requests from the scheduler
+    hostname: string
+        Interface on which everything listens, defaults to loopback
+    timeout: number
+        Seconds to wait for the workers to register with the scheduler
+    **kwargs:
+        Passed on to each ``Worker``, e.g. ``memory_limit``
+
+    State
+    -----
+
+    scheduler: Scheduler
+    processes: list
+        ``multiprocessing.Process`` objects running the workers
+    """
+    def __init__(self, nworkers=None, ncores=1, nthreads=10,
+                 hostname='127.0.0.1', timeout=20, **kwargs):
+        self.scheduler = None
+        self.clients = []
+        kwargs.update({'ncores': ncores, 'nthreads': nthreads,
+                       'hostname': hostname, 'bind_to_workers': hostname})
+        self.worker_kwargs = kwargs
+        self.processes = []
+        self._context = _process_context()
+        try:
+            conns = [self._start_process()
+                     for i in range(nworkers or cpu_count())]
+            self.scheduler = Scheduler(hostname=hostname,
+                                       bind_to_workers=hostname,
+                                       bind_to_clients=hostname)
+            for conn in conns:
+                conn.send(self.scheduler.address_to_workers)
+                conn.close()
+            self.wait_for_workers(len(self.processes), timeout)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def address_to_clients(self):
+        return self.scheduler.address_to_clients
+
+    def start_worker(self):
+        """ Start one more worker process """
+        conn = self._start_process()
+        conn.send(self.scheduler.address_to_workers)
+        conn.close()
+        return self.processes[-1]
+
+    def _start_process(self):
+        """ Start a worker process, return where to send it our address """
+        receiver, sender = self._context.Pipe(duplex=False)
+        proc = self._context.Process(target=_run_worker,
+                                     args=(receiver, self.worker_kwargs))
+        proc.daemon = True
+        proc.start()
+        receiver.close()
+        self.processes.append(proc)
+        return sender
+
+    def wait_for_workers(self, n, timeout=20):
+        """ Block until ``n`` workers have registered with the scheduler """
+        start = time()
+        while len(self.scheduler.workers) < n:
+            if time() - start > timeout:
+                raise ValueError("Only %d of %d workers started within %s"
+                                 " seconds" % (len(self.scheduler.workers),
+                                               n, timeout))
+            sleep(0.01)
+
+    def client(self):
+        """ A new Client connected to our scheduler, closed with the cluster
+        """
+        c = Client(self.address_to_clients)
+        self.clients.append(c)
+        return c
+
+    def close(self, timeout=5):
+        """ Close clients and scheduler, wait for the worker processes """
+        for c in self.clients:
+            c.close()
+        del self.clients[:]
+        if self.scheduler is not None and self.scheduler.status != 'closed':
+            self.scheduler.close()  # tells the workers to close
+        for proc in self.processes:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return '<LocalCluster: %s, %d workers>' % (self.address_to_clients,
+                                                   len(self.processes))
@@ -0,0 +1,270 @@
+""" Frame-based serialization for messages between scheduler, workers, clients
+
+Payloads are pickled as usual except that large NumPy arrays, including the
+blocks inside pandas objects, are pulled out of the pickle stream with the
+``persistent_id`` hook.  Each such array travels as its own zmq frame so that
+it can be sent with ``copy=False`` and rebuilt on the other side with
+``np.frombuffer`` without copying.
+
+    >>> frames = dumps({'x': 1})
+    >>> loads(frames)
+    {'x': 1}
+
+Arrays rebuilt from frames are read-only views onto the received message, or
+onto the decompressed frame.  Tasks on workers receive such arrays as inputs
+and so must not modify them in place.
+
+Frames may be compressed when a compression library is installed and a sample
+of the data compresses well.  See ``compressions`` and
+``default_compression``.
+
+Clients ship dask graphs as a ``PackedGraph``, see ``pack_graph``.
+"""
+from __future__ import absolute_import, division, print_function
+
+import zlib
+from io import BytesIO
+
+import dill
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Arrays smaller than this stay in the pickle stream
+frame_split_size = 2**16
+
+# Compress only if a sample shrinks to at most this fraction of its size
+compression_ratio = 0.9
+sample_size = 10000
+
+
+compressions = {'zlib': (zlib.compress, zlib.decompress)}
+
+default_compression = None
+
+try:
+    import blosc
+    compressions['blosc'] = (lambda b: blosc.compress(b, typesize=8),
+                             blosc.decompress)
+    default_compression = 'blosc'
+except ImportError:
+    pass
+
+try:
+    import snappy
+    compressions['snappy'] = (snappy.compress, snappy.decompress)
+    default_compression = 'snappy'
+except ImportError:
+    pass
+
+try:
+    import lz4.block as _lz4
+except ImportError:
+    try:
+        import lz4 as _lz4
+    except ImportError:
+        _lz4 = None
+if _lz4 is not None:
+    compressions['lz4'] = (_lz4.compress, _lz4.decompress)
+    default_compression = 'lz4'
+
+
+def pickle_dumps(obj):
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# Map plain ``dumps``/``loads`` functions, as found in message headers, onto
+# the Pickler/Unpickler classes that support the ``persistent_id`` hook
+picklers = {pickle.dumps: pickle.Pickler,
+            pickle_dumps: pickle.Pickler,
+            dill.dumps: dill.Pickler}
+
+unpicklers = {pickle.loads: pickle.Unpickler,
+              dill.loads: dill.Unpickler}
+
+
+def maybe_compress(data, compression=None):
+    """ Compress bytes or a uint8 NumPy array if it pays off
+
+    Returns the name of the compression used, or None, and the data.  We only
+    copy an array if a sample of it compresses well.
+
+    >>> maybe_compress(b'0' * 100000, 'zlib')[0]
+    'zlib'
+    >>> maybe_compress(b'0' * 100000, None)[0]
+    """
+    if compression is None:
+        return None, data
+    compress = compressions[compression][0]
+    sample = _tobytes(data[:sample_size])
+    if len(compress(sample)) > compression_ratio * len(sample):
+        return None, data
+    compressed = compress(_tobytes(data))
+    if len(compressed) > compression_ratio * len(data):
+        return None, data
+    return compression, compressed
+
+
+def _tobytes(data):
+    """ Bytes of bytes or of a NumPy array """
+    if isinstance(data, bytes):
+        return data
+    return data.tobytes()
+
+
+def _extract_array(frames, compression, obj):
+    """ ``persistent_id`` hook, moves large arrays out to ``frames`` """
+    if (type(obj) is not np.ndarray or obj.dtype.hasobject or
+            obj.nbytes < frame_split_size):
+        return None
+    if not obj.flags.c_contiguous:
+        obj = np.ascontiguousarray(obj)
+    comp, data = maybe_compress(obj.ravel().view(np.uint8), compression)
+    if comp is None:
+        data = obj
+    frames.append(data)
+    return ('ndarray', obj.dtype, obj.shape, len(frames) - 1, comp)
+
+
+def _load_array(frames, pid):
+    """ ``persistent_load`` hook, rebuilds arrays from ``frames`` """
+    typ, dtype, shape, i, comp = pid
+    if typ != 'ndarray':
+        raise pickle.UnpicklingError('Unknown persistent id %r' % (typ,))
+    frame = frames[i]
+    if comp is not None:
+        frame = compressions[comp][1](_bytes(frame))
+    return np.frombuffer(frame, dtype=dtype).reshape(shape)
+
+
+def _bytes(frame):
+    """ Bytes of a frame, which may be a ``zmq.Frame`` """
+    return getattr(frame, 'bytes', frame)
+
+
+def dumps(obj, dumps=pickle_dumps, compression=default_compression):
+    """ Serialize object into a list of frames
+
+    The first frame holds the pickled object.  Later frames hold the data of
+    large NumPy arrays and may be NumPy arrays themselves, suitable for
+    ``socket.send_multipart(frames, copy=False)``.
+
+    Parameters
+    ----------
+    obj: object
+    dumps: callable
+        ``pickle.dumps`` or ``dill.dumps``.  Other functions are used as is
+        and produce a single frame.
+    compression: string or None
+        Name of a compression in ``compressions`` to try on array frames
+
+    See Also:
+        loads
+    """
+    pickler = picklers.get(dumps)
+    if pickler is None or np is None:
+        return [dumps(obj)]
+    frames = [None]
+    f = BytesIO()
+    p = pickler(f, pickle.HIGHEST_PROTOCOL)
+    p.persistent_id = lambda o: _extract_array(frames, compression, o)
+    p.dump(obj)
+    frames[0] = f.getvalue()
+    return frames
+
+
+def loads(frames, loads=pickle.loads):
+    """ Deserialize object from a list of frames
+
+    Frames may be bytes or ``zmq.Frame`` objects as received with
+    ``recv_multipart(copy=False)``.  A single bytestring is treated as one
+    frame.
+
+    See Also:
+        dumps
+    """
+    if isinstance(frames, bytes):
+        frames = [frames]
+    unpickler = unpicklers.get(loads)
+    if unpickler is None or len(frames) == 1:
+        return loads(_bytes(frames[0]))
+    p = unpickler(BytesIO(_bytes(frames[0])))
+    p.persistent_load = lambda pid: _load_array(frames, pid)
+    return p.load()
+
+
+class PackedGraph(object):
+    """ Compact form of a dask graph, see ``pack_graph`` """
+    def __init__(self, constants, compression, data):
+        self.constants = constants
+        self.compression = compression
+        self.data = data
+
+    def __getstate__(self):
+        return (self.constants, self.compression, self.data)
+
+    def __setstate__(self, state):
+        self.constants, self.compression, self.data = state
+
+
+def _intern_constant(constants, ids, obj):
+    """ ``persistent_id`` hook, moves functions and arrays to ``constants`` """
+    if not callable(obj) and (np is None or type(obj) is not np.ndarray):
+        return None
+    i = ids.get(id(obj))
+    if i is None:
+        i = ids[id(obj)] = len(constants)
+        constants.append(obj)
+    return i
+
+
+def pack_graph(dsk, compression=default_compression or 'zlib'):
+    """ Pack a dask graph for cheap shipping
+
+    Every task repeats the same few functions, which may need ``dill``,
+    which pickles slowly.  We pickle the graph with the fast standard
+    pickler instead and pull out every function, and every NumPy array, into
+    a list of ``constants`` that holds each object once.  Tasks refer to
+    them by position.  Then we compress the pickled graph, in which keys and
+    arguments repeat a lot.
+
+    Pickle the result as usual with ``dumps``, so that the constants go
+    through ``dill`` and large arrays travel in their own frames.
+
+    >>> from operator import add
+    >>> dsk = {'y': (add, 'x', 1)}
+    >>> unpack_graph(loads(dumps(pack_graph(dsk))))
+    {'y': (<built-in function add>, 'x', 1)}
+
+    See Also:
+        unpack_graph
+    """
+    constants = []
+    ids = dict()
+    f = BytesIO()
+    p = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+    p.persistent_id = lambda o: _intern_constant(constants, ids, o)
+    p.dump(dsk)
+    comp, data = maybe_compress(f.getvalue(), compression)
+    return PackedGraph(constants, comp, data)
+
+
+def unpack_graph(packed):
+    """ Rebuild a dask graph from ``pack_graph``, pass plain dicts through """
+    if not isinstance(packed, PackedGraph):
+        return packed
+    data = packed.data
+    if packed.compression is not None:
+        data = compressions[packed.compression][1](data)
+    constants = packed.constants
+    p = pickle.Unpickler(BytesIO(data))
+    p.persistent_load = lambda i: constants[i]
+    return p.load()
@@ -7,10 +7,11 @@ import traceback
 import sys
 import random
 from functools import partial
-from collections import defaultdict
+from collections import defaultdict, deque
 from multiprocessing.pool import ThreadPool
 from datetime import datetime
-from threading import Thread, Lock, Event
+from time import time, sleep
+from threading import Thread, Lock, RLock, Event, Condition, current_thread
 from contextlib import contextmanager
 
 import dill
@@ -24,7 +25,9 @@ except ImportError:
 
 from ..core import get_dependencies, flatten
 from ..optimize import cull
+from ..utils import nbytes
 from .. import core
+from . import protocol
 from ..async import (sortkey, finish_task,
         start_state_from_dask as dag_state_from_dask)
 
@@ -48,6 +51,107 @@ def logerrors():
         log('Traceback', str(tb))
         raise
 
+
+def key_prefix(key):
+    """ Name of the group of similar tasks to which a key belongs
+
+    We drop indices from tuple keys and tokens from the ends of names
+
+    >>> key_prefix(('x', 1, 2))
+    'x'
+    >>> key_prefix('sum-3b2c8f1e4a')
+    'sum'
+    >>> key_prefix('from-array-3b2c8f1e4a')
+    'from-array'
+    """
+    while isinstance(key, tuple) and key:
+        key = key[0]
+    if isinstance(key, bytes) and not isinstance(key, str):  # Python 3
+        key = key.decode('utf-8', 'replace')
+    if not isinstance(key, (str, unicode)):
+        key = str(key)
+    words = key.split('-')
+    while (len(words) > 1 and len(words[-1]) >= 8 and
+           all(c in '0123456789abcdef' for c in words[-1])):
+        words.pop()
+    return '-'.join(words)
+
+
+class WorkerSlots(object):
+    """ Free task slots of workers, a multiset of worker addresses
+
+    A worker has one slot for each task that it may have in flight, see
+    ``Scheduler.tasks_per_worker``.  We keep slots in the order in which
+    they came free, so that ties may go to the worker that has waited
+    longest.  All methods are threadsafe.
+
+    >>> slots = WorkerSlots()
+    >>> slots.put('alice', 2)
+    >>> slots.put('bob')
+    >>> len(slots)
+    3
+    >>> slots.take()
+    'alice'
+    >>> slots.take(lambda workers: workers[-1])
+    'bob'
+    >>> slots.remove('alice')
+    True
+    >>> slots.take(block=False)
+    """
+    def __init__(self):
+        self._slots = deque()
+        self._condition = Condition(Lock())
+
+    def put(self, worker, n=1):
+        """ Add ``n`` free slots of a worker """
+        with self._condition:
+            for i in range(n):
+                self._slots.append(worker)
+            self._condition.notify(n)
+
+    def take(self, choose=None, block=True):
+        """ Take a free slot, return its worker
+
+        ``choose`` picks a worker from the list of free slots, oldest first.
+        It may return None to take nothing.  By default we take the oldest
+        slot.  If there are no free slots then we wait for one, or with
+        ``block=False`` return None.
+        """
+        with self._condition:
+            while not self._slots:
+                if not block:
+                    return None
+                self._condition.wait()
+            if choose is None:
+                return self._slots.popleft()
+            worker = choose(list(self._slots))
+            if worker is not None:
+                self._slots.remove(worker)
+            return worker
+
+    def remove(self, worker):
+        """ Take a free slot of this worker if it has one, return whether """
+        with self._condition:
+            if worker not in self._slots:
+                return False
+            self._slots.remove(worker)
+            return True
+
+    def remove_all(self, worker):
+        """ Drop all free slots of a worker, e.g. once it died """
+        with self._condition:
+            self._slots = deque(w for w in self._slots if w != worker)
+
+    def workers(self):
+        """ List of the workers of all free slots, oldest first """
+        with self._condition:
+            return list(self._slots)
+
+    def __len__(self):
+        with self._condition:
+            return len(self._slots)
+
+
 class Scheduler(object):
     """ Disitributed scheduler for dask computations
 
@@ -66,18 +170,67 @@ class Scheduler(object):
         Addresses from which we accept client connections, defaults to *
     block: bool
         Whether or not to block the process on creation
+    tasks_per_worker: int
+        Number of tasks to keep in flight on each worker, defaults to 1.
+        Values larger than one hide the round-trip latency between a task
+        finishing and the next one arriving.  Workers prefetch the inputs of
+        queued tasks while computing others.
 
     State
     -----
 
     workers - dict
-        Maps worker identities to information about that worker
+        Maps worker identities to information about that worker, as sent in
+        its last heartbeat, e.g. its memory use
+    available_workers - WorkerSlots
+        Free task slots of our workers
     who_has - dict
         Maps data keys to sets of workers that own that data
     worker_has - dict
         Maps workers to data that they own
     data - dict
         Maps data keys to metadata about the computation that produced it
+    nbytes - dict
+        Maps data keys to the size of that data in bytes, as reported by the
+        workers that hold it
+    task_duration - dict
+        Maps key prefixes (see ``key_prefix``) to a moving average of how
+        many seconds their tasks take to compute
+    bandwidth - float
+        Moving average of the bytes per second at which workers collect data
+        from each other
+    transferred_bytes - int
+        Total bytes that workers have collected from each other
+    tasks_finished - int
+        Number of tasks that workers have computed successfully
+    message_counts - dict
+        Maps message types, e.g. 'finished-task', to the number handled
+    message_time - dict
+        Maps message types to the total seconds spent handling them
+    processing - dict
+        Maps workers to the set of keys they are currently computing
+    in_flight - dict
+        Maps keys sent to workers to their task, dependencies and job queue,
+        so that we can send them elsewhere, see ``steal_work``
+    stealing - dict
+        Maps keys that we are trying to steal to the worker that has them and
+        the worker that we want to give them to.  We reserve a slot of the
+        latter meanwhile
+    task_resources - dict
+        Maps keys sent to workers to that worker and the resources that the
+        task holds there, see ``worker_resources``
+    resources_used - dict
+        Maps workers to the total resources held by the tasks they process
+    lost_workers - set
+        Workers that we have removed as dead, see ``remove_workers``
+    replicating - dict
+        Maps data keys to workers that are copying that data, see
+        ``replicate``
+    held_keys - dict
+        Maps result keys to the number of clients collecting them directly
+        from workers
+    release_when_unheld - set
+        Result keys to release once no client collects them any longer
     to_workers - zmq.Socket (ROUTER)
         Socket to communicate to workers
     to_clients - zmq.Socket (ROUTER)
@@ -87,12 +240,15 @@ class Scheduler(object):
     """
     def __init__(self, port_to_workers=None, port_to_clients=None,
                  bind_to_workers='*', bind_to_clients='*',
-                 hostname=None, block=False, worker_timeout=20):
+                 hostname=None, block=False, worker_timeout=20,
+                 tasks_per_worker=1):
         self.context = zmq.Context()
         hostname = hostname or socket.gethostname()
 
         # Bind routers to addresses (and create addresses if necessary)
         self.to_workers = self.context.socket(zmq.ROUTER)
+        # Fail loudly when sending to a worker whose connection has closed
+        self.to_workers.setsockopt(zmq.ROUTER_MANDATORY, 1)
         if port_to_workers is None:
             port_to_workers = self.to_workers.bind_to_random_port('tcp://' + bind_to_workers)
         else:
@@ -101,6 +257,11 @@ class Scheduler(object):
         self.worker_poller = zmq.Poller()
         self.worker_poller.register(self.to_workers, zmq.POLLIN)
 
+        # Hear about closed worker connections as they happen
+        self._worker_monitor = self.to_workers.get_monitor_socket(
+                                            zmq.EVENT_DISCONNECTED)
+        self.worker_poller.register(self._worker_monitor, zmq.POLLIN)
+
         self.to_clients = self.context.socket(zmq.ROUTER)
         if port_to_clients is None:
             port_to_clients = self.to_clients.bind_to_random_port('tcp://' + bind_to_clients)
@@ -115,8 +276,34 @@ class Scheduler(object):
         self.workers = dict()
         self.who_has = defaultdict(set)
         self.worker_has = defaultdict(set)
-        self.available_workers = Queue()
+        self.available_workers = WorkerSlots()
+        self.tasks_per_worker = tasks_per_worker
         self.data = defaultdict(dict)
+        self.nbytes = dict()
+        self.task_duration = dict()
+        self.bandwidth = 100e6
+        self.transferred_bytes = 0
+        self.tasks_finished = 0
+        self._finish_times = deque(maxlen=10000)
+        self.message_counts = defaultdict(int)
+        self.message_time = defaultdict(float)
+        self._metrics_lock = Lock()
+        self.start_time = time()
+        self.default_task_duration = 0.5  # for tasks that we have never seen
+        self.latency = 1e-3  # seconds to ask a peer for data, of any size
+        self.smoothing = 0.5  # weight of new observations in averages
+        self.replicating = defaultdict(set)
+        self.dependents_per_replica = 4
+        self.memory_pressure = 0.8
+        self.processing = defaultdict(set)
+        self.in_flight = dict()
+        self.stealing = dict()
+        self.task_resources = dict()
+        self.resources_used = defaultdict(dict)
+        self.lost_workers = set()
+        self.pending_gathers = dict()
+        self.held_keys = defaultdict(int)
+        self.release_when_unheld = set()
         self.collections = dict()
 
         self.send_to_workers_queue = Queue()
@@ -131,22 +318,41 @@ class Scheduler(object):
         self.status = 'run'
         self.queues = dict()
 
-        self._schedule_lock = Lock()
+        self._schedule_lock = RLock()
+        self.jobs = dict()
+        self._job_counter = itertools.count()
+        self.listeners = defaultdict(set)
 
         # RPC functions that workers and clients can trigger
         self.worker_functions = {'heartbeat': self._heartbeat,
                                  'status': self._status_to_worker,
                                  'finished-task': self._worker_finished_task,
                                  'setitem-ack': self._setitem_ack,
-                                 'getitem-ack': self._getitem_ack}
+                                 'setitems-ack': self._setitems_ack,
+                                 'getitem-ack': self._getitem_ack,
+                                 'getitems-ack': self._getitems_ack,
+                                 'replicate-ack': self._replicate_ack,
+                                 'steal-ack': self._steal_ack}
         self.client_functions = {'status': self._status_to_client,
+                                 'metrics': self._metrics_to_client,
                                  'get_workers': self._get_workers,
                                  'register': self._client_registration,
                                  'schedule': self._schedule_from_client,
+                                 'release-keys': self._release_keys_from_client,
                                  'set-collection': self._set_collection,
                                  'get-collection': self._get_collection,
                                  'close': self._close}
 
+        # Handlers that never block run directly in the listening threads,
+        # saving a trip through the thread pool.  Others run in the pool.
+        self.immediate_functions = set(['heartbeat', 'status',
+                                        'finished-task', 'setitem-ack',
+                                        'setitems-ack', 'getitem-ack',
+                                        'getitems-ack', 'replicate-ack',
+                                        'steal-ack', 'metrics',
+                                        'get_workers',
+                                        'register', 'release-keys'])
+
         # Away we go!
         log(self.address_to_workers, 'Start')
         self._listen_to_workers_thread = Thread(target=self._listen_to_workers)
@@ -174,25 +380,108 @@ class Scheduler(object):
                     not self.send_to_workers_recv.closed):
 
                 self.send_to_workers_recv.recv()
-                while not self.send_to_workers_queue.empty():
-                    msg = self.send_to_workers_queue.get()
-                    self.to_workers.send_multipart(msg)
-                    self.send_to_workers_queue.task_done()
+                self._flush_send_to_workers_queue()
+
+            if self._worker_monitor in socks:
+                while True:
+                    try:
+                        self._worker_monitor.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                self._probe_workers()
 
             if self.to_workers in socks:
-                address, header, payload = self.to_workers.recv_multipart()
+                # Drain everything that has arrived before polling again
+                while True:
+                    try:
+                        frames = self.to_workers.recv_multipart(zmq.NOBLOCK,
+                                                                copy=False)
+                    except zmq.Again:
+                        break
+                    address, header = frames[0].bytes, frames[1].bytes
+                    payload = frames[2:]
+
+                    header = pickle.loads(header)
+                    if 'address' not in header:
+                        header['address'] = address
+                    log(self.address_to_workers, 'Receive job from worker',
+                        header)
+
+                    self._handle(self.worker_functions, header, payload,
+                                 self.address_to_workers)
+
+    def _flush_send_to_workers_queue(self):
+        """ Send messages queued by other threads, see ``send_to_worker`` """
+        while not self.send_to_workers_queue.empty():
+            msg = self.send_to_workers_queue.get()
+            try:
+                self._send_to_workers(msg)
+            finally:
+                self.send_to_workers_queue.task_done()
 
-                header = pickle.loads(header)
-                if 'address' not in header:
-                    header['address'] = address
-                log(self.address_to_workers, 'Receive job from worker', header)
+    def _send_to_workers(self, msg):
+        """ Send message on the worker router, removing unreachable workers
 
-                try:
-                    function = self.worker_functions[header['function']]
-                except KeyError:
-                    log(self.address_to_workers, 'Unknown function', header)
-                else:
-                    future = self.pool.apply_async(function, args=(header, payload))
+        Our router is ``ROUTER_MANDATORY`` so sending to a worker whose
+        connection has closed fails right away.  That worker is dead.  We
+        treat workers to which sending fails for other reasons alike, rather
+        than let the error kill the listening thread.
+        """
+        try:
+            self.to_workers.send_multipart(msg, copy=False)
+        except zmq.ZMQError as e:
+            if e.errno == zmq.EHOSTUNREACH:
+                log(self.address_to_workers, 'Worker unreachable', msg[0])
+            else:
+                log(self.address_to_workers, 'Failed to send to worker',
+                    msg[0], e)
+            if msg[0] in self.workers:
+                self.remove_workers([msg[0]])
+
+    def _probe_workers(self):
+        """ Find workers whose connections have closed
+
+        Called when our router reports a closed connection.  Zmq doesn't tell
+        us whose, so we send a 'ping' to every worker, see ``_send_to_workers``
+
+        See Also:
+            Worker.ping
+        """
+        for address in list(self.workers):
+            self.send_to_worker(address, {'function': 'ping'}, {})
+
+    def _handle(self, functions, header, payload, address):
+        """ Run a message handler inline if it never blocks, else in the pool
+
+        See Also:
+            Scheduler.immediate_functions
+        """
+        name = header['function']
+        try:
+            function = functions[name]
+        except KeyError:
+            log(address, 'Unknown function', header)
+            return
+        if name in self.immediate_functions:
+            try:
+                self._run_handler(name, function, header, payload)
+            except Exception as e:
+                log(address, 'Error in handler', name, e)
+        else:
+            self.pool.apply_async(self._run_handler,
+                                  args=(name, function, header, payload))
+
+    def _run_handler(self, name, function, header, payload):
+        """ Run a message handler, count it in ``message_counts``/``_time``
+        """
+        start = time()
+        try:
+            return function(header, payload)
+        finally:
+            duration = time() - start
+            with self._metrics_lock:
+                self.message_counts[name] += 1
+                self.message_time[name] += duration
 
     def _listen_to_clients(self):
         """ Event loop: Listen to client router """
@@ -203,23 +492,26 @@ class Scheduler(object):
             except zmq.ZMQError:
                 break
             with self.lock:
-                address, header, payload = self.to_clients.recv_multipart()
+                frames = self.to_clients.recv_multipart(copy=False)
+            address, header = frames[0].bytes, frames[1].bytes
+            payload = frames[2:]
             header = pickle.loads(header)
             if 'address' not in header:
                 header['address'] = address
             log(self.address_to_clients, 'Receive job from client', header)
 
-            try:
-                function = self.client_functions[header['function']]
-            except KeyError:
-                log(self.address_to_clients, 'Unknown function', header)
-            else:
-                self.pool.apply_async(function, args=(header, payload))
+            self._handle(self.client_functions, header, payload,
+                         self.address_to_clients)
 
     def _monitor_workers(self, timeout=20):
-        """ Event loop: Monitor worker heartbeats """
+        """ Event loop: Monitor worker heartbeats
+
+        Catches workers that hang or lose their network without closing their
+        connection.  Closed connections are caught sooner, see
+        ``_probe_workers``.
+        """
         while self.status != 'closed':
-            self._monitor_workers_event.wait(timeout)
+            self._monitor_workers_event.wait(min(timeout, 1))
             self.prune_and_notify(timeout=timeout)
             self._monitor_workers_event.clear()
 
@@ -235,7 +527,7 @@ class Scheduler(object):
 
     def _client_registration(self, header, payload):
         """ Client comes in, register it, send back info about the cluster"""
-        payload = pickle.loads(payload)
+        payload = protocol.loads(payload)
         address = header['address']
         self.clients[address] = payload
         out_header = {}
@@ -252,7 +544,7 @@ class Scheduler(object):
         with logerrors():
             address = header['address']
 
-            payload = pickle.loads(payload)
+            payload = protocol.loads(payload)
             key = payload['key']
             duration = payload['duration']
             dependencies = payload['dependencies']
@@ -262,16 +554,44 @@ class Scheduler(object):
             for dep in dependencies:
                 self.who_has[dep].add(address)
                 self.worker_has[address].add(dep)
-            self.available_workers.put(address)
+            if payload['status'] == 'stolen':
+                return  # We moved it elsewhere already, see _steal_ack
+            self.processing[address].discard(key)
+            self.in_flight.pop(key, None)
+            if key in self.task_resources:
+                with self._schedule_lock:
+                    if self.task_resources.get(key, (None,))[0] == address:
+                        self._release_resources(key)
+            if address in self.workers:
+                self.available_workers.put(address)
 
-            if isinstance(payload['status'], Exception):
-                self.queues[payload['queue']].put(payload)
-            else:
+            if payload['status'] == 'OK':
+                self.tasks_finished += 1
+                self._finish_times.append(time())
                 self.data[key]['duration'] = duration
+                self._update_models(key, payload)
+                if payload.get('nbytes') is not None:
+                    self.nbytes[key] = payload['nbytes']
                 self.who_has[key].add(address)
                 self.worker_has[address].add(key)
-
-                self.queues[payload['queue']].put(payload)
+            elif payload['status'] == 'missing-data':
+                # No worker had the data that we said they had.  Forget it,
+                # the job will compute it again, see Scheduler.compute
+                with self._schedule_lock:
+                    for dep in payload['missing']:
+                        for w in self.who_has.pop(dep, ()):
+                            self.worker_has[w].discard(dep)
+
+            # Tell every job waiting on this key, see Scheduler._dispatch
+            with self._schedule_lock:
+                listeners = self.listeners.pop(key, set())
+            listeners.add(payload['queue'])
+            for qkey in listeners:
+                if qkey in self.queues:
+                    self.queues[qkey].put(payload)
+
+            self._dispatch()
+            self.steal_work()
 
     def _status_to_client(self, header, payload):
         with logerrors():
@@ -279,6 +599,61 @@ class Scheduler(object):
             log(self.address_to_clients, 'Status')
             self.send_to_client(header['address'], out_header, 'OK')
 
+    def _metrics_to_client(self, header, payload):
+        with logerrors():
+            out_header = {'jobid': header.get('jobid')}
+            self.send_to_client(header['address'], out_header, self.metrics())
+
+    def task_rate(self, window=5):
+        """ Tasks finished per second over the last ``window`` seconds """
+        now = time()
+        times = [t for t in list(self._finish_times) if now - t <= window]
+        if not times:
+            return 0.0
+        if len(times) == self._finish_times.maxlen:
+            window = now - times[0]
+        return len(times) / float(min(window, now - self.start_time) or 1)
+
+    def metrics(self):
+        """ Counters about the cluster, e.g. to monitor its health
+
+        Includes for every worker the counters from its last heartbeat (see
+        ``Worker.metrics``), the bytes it holds in memory and the number of
+        tasks we have sent it that it has not yet finished.  Processing time
+        per message type counts handlers that wait, e.g. on 'schedule' until
+        the whole graph is done.
+
+        >>> scheduler.metrics()  # doctest: +SKIP
+        {'tasks_finished': 1000,
+         'task_rate': 250.0,
+         'messages': {'finished-task': {'count': 1000, 'time': 0.35}, ...},
+         'workers': {'tcp://alice:5000': {'executed': 500, 'queued': 0, ...},
+                     ...},
+         ...}
+        """
+        workers = dict()
+        for address, info in list(self.workers.items()):
+            m = dict(info.get('metrics') or {})
+            m['memory'] = info.get('memory')
+            m['memory_limit'] = info.get('memory_limit')
+            m['processing'] = len(self.processing.get(address, ()))
+            m['last-seen'] = info.get('last-seen')
+            workers[address] = m
+        with self._metrics_lock:
+            messages = dict((name, {'count': self.message_counts[name],
+                                    'time': self.message_time[name]})
+                            for name in self.message_counts)
+            transferred_bytes = self.transferred_bytes
+        return {'time': datetime.utcnow(),
+                'uptime': time() - self.start_time,
+                'tasks_finished': self.tasks_finished,
+                'task_rate': self.task_rate(),
+                'transferred_bytes': transferred_bytes,
+                'available_slots': len(self.available_workers),
+                'jobs': len(self.jobs),
+                'messages': messages,
+                'workers': workers}
+
     def _status_to_worker(self, header, payload):
         out_header = {'jobid': header.get('jobid')}
         log(self.address_to_workers, 'Status sending')
@@ -288,39 +663,195 @@ class Scheduler(object):
         """ Send packet to worker """
         log(self.address_to_workers, 'Send to worker', address, header)
         header['address'] = self.address_to_workers
-        loads = header.get('loads', pickle.loads)
         dumps = header.get('dumps', pickle.dumps)
         if isinstance(address, unicode):
             address = address.encode()
         header['timestamp'] = datetime.utcnow()
+        msg = [address, pickle.dumps(header)] + protocol.dumps(payload, dumps)
 
-        self.send_to_workers_queue.put([address,
-                                        pickle.dumps(header),
-                                        dumps(payload)])
-        self.send_to_workers_send.send(b'')
+        if current_thread() is self._listen_to_workers_thread:
+            # We own the socket, send directly after anything queued earlier
+            self._flush_send_to_workers_queue()
+            self._send_to_workers(msg)
+        else:
+            self.send_to_workers_queue.put(msg)
+            self.send_to_workers_send.send(b'')
 
     def send_to_client(self, address, header, result):
         """ Send packet to client """
         log(self.address_to_clients, 'Send to client', address, header)
         header['address'] = self.address_to_clients
-        loads = header.get('loads', pickle.loads)
         dumps = header.get('dumps', pickle.dumps)
         if isinstance(address, unicode):
             address = address.encode()
         header['timestamp'] = datetime.utcnow()
+        frames = protocol.dumps(result, dumps)
         with self.lock:
-            self.to_clients.send_multipart([address,
-                                            pickle.dumps(header),
-                                            dumps(result)])
+            self.to_clients.send_multipart([address, pickle.dumps(header)] +
+                                           frames, copy=False)
+
+    def _update_models(self, key, payload):
+        """ Learn from a finished task how long tasks and transfers take """
+        prefix = key_prefix(key)
+        duration = payload['duration']
+        old = self.task_duration.get(prefix)
+        if old is None:
+            self.task_duration[prefix] = duration
+        else:
+            self.task_duration[prefix] = (self.smoothing * duration +
+                                          (1 - self.smoothing) * old)
+
+        size = payload.get('transfer_bytes') or 0
+        seconds = payload.get('transfer_time') or 0
+        with self._metrics_lock:
+            self.transferred_bytes += size
+
+        # Small transfers are all latency and say little about bandwidth
+        if size > 1e5 and seconds > self.latency:
+            bandwidth = size / (seconds - self.latency)
+            self.bandwidth = (self.smoothing * bandwidth +
+                              (1 - self.smoothing) * self.bandwidth)
+
+    def expected_duration(self, key):
+        """ Expected compute time of a task, see ``task_duration`` """
+        return self.task_duration.get(key_prefix(key),
+                                      self.default_task_duration)
+
+    def occupancy(self, worker):
+        """ Expected seconds of work queued on a worker
+
+        Sums the expected durations of the tasks that it is processing and
+        divides by its number of cores, as reported in its heartbeats.
+        """
+        ncores = self.workers.get(worker, {}).get('ncores') or 1
+        return (sum(self.expected_duration(key)
+                    for key in list(self.processing[worker])) / float(ncores))
 
-    def trigger_task(self, key, task, deps, queue):
-        """ Send a single task to the next available worker
+    def transfer_cost(self, worker, keys):
+        """ Expected seconds for a worker to collect ``keys`` from peers
+
+        Keys of unknown size count as one byte.
+        """
+        remote = [key for key in keys
+                  if worker not in self.who_has.get(key, ())]
+        if not remote:
+            return 0
+        size = sum(self.nbytes.get(key, 1) for key in remote)
+        return self.latency + size / float(self.bandwidth)
+
+    def memory_use(self, worker):
+        """ Fraction of its memory limit that a worker holds in memory
+
+        As last reported in the worker's heartbeat.  Zero for workers without
+        a memory limit.
+        """
+        info = self.workers.get(worker, {})
+        if not info.get('memory_limit'):
+            return 0
+        return info.get('memory', 0) / float(info['memory_limit'])
+
+    def worker_resources(self, worker):
+        """ Resources that a worker offers to tasks
+
+        Every worker offers its ``cores`` and, if it has a memory limit, its
+        ``memory`` in bytes.  Workers may advertise further named resources,
+        e.g. ``Worker(..., resources={'GPU': 2})``.
+        """
+        info = self.workers.get(worker, {})
+        resources = {'cores': info.get('ncores') or 1}
+        if info.get('memory_limit'):
+            resources['memory'] = info['memory_limit']
+        resources.update(info.get('resources') or {})
+        return resources
+
+    def can_run(self, worker, resources):
+        """ Whether a worker has the resources free to run a task
+
+        Tasks that a worker processes hold their resources until they finish,
+        see ``resources_used``.
+        """
+        total = self.worker_resources(worker)
+        used = self.resources_used.get(worker, {})
+        return all(used.get(name, 0) + amount <= total.get(name, 0)
+                   for name, amount in resources.items())
+
+    def _check_resources(self, resources):
+        """ Raise if no registered worker offers enough of what a task needs
+
+        Such tasks would otherwise wait forever.  See ``worker_resources``.
+        """
+        offered = [self.worker_resources(w) for w in list(self.workers)]
+        for key, need in sorted(resources.items(), key=str):
+            for name, amount in need.items():
+                if not any(amount <= r.get(name, 0) for r in offered):
+                    raise ValueError("No worker offers %s %s for task %s"
+                                     % (amount, name, str(key)))
+
+    def choose_worker(self, deps, resources=None):
+        """ Take an available worker on which to run a task
+
+        Blocks until a worker is available.  Among all available workers we
+        choose the one expected to finish the task soonest, counting the
+        work already queued on it (see ``occupancy``) and the time to collect
+        the task's dependencies (see ``transfer_cost``).  So we avoid moving
+        large data and spread long tasks across workers.  Ties go to the
+        worker using the least of its memory (see ``memory_use``), then to
+        the one that has waited longest.
+
+        Tasks that need ``resources`` only go to available workers that have
+        them free, see ``can_run``.  If there are none we return None rather
+        than block.
 
         See also:
+            Scheduler.trigger_task
+        """
+        if resources:
+            def choose(workers):
+                candidates = set(w for w in workers
+                                 if self.can_run(w, resources))
+                if not candidates:
+                    return None
+                return min(candidates,
+                           key=lambda w: self._placement_score(w, deps))
+            return self.available_workers.take(choose, block=False)
+
+        def choose(workers):
+            oldest = workers[0]
+            candidates = set(workers)
+            if len(candidates) == 1:
+                return oldest
+            return min(candidates,
+                       key=lambda w: (self._placement_score(w, deps) +
+                                      (w != oldest,)))
+        return self.available_workers.take(choose)
+
+    def _placement_score(self, worker, deps):
+        """ Sort key of workers for a task, lower is better """
+        return (self.occupancy(worker) + self.transfer_cost(worker, deps),
+                int(10 * self.memory_use(worker)))
+
+    def trigger_task(self, key, task, deps, queue, resources=None,
+                     worker=None):
+        """ Send a single task to the best available worker
+
+        The task holds ``resources`` on that worker until it finishes.  If we
+        give a ``worker`` then we send the task there, into a slot that the
+        caller took for it.
+
+        See also:
+            Scheduler.choose_worker
             Scheduler.schedule
             Scheduler.worker_finished_task
         """
-        worker = self.available_workers.get()
+        if worker is None:
+            worker = self.choose_worker(deps, resources)
+        self.processing[worker].add(key)
+        self.in_flight[key] = (task, deps, queue)
+        if resources:
+            self.task_resources[key] = (worker, resources)
+            used = self.resources_used[worker]
+            for name, amount in resources.items():
+                used[name] = used.get(name, 0) + amount
         locations = dict((dep, self.who_has[dep]) for dep in deps)
 
         header = {'function': 'compute', 'jobid': key,
@@ -329,6 +860,14 @@ class Scheduler(object):
                    'queue': queue}
         self.send_to_worker(worker, header, payload)
 
+    def _release_resources(self, key):
+        """ A task no longer holds its resources on its worker """
+        worker, resources = self.task_resources.pop(key)
+        used = self.resources_used.get(worker)
+        if used is not None:
+            for name, amount in resources.items():
+                used[name] -= amount
+
     def release_key(self, key):
         """ Release data from all workers
 
@@ -353,6 +892,7 @@ class Scheduler(object):
                 self.send_to_worker(worker, header, payload)
                 self.who_has[key].remove(worker)
                 self.worker_has[worker].remove(key)
+            self.nbytes.pop(key, None)
 
     def send_data(self, key, value, address=None, reply=True):
         """ Send data up to some worker
@@ -391,6 +931,7 @@ class Scheduler(object):
             address = random.choice(list(self.workers))
         header = {'function': 'setitem', 'jobid': key}
         payload = {'key': key, 'value': value, 'queue': qkey}
+        self.nbytes[key] = nbytes(value)
         self.send_to_worker(address, header, payload)
 
         if reply:
@@ -417,19 +958,20 @@ class Scheduler(object):
         --------
 
         1.  Scheduler starts up a uniquely identified queue.
-        2.  Scheduler sends 'setitem' requests to workers with
-            {'key': ..., 'value': ... 'queue': ...}
+        2.  Scheduler assigns keys to workers round-robin and sends one
+            'setitems' request to each worker with
+            {'data': {key: value}, 'queue': ...}
         3.  Scheduler waits on queue for all responses
-        4.  Workers receive 'setitem' requests, send back on 'setitem-ack' with
-            {'key': ..., 'queue': ...}
-        5.  Scheduler's 'setitem-ack' function pushes keys into the queue
+        4.  Workers receive 'setitems' requests, send back on 'setitems-ack'
+            with {'keys': [...], 'queue': ...}
+        5.  Scheduler's 'setitems-ack' function pushes keys into the queue
         6.  Once the same number of replies is heard scheduler scatter function
             returns
         7.  Scheduler cleans up queue
 
         See Also:
-            Scheduler.setitem_ack
-            Worker.setitem_scheduler
+            Scheduler.setitems_ack
+            Worker.setitems
         """
         workers = list(self.workers)
         log(self.address_to_workers, 'Scatter', workers, key_value_pairs)
@@ -440,20 +982,24 @@ class Scheduler(object):
         queue = Queue()
         qkey = str(uuid.uuid1())
         self.queues[qkey] = queue
-        counter = 0
+
+        data_by_worker = defaultdict(dict)
         for (k, v), w in zip(key_value_pairs, workers):
-            header = {'function': 'setitem', 'jobid': k}
-            payload = {'key': k, 'value': v}
+            data_by_worker[w][k] = v
+            self.nbytes[k] = nbytes(v)
+
+        for w, data in data_by_worker.items():
+            header = {'function': 'setitems', 'jobid': qkey}
+            payload = {'data': data}
             if block:
                 payload['queue'] = qkey
             self.send_to_worker(w, header, payload)
-            counter += 1
 
         if block:
-            for i in range(counter):
+            for i in range(len(data_by_worker)):
                 queue.get()
 
-            del self.queues[qkey]
+        del self.queues[qkey]
 
     def gather(self, keys):
         """ Gather data from workers
@@ -474,47 +1020,75 @@ class Scheduler(object):
         --------
 
         1.  Scheduler starts up a uniquely identified queue.
-        2.  Scheduler sends 'getitem' requests to workers with payloads
-            {'key': ...,  'queue': ...}
+        2.  Scheduler chooses a holder for each key and sends one 'getitems'
+            request to each chosen worker with payloads
+            {'keys': [...],  'queue': ...}
         3.  Scheduler waits on queue for all responses
-        3.  Workers receive 'getitem' requests, send data back on 'getitem-ack'
-            {'key': ..., 'value': ..., 'queue': ...}
-        4.  Scheduler's 'getitem-ack' function pushes key/value pairs onto queue
+        3.  Workers receive 'getitems' requests, send data back on
+            'getitems-ack'
+            {'data': {key: value}, 'missing': [...], 'queue': ...}
+        4.  Scheduler's 'getitems-ack' function pushes the payloads onto queue
         5.  Once the same number of replies is heard the gather function
             collects data into form specified by keys input and returns
         6.  Scheduler cleans up queue before returning
 
+        Raises KeyError if no worker holds some of the keys any longer.
+
         See Also:
-            Scheduler.getitem_ack
-            Worker.getitem_scheduler
+            Scheduler.getitems_ack
+            Worker.getitems_scheduler
         """
         qkey = str(uuid.uuid1())
         queue = Queue()
         self.queues[qkey] = queue
 
-        # Send of requests
-        self._gather_send(qkey, keys)
+        try:
+            # Send of requests
+            nmessages, missing = self._gather_send(qkey, keys)
 
-        # Wait for replies
-        cache = dict()
-        for i in flatten(keys):
-            k, v = queue.get()
-            cache[k] = v
-        del self.queues[qkey]
+            # Wait for replies
+            cache = dict()
+            for i in range(nmessages):
+                payload = queue.get()
+                cache.update(payload['data'])
+                missing.extend(payload['missing'])
+        finally:
+            with self._schedule_lock:
+                self.pending_gathers.pop(qkey, None)
+                del self.queues[qkey]
+
+        if missing:
+            raise KeyError("Workers no longer hold keys %s" % missing)
 
         # Reshape to keys
         return core.get(cache, keys)
 
-    def _gather_send(self, qkey, key):
-        if isinstance(key, list):
-            for k in key:
-                self._gather_send(qkey, k)
-        else:
-            header = {'function': 'getitem', 'jobid': key}
-            payload = {'key': key, 'queue': qkey}
-            seq = list(self.who_has[key])
-            worker = random.choice(seq)
+    def _gather_send(self, qkey, keys):
+        """ Send one getitems request per worker
+
+        Returns the number of requests and the keys that nobody holds
+        """
+        if not isinstance(keys, list):
+            keys = [keys]
+        keys_by_worker = defaultdict(set)
+        missing = []
+        for key in flatten(keys):
+            if not self.who_has.get(key):
+                missing.append(key)
+                continue
+            # Ask the least busy holder
+            worker = min(self.who_has[key],
+                         key=lambda w: (self.occupancy(w), random.random()))
+            keys_by_worker[worker].add(key)
+
+        # Should a worker die before replying, remove_workers replies for it
+        self.pending_gathers[qkey] = dict(keys_by_worker)
+
+        for worker, ks in keys_by_worker.items():
+            header = {'function': 'getitems', 'jobid': qkey}
+            payload = {'keys': list(ks), 'queue': qkey}
             self.send_to_worker(worker, header, payload)
+        return len(keys_by_worker), missing
 
     def _getitem_ack(self, header, payload):
         """ Receive acknowledgement from worker about a getitem request
@@ -523,7 +1097,7 @@ class Scheduler(object):
             Scheduler.gather
             Worker.getitem
         """
-        payload = pickle.loads(payload)
+        payload = protocol.loads(payload)
         log(self.address_to_workers, 'Getitem ack', payload['key'],
                                                     payload['queue'])
         with logerrors():
@@ -531,6 +1105,23 @@ class Scheduler(object):
             self.queues[payload['queue']].put((payload['key'],
                                                payload['value']))
 
+    def _getitems_ack(self, header, payload):
+        """ Receive data from worker in response to a getitems request
+
+        See also:
+            Scheduler.gather
+            Worker.getitems_scheduler
+        """
+        payload = protocol.loads(payload)
+        log(self.address_to_workers, 'Getitems ack', list(payload['data']),
+            payload['queue'])
+        with logerrors():
+            with self._schedule_lock:
+                pending = self.pending_gathers.get(payload['queue'], {})
+                if pending.pop(header['address'], None) is None:
+                    return  # we gave up on this worker, see remove_workers
+            self.queues[payload['queue']].put(payload)
+
     def _setitem_ack(self, header, payload):
         """ Receive acknowledgement from worker about a setitem request
 
@@ -539,7 +1130,7 @@ class Scheduler(object):
             Worker.setitem
         """
         address = header['address']
-        payload = pickle.loads(payload)
+        payload = protocol.loads(payload)
         key = payload['key']
         self.who_has[key].add(address)
         self.worker_has[address].add(key)
@@ -547,6 +1138,23 @@ class Scheduler(object):
         if queue:
             self.queues[queue].put(key)
 
+    def _setitems_ack(self, header, payload):
+        """ Receive acknowledgement from worker about a setitems request
+
+        See also:
+            Scheduler.scatter
+            Worker.setitems
+        """
+        address = header['address']
+        payload = protocol.loads(payload)
+        keys = payload['keys']
+        for key in keys:
+            self.who_has[key].add(address)
+            self.worker_has[address].add(key)
+        queue = payload.get('queue')
+        if queue:
+            self.queues[queue].put(keys)
+
     def close_workers(self):
         header = {'function': 'close'}
         while self.workers != {}:
@@ -563,6 +1171,7 @@ class Scheduler(object):
         self.status = 'closed'
         self._monitor_workers_event.set()
         self.to_workers.close(linger=1)
+        self._worker_monitor.close(linger=0)
         self.to_clients.close(linger=1)
         self.send_to_workers_send.close(linger=1)
         self.send_to_workers_recv.close(linger=1)
@@ -571,7 +1180,8 @@ class Scheduler(object):
         self.block()
         self.context.destroy(linger=3)
 
-    def schedule(self, dsk, result, keep_results=False, **kwargs):
+    def schedule(self, dsk, result, keep_results=False, priority=0,
+                 resources=None, **kwargs):
         """ Execute dask graph against workers
 
         Parameters
@@ -581,6 +1191,13 @@ class Scheduler(object):
             Dask graph
         result: list
             keys to return (possibly nested)
+        keep_results: bool
+            Leave results on the workers after gathering them
+        priority: int
+            Graphs with higher priority get free workers first, defaults to 0
+        resources: dict
+            Maps keys to the resources that their tasks need on a worker,
+            e.g. ``{'x': {'memory': 8e9}}``.  See ``worker_resources``
 
         Example
         -------
@@ -593,120 +1210,435 @@ class Scheduler(object):
 
         1.  Scheduler scatters precomputed data in graph to workers
             e.g. nodes like ``{'x': 1}``.  See Scheduler.scatter
-        2.
+        2.  Scheduler computes the graph on the workers.  See Scheduler.compute
+        3.  Scheduler gathers the results.  See Scheduler.gather
+        4.  Scheduler releases the results from the workers, unless
+            ``keep_results=True``
+
+        Several graphs may be scheduled at once from different threads.
         """
-        with self._schedule_lock:
-            log(self.address_to_workers, "Scheduling dask")
-            if isinstance(result, list):
-                result_flat = set(flatten(result))
-            else:
-                result_flat = set([result])
-            results = set(result_flat)
+        preexisting_data = self.compute(dsk, result, priority=priority,
+                                        resources=resources)
+        flat_keys = set(flatten(result if isinstance(result, list)
+                                else [result]))
+        try:
+            while True:
+                try:
+                    result2 = self.gather(result)
+                    break
+                except KeyError:
+                    with self._schedule_lock:
+                        lost = [k for k in flat_keys if not self.who_has.get(k)]
+                    if not lost:
+                        raise
+                    # Workers holding results died, compute these again
+                    log(self.address_to_workers, 'Recompute results', lost)
+                    self.compute(dsk, result, priority=priority,
+                                 resources=resources)
+                    self._unhold(flat_keys)  # we hold them already
+        finally:
+            with self._schedule_lock:
+                if keep_results:
+                    self.release_when_unheld.difference_update(flat_keys)
+                    self._unhold(flat_keys)
+                else:
+                    self._unhold(flat_keys,
+                                 release=flat_keys - preexisting_data)
 
-            for k in self.who_has:  # remove keys that we already know about
-                if self.who_has[k]:
-                    del dsk[k]
-                    if k in results:
-                        results.remove(k)
+        self.cull_redundant_data(3)
 
-            dsk = cull(dsk, results)
+        return result2
 
-            preexisting_data = set(k for k, v in self.who_has.items() if v)
-            cache = dict((k, None) for k in preexisting_data)
-            dag_state = dag_state_from_dask(dsk, cache=cache)
-            del dag_state['cache']
+    def compute(self, dsk, result, priority=0, resources=None,
+                on_result=None):
+        """ Compute dask graph on workers, leave results on the workers
 
-            new_data = dict((k, v) for k, v in cache.items()
-                                   if not (k in self.who_has and
-                                           self.who_has[k]))
-            if new_data:
-                self.scatter(new_data.items())  # send data in dask up to workers
+        Returns the set of keys that were already present on workers before
+        computation began.  Results are registered in ``who_has`` and stay
+        held (see ``held_keys``) so that other graphs do not release them;
+        callers must ``_unhold`` them when done.
 
-            tick = [0]
+        Many graphs may compute at once.  Each registers itself in ``jobs``
+        and ``_dispatch`` hands out free worker slots across all of them.
+        Tasks that another graph is already computing are not computed
+        twice, instead we wait on their result (see ``listeners``).
 
-            event_queue = Queue()
-            qkey = str(uuid.uuid1())
-            self.queues[qkey] = event_queue
+        Tasks listed in ``resources`` run only on workers that have the
+        resources they need free, see ``can_run``.  They wait until such a
+        worker is available.  We raise a ``ValueError`` if no registered
+        worker offers enough of them.
 
-            def fire_task():
-                tick[0] += 1  # Update heartbeat
+        When workers die (see ``remove_workers``) or can not find the inputs
+        of a task, we rebuild our state from the full graph and the data that
+        remains on the workers.  This recomputes lost tasks along with the
+        parts of their lineage that are no longer held anywhere.
 
-                # Choose a good task to compute
-                key = dag_state['ready'].pop()
-                dag_state['ready-set'].remove(key)
-                dag_state['running'].add(key)
+        We call ``on_result(key)``, if given, as each result key that we
+        compute lands on a worker.  These results stay held even if the
+        computation fails later on.
 
-                self.trigger_task(key, dsk[key],
-                        dag_state['dependencies'][key], qkey)  # Fire
+        See Also:
+            Scheduler.schedule
+            Scheduler._dispatch
+        """
+        log(self.address_to_workers, "Scheduling dask")
+        if isinstance(result, list):
+            result_flat = set(flatten(result))
+        else:
+            result_flat = set([result])
+        graph = dsk
 
-            try:
-                worker = self.available_workers.get(timeout=20)
-                self.available_workers.put(worker)  # put him back in
-            except Empty:
+        start = time()
+        while not self.workers:
+            if time() - start > 20:
                 raise ValueError("Waited 20 seconds. No workers found")
+            sleep(0.01)
 
-            # Seed initial tasks
-            while dag_state['ready'] and self.available_workers.qsize() > 0:
-                fire_task()
+        if resources:
+            self._check_resources(resources)
+
+        with self._schedule_lock:
+            preexisting_data = set(k for k, v in self.who_has.items() if v)
+            dsk, dag_state, results, new_data = self._job_state(graph,
+                                                    result_flat,
+                                                    preexisting_data)
+
+            # Hold everything that we compute or read so that other graphs
+            # don't release it out from under us
+            held = self._needed_keys(dsk, dag_state, result_flat)
+            self._hold(held)
+
+        if new_data:
+            self.scatter(new_data.items())  # send data in dask up to workers
+
+        event_queue = Queue()
+        qkey = str(uuid.uuid1())
+        self.queues[qkey] = event_queue
+
+        release_data = partial(self._release_data, protected=preexisting_data,
+                               held=held)
+
+        job = {'dsk': dsk, 'state': dag_state, 'queue': qkey,
+               'priority': priority, 'order': next(self._job_counter),
+               'resources': resources or {}}
+        self.jobs[qkey] = job
+        reported = set()
+
+        try:
+            self._dispatch()
 
             # Main loop, wait on tasks to finish, insert new ones
-            release_data = partial(self._release_data, protected=preexisting_data)
-            while dag_state['waiting'] or dag_state['ready'] or dag_state['running']:
+            while (dag_state['waiting'] or dag_state['ready'] or
+                   dag_state['running']):
                 payload = event_queue.get()
 
                 if isinstance(payload['status'], Exception):
                     raise payload['status']
 
+                if payload['status'] in ('lost', 'missing-data'):
+                    log(self.address_to_workers, 'Recover lost work', qkey)
+                    with self._schedule_lock:
+                        dsk2, state2, results, new_data = self._job_state(
+                                graph, result_flat, preexisting_data)
+                        needed = self._needed_keys(dsk2, state2, result_flat)
+                        self._hold(needed - held)
+                        held.update(needed)
+                    if new_data:
+                        self.scatter(new_data.items())
+                    with self._schedule_lock:
+                        dsk, dag_state = dsk2, state2
+                        job['dsk'], job['state'] = dsk, dag_state
+                    self._dispatch()
+                    continue
+
                 key = payload['key']
-                finish_task(dsk, key, dag_state, results, sortkey,
-                            release_data=release_data,
-                            delete=key not in preexisting_data)
+                with self._schedule_lock:
+                    if key not in dag_state['running']:
+                        continue  # news from before we rebuilt our state
+                    finish_task(dsk, key, dag_state, results, sortkey,
+                                release_data=release_data,
+                                delete=key not in preexisting_data)
+
+                self._replicate_hot(key)
+                self._dispatch()
+                if on_result is not None and key in result_flat:
+                    reported.add(key)
+                    on_result(key)
+        except Exception:
+            # Results that we reported stay held, the caller has them
+            with self._schedule_lock:
+                self._unhold(held - reported,
+                             release=held - preexisting_data - reported)
+            raise
+        finally:
+            with self._schedule_lock:
+                del self.jobs[qkey]
+                del self.queues[qkey]
+
+        with self._schedule_lock:
+            self._unhold(held - result_flat)
 
-                while dag_state['ready'] and self.available_workers.qsize() > 0:
-                    fire_task()
+        return preexisting_data
 
-            result2 = self.gather(result)
-            if not keep_results:  # release result data from workers
-                for key in flatten(result):
-                    if key not in preexisting_data:
-                        self.release_key(key)
+    def _job_state(self, graph, result_flat, preexisting_data):
+        """ Graph and state of the work that remains to compute results
 
-            self.cull_redundant_data(3)
+        Keys that workers hold already are not computed again.  Returns the
+        culled graph, its ``dag_state``, the result keys that it computes and
+        literal data from the graph that we must scatter to the workers.
 
-        return result2
+        Raises KeyError if our graph reads data that it did not compute and
+        that no worker holds any longer.  Call while holding
+        ``_schedule_lock``.
+        """
+        present = set(k for k, v in self.who_has.items() if v)
+        results = result_flat - present
+        dsk = dict((k, v) for k, v in graph.items() if k not in present)
+        dsk = cull(dsk, results)
+
+        lost = set(k for k in preexisting_data
+                     if k not in present and k not in graph)
+        if lost:
+            known = dict((k, None) for k in lost)
+            known.update(dsk)
+            unrecoverable = set(results & lost)
+            for k in dsk:
+                unrecoverable.update(get_dependencies(known, k) & lost)
+            if unrecoverable:
+                raise KeyError("Workers holding data %s died and we can not "
+                               "recompute it" % sorted(map(str, unrecoverable)))
+
+        cache = dict((k, None) for k in present)
+        dag_state = dag_state_from_dask(dsk, cache=cache)
+        del dag_state['cache']
+        new_data = dict((k, v) for k, v in cache.items() if k not in present)
+        return dsk, dag_state, results, new_data
+
+    @staticmethod
+    def _needed_keys(dsk, dag_state, result_flat):
+        """ Keys that a job computes or reads """
+        keys = set(dsk) | result_flat
+        for deps in dag_state['dependencies'].values():
+            keys.update(deps)
+        return keys
+
+    def _next_job(self):
+        """ The job that should get the next free worker
+
+        Jobs with higher priority go first.  Among jobs of equal priority we
+        prefer the one with the fewest running tasks, then the oldest.  Jobs
+        whose ready tasks all wait on resources are passed over.
+        """
+        jobs = [job for job in self.jobs.values()
+                if self._next_ready_key(job) is not None]
+        if not jobs:
+            return None
+        return max(jobs, key=lambda job: (job['priority'],
+                                          -len(job['state']['running']),
+                                          -job['order']))
+
+    def _next_ready_key(self, job):
+        """ The ready task of a job to run next, or None
+
+        That is the last one on the ready stack whose resources are free on
+        some available worker.
+        """
+        ready = job['state']['ready']
+        resources = job.get('resources')
+        if not resources:
+            return ready[-1] if ready else None
+        available = set(self.available_workers.workers())
+        for key in reversed(ready):
+            need = resources.get(key)
+            if not need or any(self.can_run(w, need) for w in available):
+                return key
+        return None
+
+    def _dispatch(self):
+        """ Send ready tasks from all running jobs to free workers
+
+        If another job already computes a task, or has computed it since this
+        job began, then we use its result rather than computing it again.
+
+        See Also:
+            Scheduler.compute
+            Scheduler.trigger_task
+        """
+        with self._schedule_lock:
+            while len(self.available_workers) > 0:
+                job = self._next_job()
+                if job is None:
+                    return
+                state = job['state']
+                key = self._next_ready_key(job)
+                if key == state['ready'][-1]:
+                    state['ready'].pop()
+                else:
+                    state['ready'].remove(key)
+                state['ready-set'].remove(key)
+                state['running'].add(key)
+
+                if key in self.listeners:  # another job computes this
+                    self.listeners[key].add(job['queue'])
+                elif self.who_has.get(key):  # another job computed this
+                    self.queues[job['queue']].put({'key': key,
+                                                   'status': 'OK'})
+                else:
+                    self.listeners[key].add(job['queue'])
+                    self.trigger_task(key, job['dsk'][key],
+                                      state['dependencies'][key],
+                                      job['queue'], job['resources'].get(key))
+
+    def _hold(self, keys):
+        """ Protect keys from release by other jobs or clients """
+        with self._schedule_lock:
+            for key in keys:
+                self.held_keys[key] += 1
+
+    def _unhold(self, keys, release=()):
+        """ Stop holding keys
+
+        Keys in ``release`` are released as soon as nobody holds them.
+        """
+        with self._schedule_lock:
+            for key in release:
+                self.release_when_unheld.add(key)
+            for key in keys:
+                self.held_keys[key] -= 1
+                if self.held_keys[key] > 0:
+                    continue
+                del self.held_keys[key]
+                if key in self.release_when_unheld:
+                    self.release_when_unheld.remove(key)
+                    self.release_key(key)
 
     def _schedule_from_client(self, header, payload):
         """
 
-        Input Payload: keys, dask
+        Input Payload: keys, dask, keep_results, direct, progress
         Output Payload: keys, result
+            or, if direct, keys, locations
         Sent to client on 'schedule-ack'
+
+        The dask graph may come as a ``protocol.PackedGraph``.
+
+        If ``direct`` then we leave the results on the workers and send back
+        only their ``locations``.  The client collects the data directly from
+        the workers and then tells us that it is done with them on
+        'release-keys'.
+
+        If also ``progress`` then we tell the client about each of the listed
+        keys as soon as it is ready, with 'schedule-progress' messages that
+        carry its ``index`` in ``keys`` and its ``locations``.  This way a
+        batch of futures shares one job, see ``Client.map``.
         """
         with logerrors():
             loads = header.get('loads', dill.loads)
-            payload = loads(payload)
+            payload = protocol.loads(payload, loads)
             address = header['address']
-            dsk = payload['dask']
+            dsk = protocol.unpack_graph(payload['dask'])
             keys = payload['keys']
             keep_results = payload.get('keep_results', False)
+            direct = payload.get('direct', False)
+            priority = payload.get('priority', 0)
+            resources = payload.get('resources')
+            progress = None
+            if direct and payload.get('progress'):
+                index = dict((k, i) for i, k in enumerate(keys))
+                progress = partial(self._send_progress, address,
+                                   header.get('jobid'), index)
 
             header2 = {'jobid': header.get('jobid'),
                        'function': 'schedule-ack'}
+            payload2 = {'keys': keys}
             try:
-                result = self.schedule(dsk, keys, keep_results)
+                if direct:
+                    payload2.update(self._compute_locations(dsk, keys,
+                                                            keep_results,
+                                                            priority,
+                                                            resources,
+                                                            progress))
+                else:
+                    payload2['result'] = self.schedule(dsk, keys,
+                                                       keep_results,
+                                                       priority,
+                                                       resources)
                 header2['status'] = 'OK'
             except Exception as e:
-                result = e
+                payload2['result'] = e
                 header2['status'] = 'Error'
 
-            payload2 = {'keys': keys, 'result': result}
             self.send_to_client(address, header2, payload2)
 
-    def _release_data(self, key, state, delete=True, protected=()):
+    def _compute_locations(self, dsk, keys, keep_results=False, priority=0,
+                           resources=None, progress=None):
+        """ Compute graph, return where results live
+
+        Results stay held on the workers, at least until the client is done
+        with them.  See ``held_keys``.
+
+        We call ``progress(key, locations)``, if given, as each result that
+        we compute is ready.
+
+        See Also:
+            Scheduler._schedule_from_client
+            Client.get
+        """
+        on_result = None
+        if progress is not None:
+            def on_result(key):
+                with self._schedule_lock:
+                    # The client may release it before we finish
+                    if not keep_results:
+                        self.release_when_unheld.add(key)
+                    locations = list(self.who_has[key])
+                progress(key, locations)
+
+        preexisting_data = self.compute(dsk, keys, priority=priority,
+                                        resources=resources,
+                                        on_result=on_result)
+        self.cull_redundant_data(3)
+
+        flat_keys = set(flatten(keys if isinstance(keys, list) else [keys]))
+        with self._schedule_lock:
+            locations = dict((k, list(self.who_has[k])) for k in flat_keys)
+            for k in flat_keys:
+                if keep_results:
+                    self.release_when_unheld.discard(k)
+                elif k not in preexisting_data:
+                    self.release_when_unheld.add(k)
+
+        return {'locations': locations}
+
+    def _send_progress(self, address, jobid, index, key, locations):
+        """ Tell a client that one of the keys of its job is ready """
+        header = {'jobid': jobid, 'function': 'schedule-progress'}
+        payload = {'index': index[key], 'locations': {key: locations}}
+        self.send_to_client(address, header, payload)
+
+    def _release_keys_from_client(self, header, payload):
+        """ Client has collected results directly from workers
+
+        Release those results that no other client is collecting and that
+        should not be kept.
+
+        See Also:
+            Scheduler._schedule_from_client
+        """
+        with logerrors():
+            payload = protocol.loads(payload, header.get('loads', dill.loads))
+            log(self.address_to_clients, 'Release keys', payload['keys'])
+            self._unhold(payload['keys'])
+
+    def _release_data(self, key, state, delete=True, protected=(),
+                      held=None):
         """ Remove data from temporary storage during scheduling run
 
+        The job stops holding ``key``.  The data is released once no other job
+        or client holds it.
+
         See Also
-            Scheduler.schedule
+            Scheduler.compute
             dask.async.finish_task
         """
         if key in state['waiting_data']:
@@ -715,13 +1647,16 @@ class Scheduler(object):
 
         state['released'].add(key)
 
-        if delete and key not in protected:
-            self.release_key(key)
+        if held is not None:
+            held.discard(key)
+        release = [key] if delete and key not in protected else []
+        self._unhold([key], release=release)
 
     def _set_collection(self, header, payload):
         with logerrors():
             log(self.address_to_clients, "Set collection", header)
-            payload = header.get('loads', dill.loads)(payload)
+            loads = header.get('loads', dill.loads)
+            payload = protocol.loads(payload, loads)
             self.collections[payload['name']] = payload
 
             self.send_to_client(header['address'], {'status': 'OK'}, {})
@@ -729,7 +1664,8 @@ class Scheduler(object):
     def _get_collection(self, header, payload):
         with logerrors():
             log(self.address_to_clients, "Get collection", header)
-            payload = header.get('loads', pickle.loads)(payload)
+            loads = header.get('loads', pickle.loads)
+            payload = protocol.loads(payload, loads)
             payload2 = self.collections[payload['name']]
 
             header2 = {'status': 'OK',
@@ -748,54 +1684,327 @@ class Scheduler(object):
     def _heartbeat(self, header, payload):
         with logerrors():
             # log(self.address_to_workers, "Heartbeat", header)
-            payload = pickle.loads(payload)
+            payload = protocol.loads(payload)
             address = header['address']
 
-            if address not in self.workers:
-                log(self.address_to_workers, "New Worker", header)
-                self.available_workers.put(address)
-
+            payload['last-seen'] = datetime.utcnow()
+            if address in self.workers:
+                self.workers[address] = payload
+                return
+
+            log(self.address_to_workers, "New Worker", header)
+            if address in self.lost_workers:
+                # We thought it dead, tell the others that it is not
+                self.lost_workers.remove(address)
+                for w in list(self.workers):
+                    self.send_to_worker(w, {'function': 'worker-revival'},
+                                        {'revived': [address]})
+            self.available_workers.put(address, self.tasks_per_worker)
             self.workers[address] = payload
-            self.workers[address]['last-seen'] = datetime.utcnow()
+            self._dispatch()
+            self.steal_work()
 
     def prune_workers(self, timeout=20):
         """
         Remove workers from scheduler that have not sent a heartbeat in
         `timeout` seconds.
+
+        See Also:
+            Scheduler.remove_workers
         """
         now = datetime.utcnow()
         remove = []
-        for worker, data in self.workers.items():
-            if abs(data['last-seen'] - now).microseconds > (timeout * 1e6):
+        for worker, data in list(self.workers.items()):
+            age = now - data['last-seen']
+            if age.days * 86400 + age.seconds + age.microseconds / 1e6 > timeout:
                 remove.append(worker)
-        for r in remove:
-            self.workers.pop(r)
-        return remove
+        return self.remove_workers(remove)
 
     def prune_and_notify(self, timeout=20):
-        removed = self.prune_workers(timeout=timeout)
-        if removed != []:
-            for w_address in self.workers:
+        """ Remove silent workers, see ``prune_workers`` """
+        return self.prune_workers(timeout=timeout)
+
+    def remove_workers(self, addresses):
+        """ Remove dead workers and recover from their loss
+
+        We forget the data that they held and the tasks that they ran.  Every
+        running job then rebuilds its state, recomputing what it lost, see
+        ``compute``.  Gathers waiting on these workers give up on them.  We
+        tell the remaining workers about the death on 'worker-death' so that
+        they stop waiting on data from the dead.
+
+        Returns the list of workers removed.
+
+        See Also:
+            Scheduler.prune_workers
+            Worker.worker_death
+        """
+        removed = []
+        with self._schedule_lock:
+            for address in addresses:
+                if self.workers.pop(address, None) is None:
+                    continue
+                removed.append(address)
+                self.lost_workers.add(address)
+                log(self.address_to_workers, 'Remove worker', address)
+
+                slots = self.available_workers
+                slots.remove_all(address)
+
+                for key in self.worker_has.pop(address, ()):
+                    self.who_has[key].discard(address)
+                    if not self.who_has[key]:
+                        del self.who_has[key]
+                        self.nbytes.pop(key, None)
+
+                # Nobody computes these any more, see Scheduler._dispatch
+                for key in self.processing.pop(address, ()):
+                    self.listeners.pop(key, None)
+                    self.in_flight.pop(key, None)
+                    victim, thief = self.stealing.pop(key, (None, None))
+                    if thief in self.workers:
+                        slots.put(thief)  # the slot that we reserved
+                    self.task_resources.pop(key, None)
+                self.resources_used.pop(address, None)
+                for workers in self.replicating.values():
+                    workers.discard(address)
+
+                for qkey, pending in self.pending_gathers.items():
+                    keys = pending.pop(address, None)
+                    if keys is not None:
+                        self.queues[qkey].put({'data': {},
+                                               'missing': list(keys)})
+
+            if removed:
+                for qkey in self.jobs:
+                    self.queues[qkey].put({'key': None, 'status': 'lost'})
+
+        if removed:
+            for w_address in list(self.workers):
                 header = {'function': 'worker-death'}
                 payload = {'removed': removed}
                 self.send_to_worker(w_address, header, payload)
+        return removed
+
+    def steal_work(self):
+        """ Move queued tasks from busy workers to idle ones
+
+        Workers queue up to ``tasks_per_worker`` tasks, more than they have
+        cores to run.  Once we have no more ready tasks for a worker with a
+        free slot we look for the most occupied worker with queued tasks.
+        We take a task from it if the idle worker could start it sooner,
+        counting the time to collect its dependencies, than the busy worker
+        could after finishing its other work.
+
+        The busy worker gives up the task only if it has not yet started to
+        compute it and says so on 'steal-ack'.  Meanwhile we reserve a slot
+        on the idle worker for it.  We do not steal tasks that hold
+        resources.
+
+        See Also:
+            Scheduler._steal_ack
+            Worker.steal
+        """
+        with self._schedule_lock:
+            slots = self.available_workers
+            for thief in slots.workers():
+                victims = [w for w in self.workers
+                           if w != thief and
+                           len([k for k in self.processing[w]
+                                if k not in self.stealing]) >
+                           (self.workers[w].get('ncores') or 1)]
+                if not victims:
+                    return
+                victim = max(victims, key=self._occupancy_after_steals)
+                key = self._task_to_steal(victim, thief)
+                if key is None:
+                    continue
+                if not slots.remove(thief):
+                    continue
+                log(self.address_to_workers, 'Steal', key, victim, thief)
+                self.stealing[key] = (victim, thief)
+                self.send_to_worker(victim, {'function': 'steal'},
+                                    {'key': key,
+                                     'queue': self.in_flight[key][2]})
+
+    def _occupancy_after_steals(self, worker):
+        """ Occupancy of a worker once the steals in flight are done """
+        ncores = self.workers.get(worker, {}).get('ncores') or 1
+        total = sum(self.expected_duration(key)
+                    for key in self.processing[worker]
+                    if key not in self.stealing)
+        total += sum(self.expected_duration(key)
+                     for key, (victim, thief) in self.stealing.items()
+                     if thief == worker)
+        return total / float(ncores)
+
+    def _task_to_steal(self, victim, thief):
+        """ Best task to move from victim to thief, or None
+
+        Among the tasks that the thief could start sooner than the victim
+        we prefer those with the least data to move, then the longest.
+        """
+        ncores = self.workers[victim].get('ncores') or 1
+        backlog = self._occupancy_after_steals(victim)
+        thief_start = self._occupancy_after_steals(thief) + 2 * self.latency
+        best, best_score = None, None
+        for key in self.processing[victim]:
+            if (key in self.stealing or key not in self.in_flight or
+                    key in self.task_resources):
+                continue
+            duration = self.expected_duration(key)
+            cost = self.transfer_cost(thief, self.in_flight[key][1])
+            if thief_start + cost >= backlog - duration / ncores:
+                continue
+            score = (cost, -duration)
+            if best_score is None or score < best_score:
+                best, best_score = key, score
+        return best
+
+    def _steal_ack(self, header, payload):
+        """ Worker replies whether it gave up a task, see ``steal_work``
+
+        If it did then we send the task to the worker that stole it, into
+        the slot that we reserved there.  Otherwise we free that slot.
+        """
+        with logerrors():
+            address = header['address']
+            payload = protocol.loads(payload)
+            key = payload['key']
+            with self._schedule_lock:
+                victim, thief = self.stealing.pop(key, (None, None))
+                if (payload['stolen'] and address in self.workers and
+                        key in self.processing[address]):
+                    self.processing[address].discard(key)
+                    self.available_workers.put(address)
+                    task, deps, queue = self.in_flight[key]
+                    if thief in self.workers:
+                        self.trigger_task(key, task, deps, queue,
+                                          worker=thief)
+                    else:
+                        self.trigger_task(key, task, deps, queue)
+                elif thief in self.workers:
+                    self.available_workers.put(thief)
+            self._dispatch()
+
+    def _pending_dependents(self, key):
+        """ Number of tasks in running jobs still waiting to read ``key`` """
+        with self._schedule_lock:
+            return sum(len(job['state']['waiting_data'].get(key, ()))
+                       for job in self.jobs.values())
+
+    def _replicate_hot(self, key):
+        """ Copy widely read data to more workers
+
+        We want one replica for every ``dependents_per_replica`` pending
+        dependents, so that tasks like the partitions of a broadcast join
+        don't all collect from one worker.
+
+        See Also:
+            Scheduler.replicate
+        """
+        with self._schedule_lock:
+            have = (len(self.who_has.get(key, ())) +
+                    len(self.replicating.get(key, ())))
+            if not have:
+                return
+            want = min(len(self.workers),
+                       self._pending_dependents(key) //
+                       self.dependents_per_replica)
+            if want > have:
+                self.replicate(key, want - have)
+
+    def replicate(self, key, n):
+        """ Copy data to ``n`` more workers
+
+        We prefer workers with the least work queued (see ``occupancy``) and
+        skip workers under memory pressure.  The chosen workers collect the
+        data from its holders and report back on 'replicate-ack'.
+
+        Returns the list of chosen workers.
+
+        See Also:
+            Worker.replicate
+            Scheduler._replicate_ack
+        """
+        with self._schedule_lock:
+            holders = self.who_has.get(key)
+            if not holders:
+                return []
+            copying = self.replicating[key]
+            candidates = [w for w in self.workers
+                          if w not in holders and w not in copying and
+                          self.memory_use(w) < self.memory_pressure]
+            candidates.sort(key=lambda w: (self.occupancy(w),
+                                           self.memory_use(w)))
+            chosen = candidates[:n]
+            copying.update(chosen)
+            if not copying:
+                del self.replicating[key]
+            locations = {key: list(holders)}
+
+        log(self.address_to_workers, 'Replicate', key, chosen)
+        for w in chosen:
+            self.send_to_worker(w, {'function': 'replicate'},
+                                {'locations': locations})
+        return chosen
+
+    def _replicate_ack(self, header, payload):
+        """ Worker reports the data that it copied
+
+        Data that everyone released while we copied it is dropped again.
+
+        See also:
+            Scheduler.replicate
+            Worker.replicate
+        """
+        address = header['address']
+        payload = protocol.loads(payload)
+        drop = []
+        with self._schedule_lock:
+            for key in payload['requested']:
+                self.replicating[key].discard(address)
+                if not self.replicating[key]:
+                    del self.replicating[key]
+            for key in payload['keys']:
+                if key in self.held_keys or self.who_has.get(key):
+                    self.who_has[key].add(address)
+                    self.worker_has[address].add(key)
+                else:
+                    drop.append(key)
+        for key in drop:
+            self.send_to_worker(address, {'function': 'delitem'},
+                                {'key': key})
 
     def cull_redundant_data(self, k):
-        """ Remove highly redundant data from workers
+        """ Remove redundant replicas of cold data from workers
 
-        Finds all keys that are replicated more than k times across all workers
-        and releases data from a randomly chosen subset until there are only k
-        workers left holding this data.
+        Cold data is data that no running job is waiting to read.  We keep at
+        most ``k`` replicas of each cold key, and only one on workers under
+        memory pressure (see ``memory_use`` and ``memory_pressure``).
+        Replicas go first from the workers using the most memory.
 
         Operates asynchronously and returns quickly.  Scheduler metadata is
         updated synchronously.
         """
         with logerrors():
-            for key, v in self.who_has.items():
-                while len(v) > k:
-                    worker = random.choice(list(v))
-                    header = {'function': 'delitem', 'jobid': key}
-                    payload = {'key': key}
-                    self.send_to_worker(worker, header, payload)
-                    self.who_has[key].remove(worker)
-                    self.worker_has[worker].remove(key)
+            drop = []
+            with self._schedule_lock:
+                for key, v in list(self.who_has.items()):
+                    if len(v) <= 1 or self._pending_dependents(key):
+                        continue
+                    for worker in sorted(v, key=self.memory_use,
+                                         reverse=True):
+                        if len(v) <= 1:
+                            break
+                        if (len(v) <= k and
+                            self.memory_use(worker) <= self.memory_pressure):
+                            break
+                        v.remove(worker)
+                        self.worker_has[worker].remove(key)
+                        drop.append((worker, key))
+
+            for worker, key in drop:
+                header = {'function': 'delitem', 'jobid': key}
+                payload = {'key': key}
+                self.send_to_worker(worker, header, payload)
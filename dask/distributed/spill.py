@@ -0,0 +1,169 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+from collections import MutableMapping
+from heapq import heappush, heappop
+from itertools import count
+from threading import RLock
+
+import dill
+
+from ..utils import nbytes
+
+
+class SpillDict(MutableMapping):
+    """ Dictionary that spills least recently used values to disk
+
+    Values are held in memory until their total size exceeds ``target`` bytes.
+    Then least recently used values are pickled with ``dill`` to files in
+    ``directory`` until we are back under the target.  Values that we can not
+    pickle stay in memory.  Spilled values are loaded back into memory when
+    they are next accessed.
+
+    >>> d = SpillDict(target=1e9)
+    >>> d['x'] = 1
+    >>> d['x']
+    1
+    >>> d.close()
+
+    Parameters
+    ----------
+
+    target: int
+        Number of bytes to hold in memory
+    directory: string
+        Where to write spilled values, defaults to a new temporary directory
+        that is removed on ``close``
+
+    State
+    -----
+
+    fast: dict
+        Values held in memory
+    slow: dict
+        Maps spilled keys to filenames
+    nbytes: dict
+        Size of every value, both in memory and on disk
+    memory: int
+        Total size of the values in memory
+    spilled: int
+        Total size of the values on disk
+    """
+    def __init__(self, target, directory=None):
+        self.target = target
+        if directory is None:
+            self.directory = tempfile.mkdtemp(prefix='dask-spill-')
+            self._remove_directory = True
+        else:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self.directory = directory
+            self._remove_directory = False
+        self.fast = dict()
+        self.slow = dict()
+        self.nbytes = dict()
+        self.memory = 0
+        self.spilled = 0
+        self.lock = RLock()
+
+        # Lazy LRU heap of (tick, key); stale entries are skipped on pop
+        self._last_used = dict()
+        self._heap = []
+        self._tick = count()
+        self._filenames = count()
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key in self.fast:
+                self._touch(key)
+                return self.fast[key]
+            if key not in self.slow:
+                raise KeyError(key)
+            value = self._load(key)
+            self._insert(key, value)
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            if key in self:
+                del self[key]
+            self._insert(key, value)
+
+    def __delitem__(self, key):
+        with self.lock:
+            if key in self.fast:
+                del self.fast[key]
+                del self._last_used[key]
+                self.memory -= self.nbytes.pop(key)
+            elif key in self.slow:
+                os.remove(self.slow.pop(key))
+                self.spilled -= self.nbytes.pop(key)
+            else:
+                raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.fast or key in self.slow
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.fast) + list(self.slow))
+
+    def __len__(self):
+        return len(self.fast) + len(self.slow)
+
+    def _touch(self, key):
+        tick = next(self._tick)
+        self._last_used[key] = tick
+        heappush(self._heap, (tick, key))
+        if len(self._heap) > 2 * len(self._last_used) + 100:
+            self._heap = sorted((t, k) for k, t in self._last_used.items())
+
+    def _insert(self, key, value):
+        """ Put value into memory, then spill until under target """
+        size = nbytes(value)
+        self.nbytes[key] = size
+        self.fast[key] = value
+        self.memory += size
+        self._touch(key)
+        self._spill()
+
+    def _spill(self):
+        """ Write least recently used values to disk until under target """
+        while self.memory > self.target and self._heap:
+            tick, key = heappop(self._heap)
+            if self._last_used.get(key) != tick:
+                continue  # stale entry
+            try:
+                data = dill.dumps(self.fast[key],
+                                  protocol=dill.HIGHEST_PROTOCOL)
+            except Exception:
+                continue  # keep it in memory, try the next one
+            fn = os.path.join(self.directory, str(next(self._filenames)))
+            with open(fn, 'wb') as f:
+                f.write(data)
+            del self.fast[key]
+            del self._last_used[key]
+            self.slow[key] = fn
+            self.memory -= self.nbytes[key]
+            self.spilled += self.nbytes[key]
+
+    def _load(self, key):
+        """ Read spilled value back from disk, removing the file """
+        fn = self.slow.pop(key)
+        with open(fn, 'rb') as f:
+            value = dill.load(f)
+        os.remove(fn)
+        self.spilled -= self.nbytes.pop(key)
+        return value
+
+    def close(self):
+        """ Remove spilled files """
+        with self.lock:
+            for fn in self.slow.values():
+                if os.path.exists(fn):
+                    os.remove(fn)
+            self.slow.clear()
+            if self._remove_directory and os.path.exists(self.directory):
+                shutil.rmtree(self.directory)
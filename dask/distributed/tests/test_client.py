@@ -4,7 +4,7 @@ import pytest
 pytest.importorskip('zmq')
 pytest.importorskip('dill')
 
-from dask.distributed import Worker, Scheduler, Client
+from dask.distributed import Worker, Scheduler, Client, as_completed
 from dask.utils import raises
 from contextlib import contextmanager
 from operator import add
@@ -46,6 +46,12 @@ def test_status():
         c = Client(s.address_to_clients)
 
         assert c.scheduler_status() == 'OK'
+
+        assert c.get({'x': (inc, 1)}, 'x') == 2
+        metrics = c.scheduler_status(metrics=True)
+        assert metrics['tasks_finished'] == 1
+        assert metrics['messages']['status']['count'] == 1
+        assert set(metrics['workers']) == set([a.address, b.address])
         c.close()
 
 
@@ -148,3 +154,252 @@ def test_keep_results():
         assert c.get({'x': (inc, 1)}, 'x', keep_results=True) == 2
 
         assert 'x' in a.data or 'x' in b.data
+
+
+def test_get_direct():
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        sent = []
+        send_to_client = s.send_to_client
+
+        def recording_send(address, header, payload):
+            sent.append(payload)
+            return send_to_client(address, header, payload)
+        s.send_to_client = recording_send
+
+        dsk = {'x': 1, 'y': (add, 'x', 'x'), 'z': (inc, 'y')}
+        assert c.get(dsk, [['y'], 'z']) == [[2], 3]
+        assert 'result' not in sent[-1]
+        assert set(sent[-1]['locations']) == set(['y', 'z'])
+
+        assert c.get(dsk, 'z', keep_results=True) == 3
+        assert c.get({'w': (inc, 'z')}, ['w', 'z']) == [4, 3]
+
+        sleep(0.05)
+        assert not s.held_keys
+        assert 'y' not in a.data and 'y' not in b.data
+        assert 'w' not in a.data and 'w' not in b.data
+        assert 'z' in a.data or 'z' in b.data
+
+        assert c.get(dsk, ['y', 'z'], direct=False) == [2, 3]
+        assert sent[-1]['result'] == [2, 3]
+        c.close()
+
+
+def test_priority():
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        jobs = []
+        compute = s.compute
+
+        def recording_compute(dsk, result, priority=0, **kwargs):
+            jobs.append(priority)
+            return compute(dsk, result, priority=priority, **kwargs)
+        s.compute = recording_compute
+
+        assert c.get({'x': (inc, 1)}, 'x', priority=10) == 2
+        assert c.get({'x': (inc, 1)}, 'x', direct=False, priority=5) == 2
+        assert jobs == [10, 5]
+        c.close()
+
+
+def test_persist():
+    import gc
+    db = pytest.importorskip('dask.bag')
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        triggered = []
+        trigger_task = s.trigger_task
+
+        def recording_trigger(key, *args):
+            triggered.append(key)
+            return trigger_task(key, *args)
+        s.trigger_task = recording_trigger
+
+        bag = db.from_sequence(range(10), npartitions=2).map(inc)
+        bag2 = c.persist(bag)
+        assert type(bag2) is type(bag)
+        keys = bag2._keys()
+        assert all(s.who_has[k] for k in keys)
+
+        del triggered[:]
+        total = bag2.sum()
+        assert c.get(total.dask, total.key) == 55
+        assert not set(triggered) & set(keys)  # started from resident data
+        assert all(s.who_has[k] for k in keys)
+
+        del bag2, total
+        gc.collect()
+        assert c.scheduler_status() == 'OK'  # carries the release
+        while any(s.who_has.get(k) for k in keys):
+            sleep(0.01)
+        assert not s.held_keys
+        c.close()
+
+
+def test_persist_array():
+    da = pytest.importorskip('dask.array')
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        x = c.persist(da.ones(10, chunks=5) + 1)
+        assert isinstance(x, da.Array)
+        assert x.chunks == ((5, 5),)
+        result = c.get(x.sum().dask, x.sum()._keys())
+        assert result == [20]
+
+        keys = list(x._keys())
+        c.close()  # releases everything that we persisted
+        while any(s.who_has.get(k) for k in keys):
+            sleep(0.01)
+
+
+def slowinc(x, delay=0.02):
+    sleep(delay)
+    return x + 1
+
+
+def test_submit():
+    import gc
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        x = c.submit(inc, 1)
+        y = c.submit(add, x, 10)
+        z = c.submit(slowinc, y, delay=0.01)
+        assert z.result() == 13
+        assert y.result() == 12
+        assert x.done() and x.status == 'finished'
+
+        keys = [x.key, y.key, z.key]
+        assert all(s.held_keys.get(k) for k in keys)
+        del x, y, z
+        gc.collect()
+        assert c.scheduler_status() == 'OK'  # carries the release
+        while any(s.who_has.get(k) for k in keys):
+            sleep(0.01)
+        assert not s.held_keys
+        c.close()
+
+
+def test_submit_error():
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        x = c.submit(inc, 'a')
+        assert isinstance(x.exception(), TypeError)
+        assert x.status == 'error'
+        assert raises(TypeError, x.result)
+
+        y = c.submit(inc, x)
+        assert raises(TypeError, y.result)
+        assert c.get({'x': (inc, 1)}, 'x') == 2
+        c.close()
+
+
+def test_map_as_completed():
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        futures = c.map(slowinc, [1, 2, 3], [1, 0.01, 0.01])
+        assert not any(f.done() for f in futures)
+
+        # Blocking calls still work while futures are pending
+        assert c.get({'x': (inc, 1)}, 'x') == 2
+
+        results = [f.result() for f in as_completed(futures)]
+        assert sorted(results) == [2, 3, 4]
+        assert results[-1] == 2  # the slow one
+        c.close()
+
+
+def test_map_is_one_job():
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        jobs = []
+        compute = s.compute
+
+        def recording_compute(dsk, *args, **kwargs):
+            jobs.append(len(dsk))
+            return compute(dsk, *args, **kwargs)
+        s.compute = recording_compute
+
+        futures = c.map(slowinc, range(200), [0.001] * 200)
+        assert [f.result() for f in futures] == list(range(1, 201))
+        assert jobs == [200]
+
+        futures = c.map(slowinc, [1, 'a'], [0.5, 0])
+        assert isinstance(futures[1].exception(), TypeError)
+        assert isinstance(futures[0].exception(), TypeError)
+
+        keys = [f.key for f in futures]
+        del futures
+        assert c.map(inc, []) == []
+        c.close()
+        while any(s.held_keys.get(k) for k in keys):
+            sleep(0.01)
+
+
+def test_compute_future():
+    db = pytest.importorskip('dask.bag')
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        bag = db.from_sequence(range(10), npartitions=2).map(inc)
+        future = c.compute(bag)
+        total = c.compute(bag.sum())
+        assert total.result() == 55
+        assert future.result() == list(range(1, 11))
+        c.close()
+
+
+def test_groupby_tasks():
+    db = pytest.importorskip('dask.bag')
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        bag = db.from_sequence(range(20), npartitions=4)
+        grouped = bag.groupby(lambda x: x % 3, npartitions=3, method='tasks')
+        parts = c.get(grouped.dask, grouped._keys())
+        result = dict((k, sorted(v)) for part in parts for k, v in part)
+        assert result == {0: list(range(0, 20, 3)),
+                          1: list(range(1, 20, 3)),
+                          2: list(range(2, 20, 3))}
+        assert s.transferred_bytes > 0  # pieces moved between workers
+        c.close()
+
+
+def test_compute_with_resources():
+    db = pytest.importorskip('dask.bag')
+    s = Scheduler(hostname='127.0.0.1')
+    a = Worker(s.address_to_workers, hostname='127.0.0.1', nthreads=10)
+    b = Worker(s.address_to_workers, hostname='127.0.0.1', nthreads=10,
+               memory_limit=10**9)
+    try:
+        while len(s.workers) < 2:
+            sleep(1e-6)
+        c = Client(s.address_to_clients)
+        bag = db.from_sequence(range(10), npartitions=5).map(inc)
+        bag2 = c.persist(bag, resources={'memory': 10**6})
+        assert all(s.who_has[k] == set([b.address]) for k in bag2._keys())
+        assert c.compute(bag2.sum(), resources={'memory': 10**6}).result() == 55
+        assert c.get({'x': (inc, 1)}, 'x', resources={'x': {'memory': 1}}) == 2
+        c.close()
+    finally:
+        a.close()
+        b.close()
+        s.close()
+
+
+def test_gather_when_workers_lose_data():
+    with scheduler_and_workers() as (s, (a, b)):
+        c = Client(s.address_to_clients)
+        dsk = {'x': (inc, 1), 'y': (inc, 9)}
+        assert c.gather('x', {'x': []}, dsk) == 2  # no locations
+        assert raises(KeyError, lambda: c.gather('x', {'x': []}))
+
+        w = Worker(s.address_to_workers, hostname='127.0.0.1', nthreads=10)
+        while len(s.workers) < 3:
+            sleep(0.01)
+        w.data['y'] = 10
+        w.close()
+        while len(s.workers) > 2:
+            sleep(0.01)
+        # we wait a moment on the dead worker, then compute y again
+        assert c.gather(['y', 'x'], {'y': [w.address], 'x': []}, dsk) == [10, 2]
+        assert w.address not in c.worker_sockets
+        c.close()
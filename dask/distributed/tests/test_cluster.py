@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+pytest.importorskip('zmq')
+pytest.importorskip('dill')
+
+from dask.distributed import LocalCluster, Client
+
+
+def inc(x):
+    return x + 1
+
+
+def test_local_cluster():
+    with LocalCluster(nworkers=2, ncores=2) as cluster:
+        assert len(cluster.scheduler.workers) == 2
+        assert all(v['ncores'] == 2
+                   for v in cluster.scheduler.workers.values())
+        c = cluster.client()
+        assert c.get({'x': (inc, 1), 'y': (inc, 'x')}, 'y') == 3
+
+        # Tasks run in the worker processes
+        pids = c.get(dict((('pid', i), (os.getpid,)) for i in range(20)),
+                     [('pid', i) for i in range(20)])
+        assert os.getpid() not in pids
+
+        # Workers don't fork from our process, with its scheduler threads
+        if sys.version_info >= (3, 4):
+            ppids = c.get(dict((('ppid', i), (os.getppid,))
+                               for i in range(20)),
+                          [('ppid', i) for i in range(20)])
+            assert os.getpid() not in ppids
+
+        c2 = Client(cluster.address_to_clients)
+        assert c2.scheduler_status() == 'OK'
+        c2.close()
+
+    assert all(not p.is_alive() for p in cluster.processes)
+    assert cluster.scheduler.status == 'closed'
+
+
+def test_start_worker():
+    with LocalCluster(nworkers=1) as cluster:
+        cluster.start_worker()
+        cluster.wait_for_workers(2)
+        assert len(cluster.scheduler.workers) == 2
@@ -0,0 +1,124 @@
+import pytest
+pytest.importorskip('zmq')
+pytest.importorskip('dill')
+np = pytest.importorskip('numpy')
+
+import dill
+from operator import add
+
+from dask.distributed.protocol import (dumps, loads, pickle, frame_split_size,
+        pack_graph, unpack_graph)
+
+
+def test_small_objects_use_one_frame():
+    for obj in [1, 'hello', {'x': [1, 2, 3]}]:
+        frames = dumps(obj)
+        assert len(frames) == 1
+        assert loads(frames) == obj
+
+    x = np.arange(10)
+    frames = dumps(x)
+    assert len(frames) == 1
+    assert (loads(frames) == x).all()
+
+
+def test_arrays_in_separate_frames():
+    x = np.arange(frame_split_size).reshape((frame_split_size // 8, 8))
+    obj = {'x': x, 'xT': x.T, 'y': x[::2], 'small': np.ones(3)}
+    frames = dumps(obj)
+    assert len(frames) == 4
+    assert len(frames[0]) < 1000
+
+    result = loads(frames)
+    assert set(result) == set(obj)
+    for k in obj:
+        assert (result[k] == obj[k]).all()
+        assert result[k].dtype == obj[k].dtype
+
+
+def test_dill():
+    x = np.arange(frame_split_size)
+    frames = dumps({'f': lambda a: a + 1, 'x': x}, dumps=dill.dumps)
+    assert len(frames) == 2
+    result = loads(frames, loads=dill.loads)
+    assert (result['f'](result['x']) == x + 1).all()
+
+
+def test_compression():
+    x = np.zeros(frame_split_size)
+    frames = dumps(x, compression='zlib')
+    assert len(frames[1]) < x.nbytes / 10
+    assert (loads(frames) == x).all()
+
+    y = np.random.random(frame_split_size)  # random data does not compress
+    frames = dumps(y, compression='zlib')
+    assert frames[1] is y  # not copied
+    assert (loads(frames) == y).all()
+
+
+def test_compressed_message_round_trip():
+    pd = pytest.importorskip('pandas')
+    n = frame_split_size
+    obj = {'zeros': np.zeros(n), 'random': np.random.random(n),
+           'ints': np.arange(n).reshape((n // 8, 8)).T,
+           'df': pd.DataFrame({'a': np.ones(n), 'b': np.arange(n)})}
+    frames = dumps(obj, dumps=dill.dumps, compression='zlib')
+    assert sum(map(len, frames[1:])) < 4 * n * 8
+
+    result = loads(frames, loads=dill.loads)
+    for k in ['zeros', 'random', 'ints']:
+        assert (result[k] == obj[k]).all()
+        assert result[k].dtype == obj[k].dtype
+    assert (result['df'] == obj['df']).all().all()
+
+
+def test_received_arrays_are_read_only():
+    x = np.zeros(frame_split_size)
+    for compression in [None, 'zlib']:
+        frames = dumps(x, compression=compression)
+        frames = [f if isinstance(f, bytes) else f.tobytes()  # as received
+                  for f in frames]
+        y = loads(frames)
+        assert not y.flags.writeable
+        with pytest.raises(ValueError):
+            y += 1
+        z = y.copy()
+        z += 1
+        assert (z == 1).all()
+
+
+def test_pandas():
+    pd = pytest.importorskip('pandas')
+    df = pd.DataFrame({'a': np.arange(frame_split_size),
+                       'b': np.ones(frame_split_size),
+                       'c': ['x'] * frame_split_size})
+    frames = dumps(df)
+    assert len(frames) > 1
+    assert (loads(frames) == df).all().all()
+
+
+def test_bytes_payload():
+    assert loads(pickle.dumps(123)) == 123
+
+
+def test_pack_graph():
+    x = np.arange(frame_split_size)
+    inc = lambda a: a + 1
+    dsk = dict((('x', i), (add, x, i)) for i in range(100))
+    dsk.update(dict((('y', i), (inc, ('x', i))) for i in range(100)))
+
+    packed = pack_graph(dsk)
+    assert len(packed.constants) == 3  # add, inc and x, once each
+    frames = dumps(packed, dumps=dill.dumps)
+    assert len(frames) == 2  # x travels in its own frame, only once
+    assert len(frames[0]) < 2000
+
+    result = unpack_graph(loads(frames, loads=dill.loads))
+    assert set(result) == set(dsk)
+    assert result[('x', 5)][0] is add
+    assert result[('x', 5)][1] is result[('x', 6)][1]
+    assert (result[('x', 5)][1] == x).all()
+    assert result[('y', 5)][0](1) == 2
+    assert result[('y', 5)][1] == ('x', 5)
+
+    assert unpack_graph(dsk) is dsk
@@ -3,17 +3,20 @@ pytest.importorskip('zmq')
 pytest.importorskip('dill')
 
 import multiprocessing
+import multiprocessing.pool
 import pickle
 import re
 from datetime import datetime
 from contextlib import contextmanager
-from time import sleep
+from threading import Event
+from time import sleep, time
 
 import zmq
 import dill
 
-from dask.distributed.scheduler import Scheduler
+from dask.distributed.scheduler import Scheduler, WorkerSlots
 from dask.distributed.worker import Worker
+from dask.utils import raises
 
 context = zmq.Context()
 
@@ -106,9 +109,22 @@ def add(x, y):
     return x + y
 
 
+def slowinc(x, delay=0.05):
+    sleep(delay)
+    return x + 1
+
+
+gate = Event()
+
+
+def gated_inc(x):
+    gate.wait()
+    return x + 1
+
+
 def test_compute_cycle():
     with scheduler_and_workers() as (s, (a, b)):
-        assert s.available_workers.qsize() == 2
+        assert len(s.available_workers) == 2
 
         dsk = {'a': (add, 1, 2), 'b': (inc, 'a')}
         s.trigger_task('a', dsk['a'], set([]), 'queue-key')
@@ -118,7 +134,7 @@ def test_compute_cycle():
         assert 'a' in a.data or 'a' in b.data
         assert a.data.get('a') == 3 or b.data.get('a') == 3
         assert a.address in s.worker_has or b.address in s.worker_has
-        assert s.available_workers.qsize() == 2
+        assert len(s.available_workers) == 2
 
         s.trigger_task('b', dsk['b'], set(['a']), 'queue-key')
         sleep(0.1)
@@ -126,7 +142,7 @@ def test_compute_cycle():
         assert 'b' in s.who_has
         assert 'b' in a.data or 'b' in b.data
         assert a.data.get('b') == 4 or b.data.get('b') == 4
-        assert s.available_workers.qsize() == 2
+        assert len(s.available_workers) == 2
 
 
 def test_send_release_data():
@@ -236,20 +252,29 @@ def test_close_scheduler():
 
 
 def test_prune_and_notify():
-    with scheduler_and_workers(worker_kwargs={'heartbeat': 0.001}) as (s, (w1, w2)):
-        # Oh no! A worker died!
-        w2.close()
-        while w2.status != 'closed':
+    with scheduler_and_workers(n=1, worker_kwargs={'heartbeat': 0.001}) as (s, (w1,)):
+        # Oh no! A worker hangs!  It stays connected but never answers.
+        router = context.socket(zmq.ROUTER)
+        port = router.bind_to_random_port('tcp://127.0.0.1')
+        address = ('tcp://127.0.0.1:%d' % port).encode()
+        sock = context.socket(zmq.DEALER)
+        sock.setsockopt(zmq.IDENTITY, address)
+        sock.connect(s.address_to_workers)
+        sock.send_multipart([pickle.dumps({'function': 'heartbeat'}),
+                             pickle.dumps({'pid': 0})])
+        while address not in s.workers:
             sleep(1e-6)
 
-        # worker 1 tries to collect data from the dead worker.
-        result = w1.pool.apply_async(w1.collect, args=({'x': [w2.address]},))
+        # worker 1 tries to collect data from the hung worker.
+        result = w1.pool.apply_async(w1.collect, args=({'x': [address]},))
         sleep(0.01)  # sleep to show w1.collect hangs
         assert result.ready() is False
 
         # The scheduler notices, and corrects it state.
-        while w2.address in s.workers:
+        while address in s.workers:
             s.prune_and_notify(timeout=0.1)
+        sock.close(linger=0)
+        router.close(linger=0)
 
         # But the sheduler notified the workers about the death
         while not result.ready():
@@ -308,6 +333,79 @@ def test_monitor_workers():
         assert w2.address not in s.workers
 
 
+def test_recover_from_worker_death():
+    from threading import Thread
+    with scheduler_and_workers(n=3) as (s, (a, b, c)):
+        dsk = dict((('x', i), (slowinc, i, 0.02)) for i in range(20))
+        dsk['total'] = (sum, [('x', i) for i in range(20)])
+        out = []
+        t = Thread(target=lambda: out.append(s.schedule(dsk, 'total')))
+        t.start()
+
+        while not s.worker_has[c.address]:
+            sleep(1e-3)
+        c.close()  # Oh no!  Our preemptible node went away
+
+        t.join()
+        assert out == [sum(range(1, 21))]
+        assert c.address not in s.workers
+        assert c.address not in s.who_has.get(('x', 0), ())
+        assert not s.jobs
+        assert not s.held_keys
+
+
+def test_recover_results_lost_while_gathering():
+    with scheduler_and_workers(n=3) as (s, workers):
+        gather_send = s._gather_send
+        killed = []
+
+        def kill_holder_then_send(qkey, keys):
+            if not killed:
+                holder = [w for w in workers if 'y' in w.data][0]
+                killed.append(holder)
+                holder.close()
+                while holder.address in s.workers:
+                    sleep(1e-3)
+            return gather_send(qkey, keys)
+        s._gather_send = kill_holder_then_send
+
+        assert s.schedule({'x': (inc, 1), 'y': (inc, 'x')}, 'y') == 3
+        assert killed
+        assert not s.jobs
+        assert not s.held_keys
+
+
+def test_recompute_missing_data():
+    with scheduler_and_workers() as (s, (a, b)):
+        assert s.schedule({'x': (inc, 1)}, 'x', keep_results=True) == 2
+        for w in s.who_has['x']:
+            w = a if w == a.address else b
+            del w.data['x']  # lost without the scheduler knowing
+
+        assert s.schedule({'x': (inc, 1), 'y': (inc, 'x')}, 'y') == 3
+
+
+def test_lost_data_that_we_can_not_recompute():
+    from threading import Thread
+    with scheduler_and_workers() as (s, (a, b)):
+        s.send_data('x', 1, address=b.address)
+        dsk = {'y': (slowinc, 1, 0.1), 'z': (add, 'x', 'y')}
+        out = []
+
+        def f():
+            try:
+                s.schedule(dsk, 'z')
+            except KeyError as e:
+                out.append(e)
+        t = Thread(target=f)
+        t.start()
+        while 'y' not in s.listeners:
+            sleep(1e-3)
+        b.close()
+        t.join()
+        assert out and isinstance(out[0], KeyError)
+
+
 def test_scheduler_reuses_worker_state():
     with scheduler_and_workers() as (s, (a, b)):
         assert s.schedule({'x': (inc, 1)}, 'x') == 2
@@ -347,3 +445,406 @@ def test_cull_redundant_data():
 
         assert ('x' in a.data and 'x' not in b.data or
                 'x' in b.data and 'x' not in a.data)
+
+
+def test_cull_cold_data_under_memory_pressure():
+    with scheduler_and_workers() as (s, (a, b)):
+        s.send_data('x', 10, address=a.address)
+        s.send_data('x', 10, address=b.address)
+        s.workers[a.address].update({'memory': 90, 'memory_limit': 100})
+
+        # Hot data stays
+        s.jobs['fake'] = {'state': {'waiting_data': {'x': set(['y'])}}}
+        s.cull_redundant_data(3)
+        assert s.who_has['x'] == set([a.address, b.address])
+        del s.jobs['fake']
+
+        s.cull_redundant_data(3)
+        assert s.who_has['x'] == set([b.address])
+        while 'x' in a.data:
+            sleep(0.01)
+        assert 'x' in b.data
+
+
+def test_replicate():
+    with scheduler_and_workers(n=3) as (s, (a, b, c)):
+        s.send_data('x', 10, address=a.address)
+        assert set(s.replicate('x', 2)) == set([b.address, c.address])
+        while len(s.who_has['x']) < 3:
+            sleep(0.01)
+        assert b.data['x'] == c.data['x'] == 10
+        assert not s.replicating
+
+
+def test_replicate_hot_keys():
+    with scheduler_and_workers(n=3) as (s, (a, b, c)):
+        s.send_data('x', 10, address=a.address)
+        dependents = set(('y', i) for i in range(8))
+        s.jobs['fake'] = {'state': {'waiting_data': {'x': dependents}}}
+        s._replicate_hot('x')  # one replica for every four dependents
+        del s.jobs['fake']
+        while len(s.who_has['x']) < 2:
+            sleep(0.01)
+        sleep(0.05)
+        assert len(s.who_has['x']) == 2
+
+
+def test_collect_from_least_loaded_peers():
+    with scheduler_and_workers(n=3) as (s, (a, b, c)):
+        for w in [b, c]:
+            w.data.update({'x': 1, 'y': 2})
+        a.collect({'x': [b.address, c.address], 'y': [b.address, c.address]})
+        assert a.data['x'] == 1 and a.data['y'] == 2
+        assert set(a.queues_by_worker) == set([b.address, c.address])
+        assert not any(a.outstanding.values())
+
+
+def test_locality_aware_placement():
+    with scheduler_and_workers() as (s, (a, b)):
+        s.send_data('x', list(range(1000)), address=b.address)
+        s.send_data('y', 1, address=a.address)
+        assert s.nbytes['x'] > s.nbytes['y']
+        assert len(s.available_workers) == 2
+
+        assert s.choose_worker(set(['x', 'y'])) == b.address
+        s.available_workers.put(b.address)
+        assert s.choose_worker(set(['y'])) == a.address
+        s.available_workers.put(a.address)
+
+        assert s.schedule({'z': (len, 'x')}, 'z', keep_results=True) == 1000
+        sleep(0.05)
+        assert b.data['z'] == 1000
+        assert 'z' not in a.data
+        assert s.nbytes['z'] > 0
+
+
+def test_duration_model():
+    with scheduler_and_workers() as (s, (a, b)):
+        dsk = dict((('slow', i), (slowinc, i, 0.05)) for i in range(4))
+        s.schedule(dsk, [('slow', i) for i in range(4)])
+        assert 0.04 < s.task_duration['slow'] < 0.5
+        assert 0.04 < s.expected_duration(('slow', 10)) < 0.5
+        assert s.expected_duration('new') == s.default_task_duration
+
+
+def test_long_tasks_spread_across_workers():
+    with scheduler_and_workers(worker_kwargs={'ncores': 1}) as (s, (a, b)):
+        s.task_duration['long'] = 10
+        s.send_data('x', 1, address=a.address)
+        s.processing[a.address].add(('long', 1))
+
+        # b must move x but a must first finish a long task
+        assert s.occupancy(a.address) == 10
+        assert s.transfer_cost(b.address, ['x']) > 0
+        assert s.choose_worker(set(['x'])) == b.address
+
+
+def test_worker_slots():
+    from threading import Thread
+    slots = WorkerSlots()
+    taken = []
+    t = Thread(target=lambda: taken.append(slots.take()))
+    t.start()
+    slots.put('alice', 2)
+    t.join()
+    assert taken == ['alice']
+
+    slots.put('bob')
+    assert slots.workers() == ['alice', 'bob']
+    assert slots.take(lambda workers: None) is None
+    assert len(slots) == 2
+    slots.remove_all('alice')
+    assert not slots.remove('alice')
+    assert slots.take(block=False) == 'bob'
+    assert slots.take(block=False) is None
+
+
+def test_tasks_per_worker():
+    with scheduler_and_workers(n=1, scheduler_kwargs={'tasks_per_worker': 4},
+                               worker_kwargs={'ncores': 2}) as (s, (a,)):
+        assert len(s.available_workers) == 4
+
+        dsk = dict((('x', i), (slowinc, i, 0.05)) for i in range(10))
+        start = time()
+        result = s.schedule(dsk, [('x', i) for i in range(10)])
+        end = time()
+        assert result == list(range(1, 11))
+        assert end - start >= 5 * 0.05  # at most two tasks compute at once
+        assert len(s.available_workers) == 4
+        assert not s.processing[a.address]
+
+
+def test_steal_work_for_new_worker():
+    with scheduler_and_workers(n=1, scheduler_kwargs={'tasks_per_worker': 4},
+                               worker_kwargs={'ncores': 1}) as (s, (a,)):
+        dsk = dict((('x', i), (slowinc, i, 0.2)) for i in range(4))
+        keys = [('x', i) for i in range(4)]
+        pool = multiprocessing.pool.ThreadPool(1)
+        future = pool.apply_async(s.schedule, args=(dsk, keys, True))
+        while len(s.processing[a.address]) < 4:
+            sleep(0.001)
+
+        # a has three tasks waiting for its one core, b takes some
+        b = Worker(s.address_to_workers, hostname='127.0.0.1', nthreads=10,
+                   ncores=1)
+        try:
+            assert future.get() == [1, 2, 3, 4]
+            assert s.worker_has[b.address] & set(keys)
+            assert len(s.worker_has[a.address] & set(keys)) >= 2
+            assert not s.stealing
+            assert not s.in_flight
+            assert not a.queued
+        finally:
+            pool.close()
+            b.close()
+
+
+def test_scatter_gather_large_arrays():
+    np = pytest.importorskip('numpy')
+    x = np.arange(1000000)
+    with scheduler_and_workers() as (s, (a, b)):
+        s.scatter({'x': x})
+        dsk = {'y': (sum, ['x']), 'z': (add, 'x', 1)}
+        y, z = s.schedule(dsk, ['y', 'z'])
+        assert (y == x).all()
+        assert (z == x + 1).all()
+        assert (s.gather(['x'])[0] == x).all()
+
+
+def test_batched_scatter_gather():
+    with scheduler_and_workers() as (s, (a, b)):
+        sleep(0.05)  # make sure all workers come in before scatter
+        sent = []
+        send_to_worker = s.send_to_worker
+
+        def counting_send(address, header, payload):
+            sent.append(header['function'])
+            return send_to_worker(address, header, payload)
+        s.send_to_worker = counting_send
+
+        data = dict(('x-%d' % i, i) for i in range(100))
+        s.scatter(data)
+        assert sent == ['setitems', 'setitems']
+        assert len(a.data) == len(b.data) == 50
+
+        del sent[:]
+        keys = sorted(data)
+        assert s.gather(keys) == [data[k] for k in keys]
+        assert s.gather([keys[:2], keys[2]]) == [[data[keys[0]],
+                                                  data[keys[1]]],
+                                                 data[keys[2]]]
+        assert len(sent) <= 4
+        assert set(sent) == set(['getitems'])
+
+        holder = a if 'x-0' in a.data else b
+        del holder.data['x-0']
+        assert raises(KeyError, lambda: s.gather(['x-0']))
+
+
+def test_concurrent_graphs_with_priority():
+    from threading import Thread
+    with scheduler_and_workers(n=1, scheduler_kwargs={'tasks_per_worker': 1},
+                               worker_kwargs={'ncores': 1}) as (s, (a,)):
+        order = []
+        trigger_task = s.trigger_task
+
+        def recording_trigger(key, *args, **kwargs):
+            order.append(key)
+            trigger_task(key, *args, **kwargs)
+        s.trigger_task = recording_trigger
+
+        # The batch job takes the only slot and blocks there
+        gate.clear()
+        batch = dict((('batch', i), (gated_inc, i)) for i in range(10))
+        out = []
+        t = Thread(target=lambda: out.append(
+                        s.schedule(batch, [('batch', i) for i in range(10)])))
+        t.start()
+        while not s.processing[a.address]:
+            sleep(1e-3)
+
+        t2 = Thread(target=lambda: out.append(
+                        s.schedule({'a': (inc, 1), 'b': (inc, 2)}, ['a', 'b'],
+                                   priority=1)))
+        t2.start()
+        while len(s.jobs) < 2:
+            sleep(1e-3)
+        gate.set()
+
+        t.join()
+        t2.join()
+        assert order[0][0] == 'batch'
+        assert set(order[1:3]) == set(['a', 'b'])  # overtook the batch
+        assert all(key[0] == 'batch' for key in order[3:])
+        assert sorted(out) == [list(range(1, 11)), [2, 3]]
+        assert not s.jobs
+        assert not s.held_keys
+
+
+def test_concurrent_graphs_share_tasks():
+    from threading import Thread
+    with scheduler_and_workers() as (s, (a, b)):
+        triggered = []
+        trigger_task = s.trigger_task
+
+        def recording_trigger(key, *args):
+            triggered.append(key)
+            return trigger_task(key, *args)
+        s.trigger_task = recording_trigger
+
+        dsk1 = {'x': (slowinc, 1, 0.2), 'y': (inc, 'x')}
+        dsk2 = {'x': (slowinc, 1, 0.2), 'z': (add, 'x', 10)}
+        out = []
+        t = Thread(target=lambda: out.append(s.schedule(dsk1, 'y')))
+        t.start()
+        sleep(0.05)
+        assert s.schedule(dsk2, 'z') == 12
+        t.join()
+        assert out == [3]
+        assert triggered.count('x') == 1
+
+        sleep(0.05)
+        assert not s.held_keys
+        assert not a.data and not b.data
+
+
+def test_next_job():
+    s = Scheduler()
+    try:
+        def job(priority, order, ready, running):
+            return {'priority': priority, 'order': order,
+                    'state': {'ready': ready, 'running': set(running)}}
+
+        assert s._next_job() is None
+        s.jobs = {'batch': job(0, 0, ['a'], []),
+                  'batch2': job(0, 1, ['b'], []),
+                  'done': job(5, 2, [], ['c'])}
+        assert s._next_job()['order'] == 0  # oldest first
+        s.jobs['batch']['state']['running'].add('d')
+        assert s._next_job()['order'] == 1  # then fewest running
+        s.jobs['dashboard'] = job(1, 3, ['e'], ['f', 'g'])
+        assert s._next_job()['order'] == 3  # higher priority overtakes
+    finally:
+        s.close()
+
+
+def test_memory_limit_spills_and_reports():
+    np = pytest.importorskip('numpy')
+    worker_kwargs = {'memory_limit': 10000, 'heartbeat': 0.01}
+    with scheduler_and_workers(n=1, worker_kwargs=worker_kwargs) as (s, (a,)):
+        dsk = dict((('x', i), (np.ones, 1000)) for i in range(5))
+        dsk['total'] = (sum, [(np.sum, ('x', i)) for i in range(5)])
+        s.schedule(dsk, [('x', i) for i in range(5)], keep_results=True)
+        assert a.data.spilled > 0
+        assert a.data.memory <= 10000
+        assert s.schedule(dsk, 'total') == 5000
+
+        sleep(0.1)
+        assert s.workers[a.address]['memory_limit'] == 10000
+        assert 0 < s.memory_use(a.address) <= 1
+
+
+def test_immediate_handlers_run_inline():
+    from threading import current_thread
+    s = Scheduler()
+    try:
+        threads = []
+        done = Event()
+
+        def record(header, payload):
+            threads.append(current_thread())
+            done.set()
+
+        def fail(header, payload):
+            raise ValueError()
+
+        functions = {'heartbeat': record, 'status': fail, 'schedule': record}
+        addr = s.address_to_workers
+        s._handle(functions, {'function': 'heartbeat'}, [], addr)
+        assert threads == [current_thread()]
+
+        s._handle(functions, {'function': 'status'}, [], addr)  # no raise
+        s._handle(functions, {'function': 'unknown'}, [], addr)
+
+        done.clear()
+        s._handle(functions, {'function': 'schedule'}, [], addr)  # in pool
+        assert done.wait(5) is not False
+        assert len(threads) == 2 and threads[1] is not current_thread()
+    finally:
+        s.close()
+
+
+def test_resources():
+    with scheduler({'tasks_per_worker': 2}) as s:
+        a = Worker(s.address_to_workers, hostname='127.0.0.1', nthreads=10,
+                   ncores=2, resources={'GPU': 1})
+        b = Worker(s.address_to_workers, hostname='127.0.0.1', nthreads=10,
+                   ncores=2)
+        try:
+            while len(s.workers) < 2:
+                sleep(1e-6)
+            assert s.worker_resources(a.address) == {'cores': 2, 'GPU': 1}
+            assert s.worker_resources(b.address) == {'cores': 2}
+            assert not s.can_run(b.address, {'GPU': 1})
+
+            used = []
+            trigger_task = s.trigger_task
+
+            def recording_trigger(key, *args):
+                trigger_task(key, *args)
+                used.append(s.resources_used[a.address].get('GPU', 0))
+            s.trigger_task = recording_trigger
+
+            dsk = dict((('gpu', i), (slowinc, i, 0.02)) for i in range(4))
+            dsk.update(dict((('cpu', i), (slowinc, i, 0.01))
+                            for i in range(8)))
+            resources = dict((('gpu', i), {'GPU': 1}) for i in range(4))
+            s.schedule(dsk, list(dsk), keep_results=True,
+                       resources=resources)
+
+            assert all(('gpu', i) in a.data for i in range(4))
+            assert not any(('gpu', i) in b.data for i in range(4))
+            assert max(used) == 1  # never two at once
+            assert any(('cpu', i) in b.data for i in range(8))
+            assert not s.task_resources
+            assert s.resources_used[a.address] == {'GPU': 0}
+        finally:
+            a.close()
+            b.close()
+
+
+def test_unsatisfiable_resources():
+    with scheduler_and_workers(n=2) as (s, workers):
+        dsk = {'x': (inc, 1), 'y': (inc, 'x')}
+        with pytest.raises(ValueError) as info:
+            s.schedule(dsk, 'y', resources={'x': {'GPU': 1}})
+        assert 'GPU' in str(info.value)
+        assert not s.jobs
+        assert not s.held_keys
+
+        with pytest.raises(ValueError):
+            s.schedule(dsk, 'y', resources={'y': {'cores': 100}})
+
+        assert s.schedule(dsk, 'y', resources={'y': {'cores': 1}}) == 3
+
+
+def test_metrics():
+    worker_kwargs = {'heartbeat': 0.01}
+    with scheduler_and_workers(worker_kwargs=worker_kwargs) as (s, (a, b)):
+        s.send_data('x', list(range(1000)), address=a.address)
+        dsk = dict((('y', i), (slowinc, i, 0.01)) for i in range(10))
+        dsk['z'] = (len, 'x')
+        s.schedule(dsk, list(dsk))
+        sleep(0.1)  # a heartbeat or two
+
+        m = s.metrics()
+        assert m['tasks_finished'] == 11
+        assert m['task_rate'] > 0
+        assert m['messages']['finished-task']['count'] == 11
+        assert m['messages']['finished-task']['time'] > 0
+        assert a.executed + b.executed == 11
+        assert sum(w['executed'] for w in m['workers'].values()) == 11
+        assert all(w['queued'] == 0 and w['processing'] == 0
+                   for w in m['workers'].values())
+        assert m['workers'][a.address]['memory'] > 0
+        assert 0 < a.compute_time + b.compute_time < 1
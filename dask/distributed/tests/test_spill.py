@@ -0,0 +1,64 @@
+import os
+
+import pytest
+np = pytest.importorskip('numpy')
+
+from dask.distributed.spill import SpillDict
+
+
+def test_spill_least_recently_used():
+    d = SpillDict(target=2500)
+    try:
+        x, y, z = np.ones(100), np.ones(100) * 2, np.ones(100) * 3  # 800 B
+        d['x'] = x
+        d['y'] = y
+        d['z'] = z
+        assert set(d.fast) == set(['x', 'y', 'z'])
+        assert d.memory == 2400 and d.spilled == 0
+
+        d['x']  # touch x, y is now least recently used
+        d['w'] = np.zeros(100)
+        assert set(d.slow) == set(['y'])
+        assert set(d.fast) == set(['x', 'z', 'w'])
+        assert d.memory == 2400 and d.spilled == 800
+        assert len(os.listdir(d.directory)) == 1
+
+        assert (d['y'] == y).all()  # reload, spills z
+        assert set(d.slow) == set(['z'])
+        assert len(d) == 4 and set(d) == set(['w', 'x', 'y', 'z'])
+
+        del d['z']
+        del d['x']
+        assert d.spilled == 0 and d.memory == 1600
+        assert not os.listdir(d.directory)
+        assert 'x' not in d
+    finally:
+        d.close()
+    assert not os.path.exists(d.directory)
+
+
+def test_spill_large_values_and_overwrite(tmpdir):
+    d = SpillDict(target=1000, directory=str(tmpdir))
+    d['x'] = np.ones(1000)  # larger than target
+    assert 'x' in d.slow and d.memory == 0
+    d['x'] = 1
+    assert 'x' in d.fast and not d.slow and d.spilled == 0
+    assert d['x'] == 1
+    d.close()
+    assert os.path.exists(str(tmpdir))
+
+
+def test_unpicklable_values_stay_in_memory():
+    gen = (i for i in range(3))  # dill can not pickle generators
+    d = SpillDict(target=1000)
+    try:
+        d['gen'] = gen
+        d['f'] = lambda x: x + 1  # needs dill
+        d['x'] = np.ones(200)  # over target, spills everything it can
+        assert d['gen'] is gen
+        assert set(d.fast) == set(['gen'])
+        assert d.memory == d.nbytes['gen']
+        assert d['f'](1) == 2
+        assert (d['x'] == 1).all()
+    finally:
+        d.close()
@@ -192,3 +192,41 @@ def test_worker_death():
             assert msg['status'] == 'failed'
             assert msg['key'] == dkey
             assert msg['worker'] == w2.address
+
+
+def test_getitems_setitems():
+    with worker_and_router(data={'x': 10, 'y': 20}) as (w, r):
+        header = {'jobid': 6, 'function': 'setitems', 'address': w.scheduler}
+        payload = {'data': {'a': 1, 'b': 2}, 'queue': 'q'}
+        r.send_multipart([w.address, pickle.dumps(header), pickle.dumps(payload)])
+
+        address, header, payload = r.recv_multipart()
+        assert pickle.loads(header)['function'] == 'setitems-ack'
+        assert sorted(pickle.loads(payload)['keys']) == ['a', 'b']
+        assert w.data == {'x': 10, 'y': 20, 'a': 1, 'b': 2}
+
+        header = {'jobid': 7, 'function': 'getitems', 'address': w.scheduler}
+        payload = {'keys': ['x', 'a', 'nope'], 'queue': 'q'}
+        r.send_multipart([w.address, pickle.dumps(header), pickle.dumps(payload)])
+
+        address, header, payload = r.recv_multipart()
+        payload = pickle.loads(payload)
+        assert pickle.loads(header)['function'] == 'getitems-ack'
+        assert payload['data'] == {'x': 10, 'a': 1}
+        assert payload['missing'] == ['nope']
+        assert payload['queue'] == 'q'
+
+
+def test_steal_names_the_job():
+    with worker_and_router() as (w, r):
+        w.queued.add(('q-1', 'x'))
+        w.steal({}, pickle.dumps({'key': 'x', 'queue': 'q-2'}))
+        address, header, payload = r.recv_multipart()
+        assert pickle.loads(payload) == {'key': 'x', 'stolen': False}
+        assert w.queued == set([('q-1', 'x')])
+
+        w.steal({}, pickle.dumps({'key': 'x', 'queue': 'q-1'}))
+        address, header, payload = r.recv_multipart()
+        assert pickle.loads(payload) == {'key': 'x', 'stolen': True}
+        assert not w.queued
+        assert w._stolen == set([('q-1', 'x')])
@@ -6,8 +6,9 @@ import socket
 import sys
 import os
 import traceback
-from threading import Thread, Lock, Event
+from threading import Thread, Lock, Event, Semaphore
 from multiprocessing.pool import ThreadPool
+from multiprocessing import cpu_count
 from contextlib import contextmanager
 from datetime import datetime
 from time import time
@@ -21,11 +22,13 @@ except ImportError:
 import zmq
 
 from ..compatibility import Queue, unicode
+from ..utils import nbytes
 from .. import core
+from . import protocol
+from .protocol import pickle_dumps
+from .spill import SpillDict
 
 
-def pickle_dumps(obj):
-    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
 
 MAX_DEALERS = 100
 
@@ -55,6 +58,9 @@ def logerrors():
 class Worker(object):
     """ Asynchronous worker in a distributed dask computation pool
 
+    Large NumPy arrays that we receive from peers, the scheduler or clients
+    are read-only, see ``dask.distributed.protocol``.  Tasks must copy such
+    inputs before they modify them.
 
     Parameters
     ----------
@@ -70,6 +76,21 @@ class Worker(object):
     heartbeat: int, bool
         The time between heartbeats in seconds, or False to turn off
         heartbeats, defaults to 5
+    ncores: int
+        Number of tasks to compute at once, defaults to the number of cores.
+        Other tasks sent by the scheduler collect their inputs from peers and
+        then wait for a free core.
+    memory_limit: int
+        Number of bytes of data to hold in memory.  If given, and no ``data``
+        is given, least recently used data beyond this limit spills to disk
+        in ``local_dir``.  See ``dask.distributed.spill.SpillDict``
+    local_dir: string
+        Directory for spilled data, defaults to a temporary directory
+    resources: dict
+        Amounts of named resources that this worker offers to tasks, e.g.
+        ``{'GPU': 2}``.  We offer our ``ncores`` as ``cores`` and our
+        ``memory_limit`` as ``memory`` in any case.  See
+        ``Scheduler.worker_resources``
 
     State
     -----
@@ -80,6 +101,20 @@ class Worker(object):
         Router socket to serve requests from other workers
     to_scheduler: zmq.Socket
         Dealer socket to communicate with scheduler
+    dead_peers: set
+        Workers that the scheduler told us are dead, we don't collect from
+        these
+    outstanding: dict
+        Maps peers to the number of keys that we are collecting from them
+    queued: set
+        Pairs of job queue and key of tasks that we have received but not yet
+        started to compute, the scheduler may take these back, see ``steal``
+    executed: int
+        Number of tasks that we have computed
+    compute_time: float
+        Total seconds spent computing tasks
+    transferred_bytes: int
+        Total bytes that we have collected from peers for tasks
 
     See Also
     --------
@@ -88,11 +123,23 @@ class Worker(object):
     """
     def __init__(self, scheduler, data=None, nthreads=100,
                  hostname=None, port_to_workers=None, bind_to_workers='*',
-                 block=False, heartbeat=5):
+                 block=False, heartbeat=5, ncores=None, memory_limit=None,
+                 local_dir=None, resources=None):
         if isinstance(scheduler, unicode):
             scheduler = scheduler.encode()
-        self.data = data if data is not None else dict()
+        self.memory_limit = memory_limit
+        self.resources = resources or {}
+        self._spill = None
+        if data is None:
+            if memory_limit is not None:
+                data = self._spill = SpillDict(memory_limit,
+                                               directory=local_dir)
+            else:
+                data = dict()
+        self.data = data
         self.pool = ThreadPool(nthreads)
+        self.ncores = ncores or cpu_count()
+        self.compute_slots = Semaphore(self.ncores)
         self.scheduler = scheduler
         self.heartbeat = heartbeat
         self.status = 'run'
@@ -113,6 +160,15 @@ class Worker(object):
 
         self.queues = dict()
         self.queues_by_worker = defaultdict(lambda: defaultdict(set))
+        self.dead_peers = set()
+        self.outstanding = defaultdict(int)
+        self._outstanding_lock = Lock()
+        self.queued = set()
+        self._stolen = set()
+        self._queued_lock = Lock()
+        self.executed = 0
+        self.compute_time = 0
+        self.transferred_bytes = 0
 
         self.pid = os.getpid()
 
@@ -121,19 +177,36 @@ class Worker(object):
         self.to_scheduler.setsockopt(zmq.IDENTITY, self.address)
         self.to_scheduler.connect(scheduler)
 
-        self.immediate_functions = {'close': self.close_from_scheduler}
+        # Run within the listening thread, these never block.  News of dead
+        # workers is handled in order with the tasks that mention them.
+        self.immediate_functions = {'close': self.close_from_scheduler,
+                                    'delitem': self.delitem,
+                                    'status': self.status_to_scheduler,
+                                    'ping': self.ping,
+                                    'steal': self.steal,
+                                    'worker-death': self.worker_death,
+                                    'worker-revival': self.worker_revival}
 
         self.scheduler_functions = {'status': self.status_to_scheduler,
                                     'compute': self.compute,
                                     'getitem': self.getitem_scheduler,
                                     'delitem': self.delitem,
+                                    'getitems': self.getitems_scheduler,
                                     'setitem': self.setitem,
-                                    'worker-death': self.worker_death}
+                                    'setitems': self.setitems,
+                                    'replicate': self.replicate}
 
         self.worker_functions = {'getitem': self.getitem_worker,
                                  'getitem-ack': self.getitem_ack,
+                                 'getitems': self.getitems_worker,
+                                 'getitems-ack': self.getitems_ack,
                                  'status': self.status_to_worker}
 
+        # Run within the listening thread so that they can reply on the same
+        # socket, e.g. to clients that do not have addresses of their own
+        self.immediate_worker_functions = {'getitems-client':
+                                                self.getitems_client}
+
         log(self.address, 'Start up', self.scheduler)
 
         self._listen_scheduler_thread = Thread(target=self.listen_to_scheduler)
@@ -149,6 +222,36 @@ class Worker(object):
         if block:
             self.block()
 
+    def memory(self):
+        """ Number of bytes of data held in memory, None if unknown """
+        if isinstance(self.data, SpillDict):
+            return self.data.memory
+        if isinstance(self.data, dict):
+            return sum(nbytes(v) for v in list(self.data.values()))
+        return None
+
+    def metrics(self):
+        """ Counters about our work, sent to the scheduler with heartbeats
+
+        ``cpu_time`` is that of our whole process.
+        """
+        t = os.times()
+        with self._queued_lock:
+            return {'executed': self.executed,
+                    'compute_time': self.compute_time,
+                    'transferred_bytes': self.transferred_bytes,
+                    'queued': len(self.queued),
+                    'cpu_time': t[0] + t[1]}
+
+    def _nbytes(self, key):
+        """ Size of local data, without reading spilled data from disk """
+        if isinstance(self.data, SpillDict):
+            return self.data.nbytes.get(key, 0)
+        try:
+            return nbytes(self.data[key])
+        except KeyError:
+            return 0
+
     def status_to_scheduler(self, header, payload):
         out_header = {'jobid': header.get('jobid')}
         log(self.address, 'Status check', header['address'])
@@ -166,7 +269,7 @@ class Worker(object):
             Worker.collect
         """
         loads = header.get('loads', pickle.loads)
-        payload = loads(payload)
+        payload = protocol.loads(payload, loads)
         log(self.address, "Getitem for worker", header, payload)
         header2 = {'function': 'getitem-ack',
                    'jobid': header.get('jobid')}
@@ -190,7 +293,7 @@ class Worker(object):
         """
         with logerrors():
             loads = header.get('loads', pickle.loads)
-            payload = loads(payload)
+            payload = protocol.loads(payload, loads)
             log(self.address, 'Getitem ack', payload)
             if header['status'] == 'Bad key':
                 msg = {'status': 'failed',
@@ -205,6 +308,79 @@ class Worker(object):
 
             self.queues[payload['queue']].put(msg)
 
+    def getitems_worker(self, header, payload):
+        """ Get many pieces of data and send them to another worker
+
+        See also:
+            Worker.collect
+            Worker.getitems_ack
+        """
+        loads = header.get('loads', pickle.loads)
+        payload = protocol.loads(payload, loads)
+        log(self.address, "Getitems for worker", header, payload['keys'])
+        header2 = {'function': 'getitems-ack',
+                   'jobid': header.get('jobid')}
+        payload2 = self._getitems(payload['keys'])
+        payload2['queue'] = payload['queue']
+        self.send_to_worker(header['address'], header2, payload2)
+
+    def getitems_ack(self, header, payload):
+        """ Receive many pieces of data after sending a getitems request
+
+        Puts one message per key onto the queue, as in ``getitem_ack``
+
+        See also:
+            Worker.getitems_worker
+            Worker.collect
+        """
+        with logerrors():
+            loads = header.get('loads', pickle.loads)
+            payload = protocol.loads(payload, loads)
+            log(self.address, 'Getitems ack', list(payload['data']),
+                payload['missing'])
+            queue = self.queues[payload['queue']]
+            for key, value in payload['data'].items():
+                self.data[key] = value
+                queue.put({'status': 'success',
+                           'key': key,
+                           'worker': header['address']})
+            for key in payload['missing']:
+                queue.put({'status': 'failed',
+                           'key': key,
+                           'worker': header['address']})
+
+    def getitems_client(self, address, header, payload):
+        """ Send many pieces of local data straight back to a client
+
+        Replies on the socket on which the request arrived, addressed by the
+        ``address`` (zmq identity) of the requester.
+
+        See also:
+            Client.gather
+        """
+        loads = header.get('loads', pickle.loads)
+        payload = protocol.loads(payload, loads)
+        log(self.address, 'Getitems for client', address, payload['keys'])
+        header2 = {'jobid': header.get('jobid'),
+                   'function': 'getitems-ack',
+                   'address': self.address,
+                   'timestamp': datetime.utcnow()}
+        payload2 = self._getitems(payload['keys'])
+        frames = protocol.dumps(payload2)
+        self.to_workers.send_multipart([address, pickle_dumps(header2)] +
+                                       frames, copy=False)
+
+    def _getitems(self, keys):
+        """ Local data for keys, and the list of keys that we don't have """
+        data = dict()
+        missing = []
+        for key in keys:
+            try:
+                data[key] = self.data[key]
+            except KeyError:
+                missing.append(key)
+        return {'data': data, 'missing': missing}
+
     def getitem_scheduler(self, header, payload):
         """ Send local data to scheduler
 
@@ -213,7 +389,7 @@ class Worker(object):
             Scheduler.getitem_ack
         """
         loads = header.get('loads', pickle.loads)
-        payload = loads(payload)
+        payload = protocol.loads(payload, loads)
         log(self.address, 'Get from scheduler', payload)
         key = payload['key']
         header2 = {'jobid': header.get('jobid')}
@@ -227,6 +403,22 @@ class Worker(object):
         payload2 = {'key': key, 'value': result, 'queue': payload['queue']}
         self.send_to_scheduler(header2, payload2)
 
+    def getitems_scheduler(self, header, payload):
+        """ Send many pieces of local data to scheduler
+
+        See also:
+            Scheduler.gather
+            Scheduler.getitems_ack
+        """
+        loads = header.get('loads', pickle.loads)
+        payload = protocol.loads(payload, loads)
+        log(self.address, 'Getitems from scheduler', payload['keys'])
+        header2 = {'jobid': header.get('jobid'),
+                   'function': 'getitems-ack'}
+        payload2 = self._getitems(payload['keys'])
+        payload2['queue'] = payload['queue']
+        self.send_to_scheduler(header2, payload2)
+
     def setitem(self, header, payload):
         """ Assign incoming data to local dictionary
 
@@ -236,7 +428,7 @@ class Worker(object):
             Scheduler.setitem_ack
         """
         loads = header.get('loads', pickle.loads)
-        payload = loads(payload)
+        payload = protocol.loads(payload, loads)
         log(self.address, 'Setitem', payload['key'])
         key = payload['key']
         value = payload['value']
@@ -251,10 +443,30 @@ class Worker(object):
                 header2, payload2)
             self.send_to_scheduler(header2, payload2)
 
+    def setitems(self, header, payload):
+        """ Assign many pieces of incoming data to local dictionary
+
+        See also:
+            Scheduler.scatter
+            Scheduler.setitems_ack
+        """
+        loads = header.get('loads', pickle.loads)
+        payload = protocol.loads(payload, loads)
+        data = payload['data']
+        log(self.address, 'Setitems', list(data))
+        self.data.update(data)
+
+        queue = payload.get('queue', False)
+        if queue:
+            header2 = {'jobid': header.get('jobid'),
+                       'function': 'setitems-ack'}
+            payload2 = {'keys': list(data), 'queue': queue}
+            self.send_to_scheduler(header2, payload2)
+
     def delitem(self, header, payload):
         """ Remove item from local data """
         loads = header.get('loads', pickle.loads)
-        payload = loads(payload)
+        payload = protocol.loads(payload, loads)
         log(self.address, 'Delitem', payload)
         key = payload['key']
         del self.data[key]
@@ -270,9 +482,10 @@ class Worker(object):
         header['address'] = self.address
         header['timestamp'] = datetime.utcnow()
         dumps = header.get('dumps', pickle_dumps)
+        frames = protocol.dumps(payload, dumps)
         with self.lock:
-            self.to_scheduler.send_multipart([pickle_dumps(header),
-                                              dumps(payload)])
+            self.to_scheduler.send_multipart([pickle_dumps(header)] + frames,
+                                             copy=False)
 
     def send_to_worker(self, address, header, payload):
         """ Send data to workers
@@ -296,9 +509,10 @@ class Worker(object):
         header['timestamp'] = datetime.utcnow()
         log(self.address, 'Send to worker', address, header)
         dumps = header.get('dumps', pickle_dumps)
+        frames = protocol.dumps(payload, dumps)
         with self.lock:
-            self.dealers[address].send_multipart([pickle_dumps(header),
-                                                  dumps(payload)])
+            self.dealers[address].send_multipart([pickle_dumps(header)] +
+                                                 frames, copy=False)
 
     def listen_to_scheduler(self):
         """
@@ -349,12 +563,15 @@ class Worker(object):
                 break
             with logerrors():
                 with self.lock:
-                    header, payload = self.to_scheduler.recv_multipart()
-                header = pickle.loads(header)
+                    frames = self.to_scheduler.recv_multipart(copy=False)
+                header, payload = pickle.loads(frames[0].bytes), frames[1:]
                 log(self.address, 'Receive job from scheduler', header)
                 if header['function'] in self.immediate_functions:
                     function = self.immediate_functions[header['function']]
-                    function(header, payload)
+                    try:
+                        function(header, payload)
+                    except Exception as e:
+                        log(self.address, 'Error in handler', header, e)
                 elif header['function'] in self.scheduler_functions:
                     function = self.scheduler_functions[header['function']]
                     future = self.pool.apply_async(function, args=(header, payload))
@@ -375,12 +592,18 @@ class Worker(object):
                 break
 
             with logerrors():
-                address, header, payload = self.to_workers.recv_multipart()
-                header = pickle.loads(header)
+                frames = self.to_workers.recv_multipart(copy=False)
+                address, payload = frames[0].bytes, frames[2:]
+                header = pickle.loads(frames[1].bytes)
                 if 'address' not in header:
                     header['address'] = address
                 log(self.address, 'Receive job from worker', address, header)
 
+                if header['function'] in self.immediate_worker_functions:
+                    function = self.immediate_worker_functions[header['function']]
+                    function(address, header, payload)
+                    continue
+
                 try:
                     function = self.worker_functions[header['function']]
                 except KeyError:
@@ -405,8 +628,9 @@ class Worker(object):
 
         Given a dictionary of desired data and who holds that data
 
-        This fires off getitem reqeusts to one of the hosts for each piece of
-        data then blocks on all of the responses, then inserts this data into
+        This chooses one of the hosts for each piece of data, fires off one
+        getitems request to each host for all of the data it should send, then
+        blocks on all of the responses and inserts this data into
         ``self.data``.
 
         Example
@@ -420,71 +644,95 @@ class Worker(object):
         --------
 
         1.  Worker creates unique queue
-        2.  For each data this worker chooses a worker at random that holds
-            that data and fires off a 'getitem' request
-            {'key': ..., 'queue': ...}
-        3.  Recipient worker handles the request and fires back a 'getitem-ack'
-            with the data
-            {'key': ..., 'value': ..., 'queue': ...}
-        4.  Local getitem_ack function adds the value to the local dict and
-            puts the key in the queue
+        2.  For each data this worker chooses the holder from which it is
+            collecting the fewest keys (see ``outstanding``), breaking ties at
+            random.  It fires off one 'getitems' request per chosen worker
+            {'keys': [...], 'queue': ...}
+        3.  Recipient worker handles the request and fires back a
+            'getitems-ack' with the data
+            {'data': {key: value}, 'missing': [...], 'queue': ...}
+        4.  Local getitems_ack function adds the values to the local dict and
+            puts a message for each key in the queue
         5.  Once all keys have run through the queue the collect function wakes
-            up again, releases the queue, and returns control
-        6?  This is often called from Worker.compute; control often ends there
+            up again.  Keys that a peer lacked, or that a peer held when it
+            died (see ``worker_death``), are requested again from their other
+            holders.  If no holder remains we raise a ValueError.
+        6.  Collect releases the queue and returns control
+        7?  This is often called from Worker.compute; control often ends there
 
         See also:
-            Worker.getitem
-            Worker.getitem_ack
+            Worker.getitems_worker
+            Worker.getitems_ack
             Worker.compute
             Scheduler.trigger_task
         """
-        socks = []
-
         qkey = str(uuid.uuid1())
         queue = Queue()
         self.queues[qkey] = queue
-        locations = locations.copy()  # don't mutate global locations
+        # don't mutate global locations
+        locations = dict((k, set(v)) for k, v in locations.items())
 
         # Send out requests for data
         log(self.address, 'Collect data from peers', locations)
         start = time()
-        counter = 0
+        asked = dict()
         with logerrors():
-            for key, locs in list(locations.items()):
-                if key in self.data:  # already have this locally
-                    locations.pop(key)
-                    continue
-                try:
-                    worker = random.choice(tuple(locs))  # randomly select one peer
-                except IndexError:
-                    raise ValueError("%s could not be collected from any "
-                                     "locations." % (key))
-
-                # track keys and where they are comming from
-                self.queues_by_worker[worker][qkey].add(key)
-
-                header = {'jobid': key,
-                          'function': 'getitem'}
-                payload = {'function': 'getitem',
-                           'key': key,
-                           'queue': qkey}
-                self.send_to_worker(worker, header, payload)
-                counter += 1
-
-            msgs = [queue.get() for i in range(counter)]
-            for m in msgs:
-                if m['status'] == 'failed':
-                    locations[m['key']].remove(m['worker'])
-                    log(self.address, 'Failed to get key: ', m['key'],
-                        ' from worker: ', m['worker'])
-                else:
-                    locations.pop(m['key'])
-
-            del self.queues[qkey]
-            if locations != {}:
-                log(self.address, 'Retrying collect with keys and locations',
-                    locations)
-                self.collect(locations)
+            try:
+                while True:
+                    asked = dict()
+                    keys_by_worker = defaultdict(list)
+                    for key, locs in list(locations.items()):
+                        if key in self.data:  # already have this locally
+                            locations.pop(key)
+                            continue
+                        locs = locs - self.dead_peers
+                        if not locs:
+                            raise ValueError("%s could not be collected from "
+                                             "any locations." % (key))
+                        with self._outstanding_lock:
+                            worker = min(locs, key=lambda w: (
+                                self.outstanding[w], random.random()))
+                            self.outstanding[worker] += 1
+
+                        # track keys and where they are comming from
+                        self.queues_by_worker[worker][qkey].add(key)
+                        keys_by_worker[worker].append(key)
+                        asked[key] = worker
+
+                    if not asked:
+                        break
+
+                    for worker, keys in keys_by_worker.items():
+                        header = {'jobid': qkey,
+                                  'function': 'getitems'}
+                        payload = {'keys': keys,
+                                   'queue': qkey}
+                        self.send_to_worker(worker, header, payload)
+
+                    while asked:
+                        m = queue.get()
+                        if asked.get(m['key']) != m['worker']:
+                            continue  # stale news from an earlier attempt
+                        del asked[m['key']]
+                        with self._outstanding_lock:
+                            self.outstanding[m['worker']] -= 1
+                        if m['status'] == 'failed':
+                            locations[m['key']].discard(m['worker'])
+                            log(self.address, 'Failed to get key: ', m['key'],
+                                ' from worker: ', m['worker'])
+                        else:
+                            locations.pop(m['key'])
+
+                    if locations:
+                        log(self.address, 'Retrying collect with keys and '
+                            'locations', locations)
+            finally:
+                del self.queues[qkey]
+                for queues in list(self.queues_by_worker.values()):
+                    queues.pop(qkey, None)
+                with self._outstanding_lock:
+                    for worker in asked.values():
+                        self.outstanding[worker] -= 1
             log(self.address, 'Collect finishes', time() - start, 'seconds')
 
     def compute(self, header, payload):
@@ -499,44 +747,138 @@ class Worker(object):
         ...            'queue': 'unique-identifier'}
 
         Collect necessary data from locations (see ``collect``),
-        then compute task and store result into ``self.data``.  Finally report
-        back to the scheduler that we're free.
+        then wait for one of ``ncores`` compute slots, compute task and store
+        result into ``self.data``.  Finally report back to the scheduler that
+        we're free.
         """
         with logerrors():
             # Unpack payload
             loads = header.get('loads', pickle.loads)
-            payload = loads(payload)
+            payload = protocol.loads(payload, loads)
             locations = payload['locations']
             key = payload['key']
             task = payload['task']
+            queued = (payload['queue'], key)
+            with self._queued_lock:
+                self.queued.add(queued)
 
-            # Grab data from peers
+            # Grab data from peers, possibly while other tasks compute
+            remote = [dep for dep in locations if dep not in self.data]
+            transfer_start = time()
             if locations:
-                self.collect(locations)
+                try:
+                    self.collect(locations)
+                except ValueError as e:
+                    # Our peers lost the data, the scheduler will recompute it
+                    log(self.address, 'Missing data', key, e)
+                    with self._queued_lock:
+                        self.queued.discard(queued)
+                    header2 = {'function': 'finished-task'}
+                    result = {'key': key,
+                              'duration': 0,
+                              'status': 'missing-data',
+                              'missing': [dep for dep in locations
+                                               if dep not in self.data],
+                              'dependencies': [dep for dep in locations
+                                                    if dep in self.data],
+                              'queue': payload['queue']}
+                    self.send_to_scheduler(header2, result)
+                    return
+            transfer_time = time() - transfer_start
+            transfer_bytes = sum(self._nbytes(dep) for dep in remote)
 
             # Do actual work
-            start = time()
-            status = "OK"
-            log(self.address, "Start computation", key, task)
-            try:
-                result = core.get(self.data, task)
-                end = time()
-            except Exception as e:
-                status = e
-                end = time()
-            else:
-                self.data[key] = result
-            log(self.address, "End computation", key, task, status)
+            with self.compute_slots:
+                with self._queued_lock:
+                    stolen = queued in self._stolen
+                    self._stolen.discard(queued)
+                    self.queued.discard(queued)
+                if stolen:
+                    # Tell the scheduler about the data that we collected
+                    log(self.address, 'Stolen', key)
+                    header2 = {'function': 'finished-task'}
+                    result = {'key': key,
+                              'duration': 0,
+                              'status': 'stolen',
+                              'dependencies': list(locations),
+                              'queue': payload['queue']}
+                    self.send_to_scheduler(header2, result)
+                    return
+                start = time()
+                status = "OK"
+                size = None
+                log(self.address, "Start computation", key, task)
+                try:
+                    result = core.get(self.data, task)
+                    end = time()
+                except Exception as e:
+                    status = e
+                    end = time()
+                else:
+                    self.data[key] = result
+                    size = nbytes(result)
+                log(self.address, "End computation", key, task, status)
+                with self._queued_lock:
+                    self.executed += 1
+                    self.compute_time += end - start
+                    self.transferred_bytes += transfer_bytes
 
             # Report finished to scheduler
             header2 = {'function': 'finished-task'}
             result = {'key': key,
                       'duration': end - start,
                       'status': status,
+                      'nbytes': size,
+                      'transfer_time': transfer_time,
+                      'transfer_bytes': transfer_bytes,
                       'dependencies': list(locations),
                       'queue': payload['queue']}
             self.send_to_scheduler(header2, result)
 
+    def replicate(self, header, payload):
+        """ Copy data from peers at the request of the scheduler
+
+        See also:
+            Scheduler.replicate
+            Scheduler._replicate_ack
+        """
+        with logerrors():
+            loads = header.get('loads', pickle.loads)
+            payload = protocol.loads(payload, loads)
+            locations = payload['locations']
+            try:
+                self.collect(locations)
+            except ValueError as e:
+                log(self.address, 'Failed to replicate', e)
+            header2 = {'function': 'replicate-ack'}
+            payload2 = {'keys': [k for k in locations if k in self.data],
+                        'requested': list(locations)}
+            self.send_to_scheduler(header2, payload2)
+
+    def steal(self, header, payload):
+        """ Scheduler takes back a task that we have not yet started
+
+        The scheduler names the task by its key and job queue, so that it
+        does not take another computation of the same key.  We reply on
+        'steal-ack' whether we gave it up.
+
+        See also:
+            Scheduler.steal_work
+        """
+        with logerrors():
+            loads = header.get('loads', pickle.loads)
+            payload = protocol.loads(payload, loads)
+            key = payload['key']
+            queued = (payload['queue'], key)
+            with self._queued_lock:
+                stolen = queued in self.queued
+                if stolen:
+                    self.queued.remove(queued)
+                    self._stolen.add(queued)
+            log(self.address, 'Steal request', key, stolen)
+            self.send_to_scheduler({'function': 'steal-ack'},
+                                   {'key': key, 'stolen': stolen})
+
     def close_from_scheduler(self, header, payload):
         log(self.address, 'Close signal from scheduler')
         self.close()
@@ -563,6 +905,8 @@ class Worker(object):
             log(self.address, 'Close pool')
             self.block()
             self.context.destroy(linger=3)
+            if self._spill is not None:
+                self._spill.close()
 
     def __del__(self):
         self.close()
@@ -576,7 +920,12 @@ class Worker(object):
         """Send a message to scheduler at a given interval"""
         while self.status != 'closed':
             header = {'function': 'heartbeat'}
-            payload = {'pid': self.pid}
+            payload = {'pid': self.pid,
+                       'ncores': self.ncores,
+                       'memory': self.memory(),
+                       'memory_limit': self.memory_limit,
+                       'resources': self.resources,
+                       'metrics': self.metrics()}
             self.send_to_scheduler(header, payload)
             self._heartbeat_thread.event.wait(pulse)
 
@@ -587,16 +936,33 @@ class Worker(object):
         """
         with logerrors():
             loads = header.get('loads', pickle.loads)
-            payload = loads(payload)
+            payload = protocol.loads(payload, loads)
             removed_workers = payload['removed']
+            self.dead_peers.update(removed_workers)
             for w in removed_workers:
-                for queue, keys in self.queues_by_worker[w].items():
+                for queue, keys in list(self.queues_by_worker[w].items()):
+                    if queue not in self.queues:
+                        continue
                     for k in keys:
                         msg = {'status': 'failed',
                                'key': k,
                                'worker': w}
                         self.queues[queue].put(msg)
 
+    def worker_revival(self, header, payload):
+        """ A worker that we thought dead is back, collect from it again """
+        loads = header.get('loads', pickle.loads)
+        payload = protocol.loads(payload, loads)
+        self.dead_peers.difference_update(payload['revived'])
+
+    def ping(self, header, payload):
+        """ Scheduler checks that we are still connected, nothing to do
+
+        See also:
+            Scheduler._probe_workers
+        """
+        pass
+
 
 def status():
     return 'OK'
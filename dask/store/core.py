@@ -1,8 +1,14 @@
+from __future__ import absolute_import, division, print_function
+
 from collections import defaultdict, MutableMapping
 from operator import getitem, add
 from datetime import datetime
-from time import time
-from ..core import istask, ishashable
+from functools import partial
+from timeit import default_timer
+
+from ..core import istask, ishashable, get_dependencies
+from ..context import _globals
+from ..utils import nbytes
 
 
 class Store(MutableMapping):
@@ -29,6 +35,14 @@ class Store(MutableMapping):
     >>> s['y']
     15
 
+    Missing dependencies are computed together in one call to a parallel
+    scheduler (the threaded scheduler by default).  If ``available_bytes`` is
+    given then cached intermediate results are evicted to stay within that
+    budget.  Results that are cheap to recompute, large, and rarely accessed
+    go first.  Evicted results are recomputed on demand.
+
+    >>> s = ds.Store(available_bytes=1e9)
+
     Design
     ------
 
@@ -44,9 +58,13 @@ class Store(MutableMapping):
         dict mapping the time it took to compute each key
     access_times: dict:: {key: [datetimes]}
         The times at which a key was accessed
+    nbytes: dict:: {key: int}
+        The size of each cached intermediate value
+    total_bytes: int
+        The sum of ``nbytes``, kept below ``available_bytes`` if given
     """
 
-    def __init__(self, cache=None):
+    def __init__(self, cache=None, available_bytes=None, get=None):
         self.dsk = dict()
         if cache is None:
             cache = dict()
@@ -54,6 +72,12 @@ class Store(MutableMapping):
         self.data = set()
         self.compute_time = dict()
         self.access_times = defaultdict(list)
+        self.nbytes = dict()
+        self.total_bytes = 0
+        self.available_bytes = available_bytes
+        if get is None:
+            from ..threaded import get
+        self._get = get
 
     def __setitem__(self, key, value):
         if key in self.dsk:
@@ -72,7 +96,7 @@ class Store(MutableMapping):
 
     def __getitem__(self, key):
         if isinstance(key, list):
-            return (self[item] for item in key)
+            return self.get_many(key)
         if not ishashable(key):
             return key
         if key not in self.dsk:
@@ -83,22 +107,118 @@ class Store(MutableMapping):
         if key in self.cache:
             return self.cache[key]
 
-        task = self.dsk[key]
-        func, args = task[0], task[1:]
-
-        if func == getitem and args[0] is self.cache:
-            return self.cache[args[1]]
-
-        args = [self[arg] for arg in args]
-
-        start = time()
-        result = func(*args)
-        end = time()
-
-        self.cache[key] = result
-        self.compute_time[key] = end - start
-
-        return result
+        return self._compute([key])[0]
+
+    def get_many(self, keys):
+        """ Get several keys at once
+
+        All uncached keys and their missing dependencies are computed
+        together in a single call to the parallel scheduler, so shared
+        dependencies are computed only once.
+
+        >>> import dask.store as ds
+        >>> s = ds.Store()
+        >>> s['x'] = 1
+        >>> s['y'] = (add, 'x', 1)
+        >>> s['z'] = (add, 'x', 'y')
+        >>> s.get_many(['x', 'y', 'z'])
+        [1, 2, 3]
+        """
+        keys = list(keys)
+        now = datetime.now()
+        missing = []
+        for key in keys:
+            if ishashable(key) and key in self.dsk:
+                self.access_times[key].append(now)
+                if key not in self.cache and key not in missing:
+                    missing.append(key)
+        if missing:
+            present = [k for k in keys if ishashable(k) and k in self.dsk]
+            results = dict(zip(missing, self._compute(missing, keep=present)))
+        else:
+            results = dict()
+
+        out = []
+        for key in keys:
+            if not ishashable(key) or key not in self.dsk:
+                out.append(key)
+            elif key in results:
+                out.append(results[key])
+            else:
+                out.append(self.cache[key])
+        return out
+
+    def _compute(self, keys, keep=()):
+        """ Compute uncached keys in one call to the parallel scheduler
+
+        Builds the subgraph of keys needed to produce ``keys``, reading
+        cached dependencies out of the cache, and computes it in parallel.
+        We read cached values with a task rather than placing them in the
+        graph, where values like tasks or keys would be interpreted.
+        Every intermediate result is cached and timed.  Neither ``keys`` nor
+        ``keep`` are evicted afterwards.
+        """
+        now = datetime.now()
+        dsk = dict()
+        cached = set()
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            if key in dsk:
+                continue
+            if key in self.cache:
+                dsk[key] = (partial(getitem, self.cache, key),)
+                cached.add(key)
+                continue
+            dsk[key] = self.dsk[key]
+            deps = get_dependencies(self.dsk, key)
+            for dep in deps:
+                self.access_times[dep].append(now)
+            stack.extend(deps)
+
+        start_times = dict()
+
+        def pretask(key, dsk, state):
+            start_times[key] = default_timer()
+
+        def posttask(key, result, dsk, state, worker_id):
+            duration = default_timer() - start_times.pop(key)
+            if key in cached:
+                return
+            self.compute_time[key] = duration
+            self._cache_result(key, result)
+
+        callbacks = list(_globals['callbacks'])
+        callbacks.append((None, pretask, posttask, None))
+        results = self._get(dsk, list(keys), callbacks=callbacks)
+
+        self._evict(keep=set(keys) | set(keep))
+        return results
+
+    def _cache_result(self, key, value):
+        self.cache[key] = value
+        n = nbytes(value)
+        self.total_bytes += n - self.nbytes.get(key, 0)
+        self.nbytes[key] = n
+
+    def _score(self, key):
+        """ Value of keeping ``key`` in the cache, per byte """
+        cost = self.compute_time.get(key, 0) * (1 + len(self.access_times[key]))
+        return cost / (self.nbytes[key] + 1)
+
+    def _evict(self, keep=()):
+        """ Evict low-value intermediate results until we fit in budget """
+        if (self.available_bytes is None or
+            self.total_bytes <= self.available_bytes):
+            return
+        keep = set(keep)
+        candidates = sorted((k for k in self.nbytes if k not in keep),
+                            key=self._score)
+        for key in candidates:
+            if self.total_bytes <= self.available_bytes:
+                break
+            del self.cache[key]
+            self.total_bytes -= self.nbytes.pop(key)
 
     def __len__(self):
         return len(self.dsk)
@@ -50,3 +50,109 @@ def test_update():
 
     assert raises(Exception, lambda: s.update({'x': 2}))
     assert not raises(Exception, lambda: s.update({'x': 1}))
+
+
+def test_eviction_under_byte_budget():
+    s = Store(available_bytes=2500)
+    s['x'] = 1
+    s['a'] = (lambda x: b'a' * 1000, 'x')
+    s['b'] = (lambda x: b'b' * 1000, 'x')
+    s['c'] = (lambda x: b'c' * 1000, 'x')
+
+    assert s['a'] == b'a' * 1000
+    assert s['b'] == b'b' * 1000
+    assert s['c'] == b'c' * 1000
+
+    assert 'x' in s.cache
+    assert s.total_bytes <= 2500
+    assert 'c' in s.cache
+    assert len([k for k in 'abc' if k in s.cache]) == 2
+    assert s.total_bytes == sum(s.nbytes.values())
+
+    # Evicted values are recomputed on demand
+    assert [s[k] for k in 'abc'] == [b'a' * 1000, b'b' * 1000, b'c' * 1000]
+
+
+def test_eviction_prefers_cheap_results():
+    from time import sleep
+    def slow(x):
+        sleep(0.05)
+        return b'a' * 1000
+
+    s = Store(available_bytes=2500)
+    s['x'] = 1
+    s['slow'] = (slow, 'x')
+    s['fast'] = (lambda x: b'b' * 1000, 'x')
+    s['slow']
+    s['fast']
+    assert 'fast' in s.cache
+    s['y'] = (lambda x: b'c' * 1000, 'x')
+    s['y']
+    assert 'slow' in s.cache
+    assert 'fast' not in s.cache
+
+
+def test_dependencies_computed_in_one_get():
+    calls = []
+    def get(dsk, keys, **kwargs):
+        from dask.threaded import get
+        calls.append(set(dsk))
+        return get(dsk, keys, **kwargs)
+
+    s = Store(get=get)
+    s['x'] = 1
+    s['y'] = (inc, 'x')
+    s['z'] = (add, 'x', 'y')
+    s['w'] = (mul, 'y', 'z')
+
+    assert s['w'] == 6
+    assert calls == [set(['x', 'y', 'z', 'w'])]
+    assert s.cache['z'] == 3
+    assert set(s.compute_time) == set(['y', 'z', 'w'])
+
+    assert s['w'] == 6
+    assert len(calls) == 1
+
+
+def test_get_many():
+    calls = []
+    def get(dsk, keys, **kwargs):
+        from dask.threaded import get
+        calls.append(sorted(keys))
+        return get(dsk, keys, **kwargs)
+
+    s = Store(get=get)
+    s['x'] = 1
+    s['y'] = (inc, 'x')
+    s['a'] = (add, 'x', 'y')
+    s['b'] = (mul, 'y', 10)
+
+    assert s.get_many(['a', 'b', 'x', 5, 'a']) == [3, 20, 1, 5, 3]
+    assert calls == [['a', 'b']]
+    assert len(s.access_times['a']) == 2
+    assert len(s.access_times['y']) == 2
+
+    assert s.get_many(['b', 'y']) == [20, 2]
+    assert len(calls) == 1
+    assert s[['x', 'b']] == [1, 20]
+
+
+def test_mapping_get():
+    s = Store()
+    s['x'] = 1
+    s['y'] = (inc, 'x')
+    assert s.get('y') == 2
+    assert s.get('x', 10) == 1
+    assert s.get('y', 10) == 2
+
+
+def test_cached_results_stay_literal():
+    s = Store()
+    s['x'] = 1
+    s['task'] = (tuple, [inc, 5])  # result looks like a task
+    s['name'] = (str.lower, 'X')  # result looks like a key
+    s['y'] = (lambda t, n: (t, n), 'task', 'name')
+
+    assert s['task'] == (inc, 5)
+    assert s['name'] == 'x'
+    assert s['y'] == ((inc, 5), 'x')
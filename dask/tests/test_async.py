@@ -170,3 +170,19 @@ def test_rerun_exceptions_locally():
             get({'x': (f,)}, 'x')
     except Exception as e:
         assert 'execute_task' not in str(e).lower()
+
+
+def test_scheduler_stats():
+    dsk = {'x': 1, 'y': (inc, 'x'), 'z': (inc, 'y'), 'w': (add, 'y', 'z')}
+    stats = []
+    finish = lambda dsk, state, errored: stats.append(state['stats'])
+
+    assert get_sync(dsk, 'w', callbacks=[(None, None, None, finish)]) == 5
+
+    [s] = stats
+    assert s['ntasks'] == 3
+    assert s['ready_length_max'] >= 1
+    for k in ['cull', 'order', 'start_state', 'prep_data', 'finish_task',
+              'queue_wait', 'worker_idle', 'total']:
+        assert s[k] >= 0
+    assert s['total'] >= s['cull'] + s['order'] + s['start_state']
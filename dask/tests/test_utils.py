@@ -1,6 +1,10 @@
 import os
+import subprocess
+import sys
 
-from dask.utils import textblock, filetext, takes_multiple_arguments, Dispatch
+import dask
+from dask.utils import (textblock, filetext, takes_multiple_arguments,
+                        Dispatch, stable_hash)
 
 def test_textblock():
     text = b'123 456 789 abc def ghi'.replace(b' ', os.linesep.encode())
@@ -50,3 +54,22 @@ def test_dispatch():
     assert foo(1.0) == 0.0
     assert foo(b) == b
     assert foo((1, 2.0, b)) == (2, 1.0, b)
+
+
+def test_stable_hash():
+    assert stable_hash('x') == stable_hash(u'x') == stable_hash(b'x')
+    assert stable_hash(1) == stable_hash(1.0)
+    assert stable_hash(('x', 1)) == stable_hash(('x', 1))
+    assert stable_hash(None) == 0
+    assert all(stable_hash(x) >= 0 for x in [-1, 'x', ('x', -1), -2.5])
+
+
+def test_stable_hash_agrees_across_processes():
+    code = ("import datetime; from dask.utils import stable_hash; "
+            "print([stable_hash(x) for x in ['a', b'b', u'c', None, "
+            "('x', 1), frozenset(['y']), datetime.date(2000, 1, 1)]])")
+    root = os.path.dirname(os.path.dirname(dask.__file__))
+    outs = [subprocess.check_output([sys.executable, '-c', code], cwd=root,
+                                    env=dict(os.environ, PYTHONHASHSEED=seed))
+            for seed in ['1', '2']]
+    assert outs[0] == outs[1]
@@ -8,6 +8,8 @@ import sys
 import shutil
 import struct
 import gzip
+import zlib
+import datetime
 import tempfile
 import inspect
 
@@ -180,6 +182,19 @@ def textblock(file, start, stop, compression=None):
     return file.read(stop - start)
 
 
+def nbytes(o):
+    """ Approximate number of bytes used by an object
+
+    >>> nbytes(b'1234') >= 4
+    True
+    """
+    if hasattr(o, 'nbytes'):
+        return o.nbytes
+    if hasattr(o, 'memory_usage'):  # pandas DataFrame
+        return o.memory_usage(index=True).sum()
+    return sys.getsizeof(o)
+
+
 def concrete(seq):
     """ Make nested iterators concrete lists
 
@@ -222,6 +237,34 @@ def pseudorandom(n, p, key):
     return out
 
 
+def stable_hash(x):
+    """ Non-negative hash of ``x`` that agrees across processes
+
+    The builtin ``hash`` of strings, bytes and dates is salted differently in
+    each Python 3 process and that of ``None`` depends on its address.  So
+    workers in separate processes can not use it to agree on where an
+    element goes.  Equal numbers hash equally, as with ``hash``.
+
+    >>> stable_hash('hello') == stable_hash(u'hello')
+    True
+    >>> stable_hash(1) == stable_hash(1.0)
+    True
+    """
+    if isinstance(x, unicode):
+        x = x.encode('utf-8')
+    if isinstance(x, bytes):
+        return zlib.crc32(x) & 0xffffffff
+    if isinstance(x, tuple):
+        return abs(hash(tuple(map(stable_hash, x))))
+    if isinstance(x, frozenset):
+        return abs(hash(frozenset(map(stable_hash, x))))
+    if isinstance(x, (datetime.date, datetime.time)):
+        return stable_hash(x.isoformat())
+    if x is None:
+        return 0
+    return abs(hash(x))
+
+
 def getargspec(func):
     """Version of inspect.getargspec that works for functools.partial objects"""
     if isinstance(func, partial):